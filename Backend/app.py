@@ -6,7 +6,7 @@ dotenv_path = os.path.abspath(
 )
 load_dotenv(dotenv_path)
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 import pandas as pd
 from sqlalchemy import text
@@ -19,13 +19,55 @@ from datetime import timedelta
 import json
 import requests
 import traceback
-from worker import generate_stability_analysis_task
+from worker import (
+    generate_stability_analysis_task,
+    upgrade_user_plan_task,
+    claim_stripe_event,
+    release_stripe_event,
+)
 from celery.result import AsyncResult
-from google.cloud import firestore
-import firebase_admin
-from firebase_admin import credentials, firestore as admin_firestore
 import logging
+import re
 import numpy as np
+from screener import (
+    parse_page_args,
+    select_page,
+    parse_fields,
+    build_filter_mask,
+    referenced_prefixes,
+    parse_facet_args,
+    compute_facets,
+)
+from metric_expressions import (
+    compile_expression,
+    build_statement_cube,
+    EvaluationContext,
+    ExpressionError,
+)
+from metric_panel import (
+    load_statement_rows,
+    load_closes_as_of,
+    load_metric_panel_snapshot,
+    refresh_metric_panel,
+    parse_as_of,
+    latest_filed_period,
+    METRIC_PANEL_TABLE,
+)
+from local_mirror import read_partition, sync_mirror
+from duckdb_screen import (
+    open_mirror_connection,
+    latest_closes,
+    statement_rows,
+    compute_latest_metrics,
+)
+from columnar_export import (
+    EXPORT_FORMATS,
+    parse_export_format,
+    resolve_columns,
+    open_export,
+)
+from plan_access import require_export_plan
+from request_profiler import init_request_profiler
 
 app = Flask(__name__)
 app.logger.setLevel(logging.INFO)
@@ -45,23 +87,29 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-# Construct the database connection string
-DB_URL = f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Construct the database connection string. DATABASE_URL overrides it, e.g.
+# with the local SQLite stand-in used by the benchmark suite.
+DB_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 # Apply the same SSL forced connection logic
 app.config['SQLALCHEMY_DATABASE_URI'] = DB_URL
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    "connect_args": {
-        "ssl": {
-            "fake_flag_to_enable": True  # Ensures SSL connection
+if DB_URL.startswith("mysql"):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        "connect_args": {
+            "ssl": {
+                "fake_flag_to_enable": True  # Ensures SSL connection
+            }
         }
     }
-}
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize SQLAlchemy with the updated configuration
 db = SQLAlchemy(app)
 
+# Opt-in request profiling (PROFILE_ADMIN_TOKEN / PROFILE_SAMPLE_RATE); no
+# hooks are registered when neither is set
+init_request_profiler(app)
+
 # -------------------------------------------------------------------------
 # =========================== REIT ENDPOINTS ==============================
 # -------------------------------------------------------------------------
@@ -72,6 +120,33 @@ def index():
 # -------------------------------------------------------------------------
 # =========================== REIT ENDPOINTS ==============================
 # -------------------------------------------------------------------------
+# Columns returned by /api/reits (also the allowed values for ?fields=)
+REIT_LIST_COLUMNS = [
+    "Ticker",
+    "Company_Name",
+    "Business_Description",
+    "Website",
+    "Numbers_Employee",
+    "Target_Price",
+    "Year_Founded",
+    "US_Investment_Regions",
+    "Overseas_Investment",
+    "Property_Type",
+    "Total_Real_Estate_Assets_M_",
+    "5yr_FFO_Growth",
+]
+
+# Accepted ?sort= values for /api/reits -> DataFrame column
+REIT_LIST_SORT_COLUMNS = {
+    "ticker": "Ticker",
+    "avg_return": "Average Annual Return",
+    "stability_percentile": "Stability Percentile",
+    "fundamental_percentile": "Fundamental_Percentile",
+    "total_assets": "Total_Real_Estate_Assets_M_",
+    "ffo_growth_5yr": "5yr_FFO_Growth",
+    "target_price": "Target_Price",
+}
+
 @app.route('/api/reits', methods=['GET'])
 def get_reits():
     """
@@ -81,6 +156,8 @@ def get_reits():
     - Ticker (if ticker=?)
     - min_avg_return (for Average Annual Return)
     - search (partial ticker match for real-time suggestions)
+    - sort / order / limit / cursor (server-side sorting with keyset pagination)
+    - fields (comma-separated column projection, e.g. to drop Business_Description)
 
     Merges with scoring analysis data from reit_scoring_analysis.
     Returns relevant business data plus new fields (Numbers_Employee, Year_Founded, etc.).
@@ -95,6 +172,12 @@ def get_reits():
     # NEW: Real-time search parameter
     search_term = request.args.get('search', default=None, type=str)
     app.logger.info("Search term received: %s", search_term)
+
+    try:
+        output_columns = parse_fields(request.args, REIT_LIST_COLUMNS)
+        page_args = parse_page_args(request.args, REIT_LIST_SORT_COLUMNS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     # Load REIT business data from MySQL
     try:
@@ -162,11 +245,14 @@ def get_reits():
             f"Filtered REITs with Average Annual Return greater than {min_avg_return}: {merged_data.shape[0]}"
         )
 
-    # Replace NaN values with None for better JSON serialization
-    merged_data = merged_data.astype(object).where(pd.notna(merged_data), None)
+    # Sort and page before serializing so only the requested rows are converted
+    next_cursor = None
+    if page_args is not None:
+        merged_data, next_cursor = select_page(merged_data, **page_args)
 
-    # We won't sort; display in original order
-    data_to_display = merged_data
+    # Replace NaN values with None for better JSON serialization
+    data_to_display = merged_data[output_columns]
+    data_to_display = data_to_display.astype(object).where(pd.notna(data_to_display), None)
 
     explanation = (
         f"Filtered REITs: Minimum Annual Annual Return - {min_avg_return}, "
@@ -177,23 +263,10 @@ def get_reits():
 
     response = {
         "explanation": explanation,
-        "reits": data_to_display[
-            [
-                "Ticker",
-                "Company_Name",
-                "Business_Description",
-                "Website",
-                "Numbers_Employee",
-                "Target_Price",
-                "Year_Founded",
-                "US_Investment_Regions",
-                "Overseas_Investment",
-                "Property_Type",
-                "Total_Real_Estate_Assets_M_",
-                "5yr_FFO_Growth",
-            ]
-        ].to_dict(orient='records')
+        "reits": data_to_display.to_dict(orient='records')
     }
+    if page_args is not None:
+        response["next_cursor"] = next_cursor
 
     return jsonify(response)
 
@@ -266,8 +339,19 @@ def get_quarterly_statements(ticker):
         params["limit"] = limit
 
     try:
-        with db.engine.connect() as conn:
-            df = pd.read_sql(text(sql), conn, params=params)
+        # Serve from the local mirror when it is fresh (rows are stored in the
+        # same order as the ORDER BY above); otherwise query MySQL.
+        df = read_partition(table_name, ticker, ["line_item", "fiscal_year", "fiscal_quarter", "value", "excel_row_index"])
+        if df is not None:
+            if from_year is not None:
+                df = df[df["fiscal_year"] >= from_year]
+            if to_year is not None:
+                df = df[df["fiscal_year"] <= to_year]
+            if limit is not None:
+                df = df.head(limit)
+        else:
+            with db.engine.connect() as conn:
+                df = pd.read_sql(text(sql), conn, params=params)
     except Exception as e:
         app.logger.error(f"Error fetching quarterly statements for {ticker}: {e}")
         return jsonify({"error": "Failed to load statements"}), 500
@@ -558,14 +642,16 @@ def get_price_data(ticker):
     Returns all historical close_price and volume for the specified ticker.
     """
     try:
-        with db.engine.connect() as conn:
-            sql_query = f"""
-                SELECT date, close_price, volume
-                FROM reit_price_data
-                WHERE ticker = '{ticker}'
-                ORDER BY date ASC
-            """
-            df_price = pd.read_sql(sql_query, conn)
+        df_price = read_partition("reit_price_data", ticker, ["date", "close_price", "volume"])
+        if df_price is None:
+            with db.engine.connect() as conn:
+                sql_query = f"""
+                    SELECT date, close_price, volume
+                    FROM reit_price_data
+                    WHERE ticker = '{ticker}'
+                    ORDER BY date ASC
+                """
+                df_price = pd.read_sql(sql_query, conn)
 
         if df_price.empty:
             return jsonify({"message": f"No price data found for ticker '{ticker}'"}), 200
@@ -586,6 +672,181 @@ def get_price_data(ticker):
         return jsonify({"error": "Failed to load price data"}), 500
 
 
+RISK_HISTORY_HORIZONS = ("1Y", "3Y", "5Y")
+
+@app.route("/api/reits/<string:ticker>/risk-history", methods=['GET'])
+def get_risk_history(ticker):
+    """
+    Returns the rolling 1/3/5-year risk statistics stored in reit_risk_history
+    by the risk script, as one date-ordered series per horizon.
+      horizon  -> 1Y | 3Y | 5Y (default: all)
+      start    -> first date, YYYY-MM-DD
+      end      -> last date, YYYY-MM-DD
+    """
+    horizon = request.args.get("horizon", "").upper()
+    if horizon and horizon not in RISK_HISTORY_HORIZONS:
+        return jsonify({"error": f"Invalid horizon. Use one of {', '.join(RISK_HISTORY_HORIZONS)}."}), 400
+
+    sql = """
+        SELECT horizon, date, observations, avg_daily_return, annual_return,
+               std_dev, skewness, kurtosis
+        FROM reit_risk_history
+        WHERE ticker = :ticker
+    """
+    params = {"ticker": ticker.upper()}
+    if horizon:
+        sql += " AND horizon = :horizon"
+        params["horizon"] = horizon
+    if request.args.get("start"):
+        sql += " AND date >= :start"
+        params["start"] = request.args["start"]
+    if request.args.get("end"):
+        sql += " AND date <= :end"
+        params["end"] = request.args["end"]
+    sql += " ORDER BY horizon, date"
+
+    try:
+        with db.engine.connect() as conn:
+            df_history = pd.read_sql(text(sql), conn, params=params)
+
+        if df_history.empty:
+            return jsonify({"message": f"No risk history found for ticker '{ticker}'"}), 200
+
+        df_history["date"] = df_history["date"].astype(str)
+        df_history = df_history.astype(object).where(df_history.notna(), None)
+        history = {
+            h: group.drop(columns="horizon").to_dict(orient="records")
+            for h, group in df_history.groupby("horizon", sort=False)
+        }
+        return jsonify({
+            "ticker": ticker.upper(),
+            "risk_history": history
+        }), 200
+
+    except Exception as e:
+        app.logger.error(f"Error fetching risk history for {ticker}: {e}")
+        return jsonify({"error": "Failed to load risk history"}), 500
+
+
+# -------------------------------------------------------------------------
+# ====================== BULK EXPORT ENDPOINTS ===============================
+# -------------------------------------------------------------------------
+# Columnar (Arrow IPC / Parquet) exports for notebooks and power users.
+# Premium plan only: send the Firebase ID token as "Authorization: Bearer".
+# Common query params:
+#   format   -> arrow (default) | parquet
+#   columns  -> comma-separated column projection
+
+def export_response(sql, params, export_format, name):
+    """
+    Wraps a streamed export in a download Response. The query runs and its
+    first chunk is encoded before the response starts, so a failure there
+    is still a 500.
+    """
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    try:
+        stream = open_export(db.engine, sql, params, export_format, app.logger)
+    except Exception as e:
+        app.logger.error(f"Error starting {name} export: {e}")
+        return jsonify({"error": f"Failed to export {name}"}), 500
+    return Response(
+        stream_with_context(stream),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={name}.{extension}"},
+    )
+
+
+def quote_columns(columns):
+    return ", ".join(f"`{c}`" for c in columns)
+
+
+@app.route("/api/export/scoring", methods=['GET'])
+@require_export_plan
+def export_scoring():
+    """Streams reit_scoring_analysis."""
+    try:
+        export_format = parse_export_format(request.args)
+        with db.engine.connect() as conn:
+            columns = resolve_columns(conn, "reit_scoring_analysis", request.args.get("columns"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error preparing scoring export: {e}")
+        return jsonify({"error": "Failed to export scoring data"}), 500
+
+    sql = text(f"SELECT {quote_columns(columns)} FROM reit_scoring_analysis ORDER BY Ticker")
+    return export_response(sql, {}, export_format, "reit_scoring_analysis")
+
+
+@app.route("/api/export/metrics", methods=['GET'])
+@require_export_plan
+def export_metrics():
+    """
+    Streams the metric snapshot from reit_metric_panel.
+      as_of    -> YYYYQn quarter (default: latest quarter in the panel)
+      history  -> true to export every quarter instead of one snapshot
+    """
+    history = request.args.get("history", "false").lower() == "true"
+    try:
+        export_format = parse_export_format(request.args)
+        as_of = parse_as_of(request.args["as_of"]) if request.args.get("as_of") else None
+        with db.engine.connect() as conn:
+            columns = resolve_columns(conn, METRIC_PANEL_TABLE, request.args.get("columns"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error preparing metrics export: {e}")
+        return jsonify({"error": "Failed to export metric data"}), 500
+
+    sql = f"SELECT {quote_columns(columns)} FROM {METRIC_PANEL_TABLE}"
+    params = {}
+    if as_of is not None and not history:
+        sql += " WHERE fiscal_year = :year AND fiscal_quarter = :quarter"
+        params = {"year": as_of.year, "quarter": as_of.quarter}
+    elif not history:
+        sql += f"""
+            WHERE fiscal_year * 4 + fiscal_quarter = (
+                SELECT MAX(fiscal_year * 4 + fiscal_quarter) FROM {METRIC_PANEL_TABLE}
+            )"""
+    sql += " ORDER BY ticker, fiscal_year, fiscal_quarter"
+    return export_response(text(sql), params, export_format, "reit_metric_panel")
+
+
+@app.route("/api/export/prices", methods=['GET'])
+@require_export_plan
+def export_prices():
+    """
+    Streams a multi-ticker price panel from reit_price_data in (ticker, date) order.
+      tickers  -> comma-separated tickers (default: all)
+      start    -> first date, YYYY-MM-DD
+      end      -> last date, YYYY-MM-DD
+    """
+    try:
+        export_format = parse_export_format(request.args)
+        with db.engine.connect() as conn:
+            columns = resolve_columns(conn, "reit_price_data", request.args.get("columns"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error preparing price export: {e}")
+        return jsonify({"error": "Failed to export price data"}), 500
+
+    sql = f"SELECT {quote_columns(columns)} FROM reit_price_data WHERE 1=1"
+    params = {}
+    tickers = request.args.get("tickers")
+    if tickers:
+        sql += " AND ticker IN :tickers"
+        params["tickers"] = tuple(t.strip().upper() for t in tickers.split(",") if t.strip())
+    if request.args.get("start"):
+        sql += " AND date >= :start"
+        params["start"] = request.args["start"]
+    if request.args.get("end"):
+        sql += " AND date <= :end"
+        params["end"] = request.args["end"]
+    sql += " ORDER BY ticker, date"
+    return export_response(text(sql), params, export_format, "reit_price_data")
+
+
 # -------------------------------------------------------------------------
 # ====================== SCORING AND LLM ENDPOINTS ===============================
 # -------------------------------------------------------------------------
@@ -695,27 +956,23 @@ def stripe_webhook():
             print("🔥 Webhook error: No client_reference_id in session.")
             return "Webhook Error: Missing user identifier", 400
 
+        # Stripe retries deliveries it considers failed or slow. Acknowledge
+        # duplicates immediately and hand the Firestore update to Celery so
+        # the request never waits on a remote round trip.
         try:
-            if not firebase_admin._apps:
-                raw_cred = os.getenv("FIREBASE_SERVICE_ACCOUNT")
-                cred_json = json.loads(raw_cred)
-                cred = credentials.Certificate(cred_json)
-                firebase_admin.initialize_app(cred)
-            
-            db_fs = admin_firestore.client()
-            users_ref = db_fs.collection("users")
-            query = users_ref.where("email", "==", user_email).limit(1)
-            docs = query.stream()
-            user_doc = next(docs, None)
-
-            if user_doc:
-                user_doc.reference.update({"plan": "premium"})
-                print(f"✅ Successfully upgraded user {user_email} to premium.")
-            else:
-                print(f"🔥 Webhook error: User not found with email {user_email}.")
+            if not claim_stripe_event(event['id']):
+                return 'Already processed', 200
         except Exception as e:
-            print(f"🔥 Firebase update error in webhook: {e}")
-            return "Server error during user update", 500
+            print(f"🔥 Webhook idempotency store error: {e}")
+            return "Server error during event bookkeeping", 500
+
+        try:
+            upgrade_user_plan_task.delay(user_email, event['id'])
+        except Exception as e:
+            # Let Stripe retry delivery rather than silently dropping the upgrade
+            release_stripe_event(event['id'])
+            print(f"🔥 Failed to enqueue premium upgrade for {user_email}: {e}")
+            return "Server error while queuing user update", 500
 
     return 'Success', 200
 
@@ -800,15 +1057,137 @@ METRIC_CONFIG = [
 
 # The METRIC_CONFIG list stays the same as before
 
+# Columns from reit_scoring_analysis that can be screened on alongside the
+# metrics: min_<prefix>/max_<prefix> for numeric fields, in_<prefix>=a,b for tiers
+SCORING_FILTER_CONFIG = [
+    {'column': 'Stability Percentile', 'filter_prefix': 'stability_percentile'},
+    {'column': 'Fundamental_Percentile', 'filter_prefix': 'fundamental_percentile'},
+    {'column': 'Liquidity_Tier', 'filter_prefix': 'liquidity_tier'},
+    {'column': 'Z_Score_Std_Dev', 'filter_prefix': 'z_score_std_dev'},
+    {'column': 'Z_Score_Return', 'filter_prefix': 'z_score_return'},
+    {'column': 'Z_Score_Skew', 'filter_prefix': 'z_score_skew'},
+    {'column': 'Z_Score_Kurtosis', 'filter_prefix': 'z_score_kurtosis'},
+    {'column': 'Z_Score_Illiquidity', 'filter_prefix': 'z_score_illiquidity'},
+]
+
+# Metric engine for latest-quarter screens: "pandas" (MySQL + per-ticker
+# groupby) or "duckdb" (embedded DuckDB over the local mirror, see
+# duckdb_screen.py). Overridable per request with ?engine=
+ADVANCED_FILTER_ENGINES = ("pandas", "duckdb")
+DEFAULT_FILTER_ENGINE = os.getenv("ADVANCED_FILTER_ENGINE", "pandas")
+
+# User-defined metrics: ?expr_<name>=<expression> (see metric_expressions.py)
+MAX_CUSTOM_METRICS = 10
+CUSTOM_METRIC_NAME_RE = re.compile(r"^[a-z][a-z0-9_]{0,39}$")
+
+
+def parse_custom_metrics(args):
+    """
+    Collects ?expr_<name>=<expression> arguments into a list of
+    {'metric_name', 'filter_prefix', 'expression'} dicts. Each custom metric
+    is filtered with min_<name>/max_<name> like a METRIC_CONFIG entry.
+    Raises ValueError (ExpressionError) on invalid names or expressions.
+    """
+    # Names of the built-in metrics, scoring filters and identifier columns: a
+    # custom metric with one of them would shadow or merge with their filters
+    reserved = (
+        {conf['metric_name'] for conf in METRIC_CONFIG}
+        | {conf['filter_prefix'] for conf in METRIC_CONFIG + SCORING_FILTER_CONFIG}
+        | {'ticker', 'company_name', 'business_description', 'website'}
+    )
+    custom_metrics = []
+    for key, source in args.items():
+        if not key.startswith('expr_'):
+            continue
+        name = key[len('expr_'):]
+        if not CUSTOM_METRIC_NAME_RE.match(name):
+            raise ValueError(f"Invalid custom metric name '{name}'.")
+        if name in reserved:
+            raise ValueError(f"Custom metric name '{name}' is reserved for a built-in field.")
+        try:
+            expression = compile_expression(source)
+        except ExpressionError as e:
+            raise ExpressionError(f"Invalid expression for '{name}': {e}")
+        custom_metrics.append({'metric_name': name, 'filter_prefix': name, 'expression': expression})
+
+    if len(custom_metrics) > MAX_CUSTOM_METRICS:
+        raise ValueError(f"At most {MAX_CUSTOM_METRICS} custom metrics are allowed per request.")
+    return custom_metrics
+
 @app.route('/api/reits/advanced-filter', methods=['GET'])
 def get_advanced_filtered_reits():
     """
     DEFINITIVE ENDPOINT V4.1 (Corrected): Fixes KeyError on merge by aligning
     column name case ('ticker' vs 'Ticker').
+
+    Supports sort=<metric>&order=asc|desc&limit=<n>&cursor=<token> for
+    top-K selection with keyset pagination, and fields=<col>,... projection.
+
+    User-defined metrics can be added with expr_<name>=<expression>, e.g.
+    expr_ffo_to_debt=ttm("FFO") / latest("Total Debt")&min_ffo_to_debt=0.1
+
+    as_of=YYYYQn screens against the stored point-in-time metric panel
+    (reit_metric_panel) and the matching historical close instead of the
+    latest quarter, using only statements filed by the end of that quarter.
+
+    facets=true adds per-metric histograms (facet_bins=<n>, facet_mode=
+    fixed|quantile), counts and min/max over the REITs that pass the filter.
+
+    engine=duckdb computes the latest-quarter metrics in embedded DuckDB
+    over the local mirror; it falls back to pandas when the mirror is stale.
     """
     app.logger.info(f"Request received for SCALABLE PANDAS-BASED filter with args: {request.args}")
     args = request.args
+
+    try:
+        custom_metrics = parse_custom_metrics(args)
+        as_of = parse_as_of(args['as_of']) if args.get('as_of') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    engine_name = args.get('engine', DEFAULT_FILTER_ENGINE).lower()
+    if engine_name not in ADVANCED_FILTER_ENGINES:
+        return jsonify({"error": "Invalid 'engine' parameter. Must be pandas|duckdb."}), 400
+
+    # Get a list of all the metric column names from our config
+    metric_columns = [conf['metric_name'] for conf in METRIC_CONFIG + custom_metrics]
+
+    # Define the base columns we always want to return
+    base_columns = ['Ticker', 'Company_Name', 'Business_Description', 'Website']
+
+    # Scoring columns can be filtered, sorted on, or requested via fields=, but
+    # are not part of the default response
+    scoring_columns = [conf['column'] for conf in SCORING_FILTER_CONFIG]
+
+    sortable_columns = {"ticker": "Ticker"}
+    for conf in METRIC_CONFIG + custom_metrics:
+        sortable_columns[conf['metric_name']] = conf['metric_name']
+        sortable_columns[conf['filter_prefix']] = conf['metric_name']
+    for conf in SCORING_FILTER_CONFIG:
+        sortable_columns[conf['filter_prefix']] = conf['column']
+
+    try:
+        output_columns = parse_fields(
+            args, base_columns + metric_columns + scoring_columns, base_columns + metric_columns
+        )
+        page_args = parse_page_args(args, sortable_columns)
+        facet_args = parse_facet_args(args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filter_specs = [
+        {'filter_prefix': conf['filter_prefix'], 'column': conf['metric_name']}
+        for conf in METRIC_CONFIG + custom_metrics
+    ] + SCORING_FILTER_CONFIG
+
+    # Only load the scoring table when the request touches one of its columns
+    needs_scoring = (
+        bool(referenced_prefixes(args, SCORING_FILTER_CONFIG))
+        or any(col in scoring_columns for col in output_columns)
+        or (page_args is not None and page_args['sort_col'] in scoring_columns)
+    )
     
+    duck_con = None
     try:
         with db.engine.connect() as conn:
             # Step 1 & 2: Data fetching (No changes here)
@@ -824,92 +1203,100 @@ def get_advanced_filtered_reits():
                 return jsonify({"reits": []})
             candidate_tickers = tuple(candidate_df['Ticker'].tolist())
 
-            # This SQL query efficiently finds the most recent price for each ticker
-            sql_prices = text("""
-                WITH LatestPrices AS (
-                    SELECT
-                        ticker,
-                        close_price,
-                        ROW_NUMBER() OVER(PARTITION BY ticker ORDER BY date DESC) as rn
-                    FROM reit_price_data
-                    WHERE ticker IN :tickers
+            if needs_scoring:
+                scoring_select = ", ".join(f"`{col}`" for col in scoring_columns)
+                scoring_df = pd.read_sql(
+                    text(f"SELECT Ticker, {scoring_select} FROM reit_scoring_analysis WHERE Ticker IN :tickers"),
+                    conn, params={"tickers": candidate_tickers}
                 )
-                SELECT ticker, close_price FROM LatestPrices WHERE rn = 1
-            """)
-            price_df = pd.read_sql(sql_prices, conn, params={"tickers": candidate_tickers})
-
-            # Convert the price data into a fast-lookup Series (like a dictionary)
-            latest_prices = price_df.set_index('ticker')['close_price']
 
             line_items_to_fetch = set()
             for metric in METRIC_CONFIG:
                 line_items_to_fetch.update(metric['line_items'])
-            
-            # THIS IS THE NEW, FUTURE-PROOF QUERY
-            sql_financials = text("""
-                (
-                    SELECT ticker, TRIM(line_item) as line_item, fiscal_year, fiscal_quarter, value
-                    FROM reit_income_statement
-                    WHERE TRIM(line_item) IN :line_items AND ticker IN :tickers AND fiscal_quarter IS NOT NULL
-                )
-                UNION ALL
-                (
-                    SELECT ticker, TRIM(line_item) as line_item, fiscal_year, fiscal_quarter, value
-                    FROM reit_industry_metrics
-                    WHERE TRIM(line_item) IN :line_items AND ticker IN :tickers AND fiscal_quarter IS NOT NULL
-                )
-                UNION ALL
-                (
-                    SELECT ticker, TRIM(line_item) as line_item, fiscal_year, fiscal_quarter, value
-                    FROM reit_balance_sheet
-                    WHERE TRIM(line_item) IN :line_items AND ticker IN :tickers AND fiscal_quarter IS NOT NULL
+            for metric in custom_metrics:
+                line_items_to_fetch.update(metric['expression'].line_items)
+
+            if as_of is not None:
+                # Point-in-time screen: METRIC_CONFIG metrics come precomputed
+                # from the stored panel; statements and historical closes are
+                # only needed for user-defined metrics.
+                all_metrics_df = load_metric_panel_snapshot(
+                    conn, as_of, candidate_tickers, [conf['metric_name'] for conf in METRIC_CONFIG]
                 )
-                UNION ALL
-                (
-                    SELECT ticker, TRIM(line_item) as line_item, fiscal_year, fiscal_quarter, value
-                    FROM reit_cash_flow
-                    WHERE TRIM(line_item) IN :line_items AND ticker IN :tickers AND fiscal_quarter IS NOT NULL
-                )
-            """)
-            financials_df = pd.read_sql(sql_financials, conn, params={
-                "line_items": tuple(line_items_to_fetch),
-                "tickers": candidate_tickers
-            })
-            financials_df['value'] = financials_df['value'].replace(0, np.nan)
+                if custom_metrics:
+                    latest_prices = load_closes_as_of(conn, as_of, candidate_tickers)
+                    financials_df = load_statement_rows(conn, line_items_to_fetch, candidate_tickers)
+            else:
+                duck_con = open_mirror_connection(candidate_tickers) if engine_name == 'duckdb' else None
+                if engine_name == 'duckdb' and duck_con is None:
+                    app.logger.warning("Local mirror is missing or stale; using the pandas engine.")
+
+            if as_of is None and duck_con is None:
+                # Each ticker's most recent close, kept up to date by the price ingest
+                sql_prices = text("SELECT ticker, close_price FROM reit_latest_price WHERE ticker IN :tickers")
+                price_df = pd.read_sql(sql_prices, conn, params={"tickers": candidate_tickers})
+
+                # Convert the price data into a fast-lookup Series (like a dictionary)
+                latest_prices = price_df.set_index('ticker')['close_price']
+
+                # Statement rows from all four statement tables in one UNION ALL
+                financials_df = load_statement_rows(conn, line_items_to_fetch, candidate_tickers)
 
         # --- Step 3: Calculate Metrics Using the Configuration ---
         app.logger.info("--- STARTING METRIC CALCULATION ---")
-        
-        all_metrics_df = financials_df.groupby('ticker').apply(
-            lambda group: calculate_metrics_for_ticker(group, latest_prices)
-        )
-        
-        # --- FIX IS HERE ---
-        # 1. Convert index ('ticker') to a column
-        all_metrics_df = all_metrics_df.reset_index()
-        # 2. RENAME the new 'ticker' column to 'Ticker' to match for the merge
-        all_metrics_df = all_metrics_df.rename(columns={'ticker': 'Ticker'})
+
+        if duck_con is not None:
+            # Window-function screen over the mirror; same columns as the groupby below
+            latest_prices = latest_closes(duck_con)
+            all_metrics_df = compute_latest_metrics(duck_con, line_items_to_fetch, METRIC_CONFIG)
+            if custom_metrics:
+                financials_df = statement_rows(duck_con, line_items_to_fetch)
+            duck_con.close()
+        elif as_of is None:
+            all_metrics_df = financials_df.groupby('ticker').apply(
+                lambda group: calculate_metrics_for_ticker(group, latest_prices)
+            )
+
+            # --- FIX IS HERE ---
+            # 1. Convert index ('ticker') to a column
+            all_metrics_df = all_metrics_df.reset_index()
+            # 2. RENAME the new 'ticker' column to 'Ticker' to match for the merge
+            all_metrics_df = all_metrics_df.rename(columns={'ticker': 'Ticker'})
+
+        # User-defined metrics are evaluated for all tickers at once on the
+        # pivoted statement array rather than per ticker
+        if custom_metrics:
+            cube = build_statement_cube(financials_df, line_items=sorted(line_items_to_fetch))
+            ctx = EvaluationContext(cube, price=latest_prices.reindex(cube.tickers).to_numpy(dtype='float64'))
+            # As of a past quarter, only statements filed by its end count
+            end_index = cube.end_index(latest_filed_period(as_of) if as_of is not None else None)
+            custom_df = pd.DataFrame({'Ticker': cube.tickers})
+            for metric in custom_metrics:
+                custom_df[metric['metric_name']] = metric['expression'].evaluate_latest(ctx, end_index)
+            all_metrics_df = pd.merge(all_metrics_df, custom_df, on='Ticker', how='left')
         
         app.logger.info("--- FINISHED METRIC CALCULATION ---")
 
         # --- Step 4: Merge, Filter, and Return ---
         final_df = pd.merge(candidate_df, all_metrics_df, on='Ticker', how='left')
-        final_df = final_df.astype(object).where(pd.notna(final_df), None)
-        
-        filtered_df = final_df.copy()
+        if needs_scoring:
+            final_df = pd.merge(final_df, scoring_df, on='Ticker', how='left')
 
-        # Dynamic Filtering (No changes needed here)
-        for metric_conf in METRIC_CONFIG:
-            prefix = metric_conf['filter_prefix']
-            metric_col = metric_conf['metric_name']
-            
-            min_val = args.get(f'min_{prefix}', type=float)
-            max_val = args.get(f'max_{prefix}', type=float)
-            
-            if min_val is not None:
-                filtered_df = filtered_df[filtered_df[metric_col].notna() & (filtered_df[metric_col] >= min_val)]
-            if max_val is not None:
-                filtered_df = filtered_df[filtered_df[metric_col].notna() & (filtered_df[metric_col] <= max_val)]
+        # Every min_/max_/in_ bound (metrics and scoring fields) as one mask
+        filter_mask = build_filter_mask(final_df, args, filter_specs)
+        filtered_df = final_df[filter_mask]
+
+        # Slider distributions over the same filtered frame, before JSON conversion
+        facets = None
+        if facet_args is not None:
+            facet_numeric = list(metric_columns)
+            facet_categorical = []
+            if needs_scoring:
+                facet_numeric += [col for col in scoring_columns if col != 'Liquidity_Tier']
+                facet_categorical.append('Liquidity_Tier')
+            facets = compute_facets(filtered_df, facet_numeric, facet_categorical, **facet_args)
+
+        filtered_df = filtered_df.astype(object).where(pd.notna(filtered_df), None)
 
         # --- Step 5: Final Logging (No changes needed here) ---
         app.logger.info("--- VERIFICATION LOG (FINAL) ---")
@@ -936,22 +1323,39 @@ def get_advanced_filtered_reits():
                 app.logger.info(" | ".join(log_parts))
 
         app.logger.info("-----------------------------")
-        
-        # Get a list of all the metric column names from our config
-        metric_columns = [conf['metric_name'] for conf in METRIC_CONFIG]
-        
-        # Define the base columns we always want to return
-        base_columns = ['Ticker', 'Company_Name', 'Business_Description', 'Website']
 
-        # Combine the lists and return all the necessary data
-        reits_json = filtered_df[base_columns + metric_columns].to_dict('records')
-        return jsonify({"reits": reits_json})
+        # Sort / select the requested page, then return only the projected columns
+        next_cursor = None
+        if page_args is not None:
+            filtered_df, next_cursor = select_page(filtered_df, **page_args)
+
+        response = {"reits": filtered_df[output_columns].to_dict('records')}
+        if page_args is not None:
+            response["next_cursor"] = next_cursor
+        if facets is not None:
+            response["total_count"] = int(filter_mask.sum())
+            response["facets"] = facets
+        return jsonify(response)
 
     except Exception as e:
         app.logger.error(f"Error in scalable pandas-based filter logic: {e}")
         traceback.print_exc()
         return jsonify({"error": "A database error occurred."}), 500
 
+@app.cli.command("build-metric-panel")
+def build_metric_panel_command():
+    """Recomputes the point-in-time metric panel used by ?as_of= screens."""
+    row_count = refresh_metric_panel(db.engine, METRIC_CONFIG)
+    print(f"✅ reit_metric_panel rebuilt with {row_count} rows.")
+
+
+@app.cli.command("sync-mirror")
+def sync_mirror_command():
+    """Refreshes the local Feather mirror of the price and statement tables."""
+    counts = sync_mirror(db.engine)
+    for table_name, rows in counts.items():
+        print(f"✅ Mirrored {rows} rows of {table_name}.")
+
 # --- HELPER FUNCTION (with FutureWarning fix) ---
 def calculate_metrics_for_ticker(group, prices_series):
     """
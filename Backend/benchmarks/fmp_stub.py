@@ -0,0 +1,158 @@
+# fmp_stub.py
+"""
+Local HTTP stand-in for the FMP historical-price-full endpoint, for testing
+the universe set-up script's fetcher without an API key or network.
+
+Serves deterministic synthetic daily bars per ticker (newest first, as FMP
+does), honours `from=`/`to=`, and can inject latency and transient 429/503
+responses. Every request is recorded (time and path) so a run can check the
+rate limit held and which ranges were asked for.
+
+Point the fetcher at it with FMP_BASE_URL:
+    python -m benchmarks.fmp_stub --port 8765 --error-rate 0.1
+    FMP_BASE_URL=http://127.0.0.1:8765 python "../Python Run/1. Stock universe - initial set up.py"
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+PRICE_PATH = "/historical-price-full/"
+HISTORY_START = "2000-01-03"
+
+
+def synthetic_history(ticker, n_days=1260, end_date=None):
+    """
+    The last n_days of a geometric random walk seeded from the ticker name.
+    The walk starts at a fixed date, so a bar's values do not depend on
+    end_date (moving end_date forward only appends new bars).
+    """
+    seed = zlib.crc32(ticker.encode())
+    price_rng, volume_rng = np.random.default_rng([seed, 0]), np.random.default_rng([seed, 1])
+    dates = pd.bdate_range(start=HISTORY_START, end=end_date or pd.Timestamp.today().normalize())
+    start_price = price_rng.uniform(10, 100)
+    returns = price_rng.normal(0.0003, 0.015, size=len(dates))
+    volumes = volume_rng.lognormal(13, 1.0, size=len(dates))
+    bars = pd.DataFrame({
+        "date": dates.strftime("%Y-%m-%d"),
+        "close": np.round(start_price * np.exp(np.cumsum(returns)), 4),
+        "volume": np.round(volumes),
+    })
+    return bars.iloc[-n_days:].reset_index(drop=True)
+
+
+class FMPStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, n_days=1260, end_date=None, seed=0):
+        super().__init__(address, FMPStubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.n_days = n_days
+        self.end_date = end_date
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.request_times = []
+        self.request_paths = []
+        self.errors_sent = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def peak_rate(self, window=1.0):
+        """Most requests seen in any `window`-second span."""
+        with self.lock:
+            times = sorted(self.request_times)
+        peak, lo = 0, 0
+        for hi, t in enumerate(times):
+            while t - times[lo] > window:
+                lo += 1
+            peak = max(peak, hi - lo + 1)
+        return peak
+
+
+class FMPStubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_times.append(time.monotonic())
+            server.request_paths.append(self.path)
+            fail = server.rng.random() < server.error_rate
+            if fail:
+                server.errors_sent += 1
+                # Alternate between FMP's rate-limit reply and a gateway error
+                rate_limited = server.errors_sent % 2 == 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        if fail and rate_limited:
+            self._send(429, {"Error Message": "Limit Reach"}, {"Retry-After": "0"})
+            return
+        if fail:
+            self._send(503, {"Error Message": "Service Unavailable"})
+            return
+
+        url = urlparse(self.path)
+        if not url.path.startswith(PRICE_PATH):
+            self._send(404, {"Error Message": "Not found"})
+            return
+
+        ticker = url.path[len(PRICE_PATH):]
+        query = parse_qs(url.query)
+        bars = synthetic_history(ticker, server.n_days, server.end_date)
+        if "from" in query:
+            bars = bars[bars["date"] >= query["from"][0]]
+        if "to" in query:
+            bars = bars[bars["date"] <= query["to"][0]]
+        self._send(200, {"symbol": ticker, "historical": bars.iloc[::-1].to_dict(orient="records")})
+
+
+def start_fmp_stub(port=0, **options):
+    """Starts the stub on a background thread; returns the server (see .url)."""
+    server = FMPStubServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True, name="fmp-stub").start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 429/503 responses")
+    parser.add_argument("--days", type=int, default=1260)
+    parser.add_argument("--end-date", help="Last bar date (default: today)")
+    args = parser.parse_args(argv)
+
+    server = FMPStubServer(("127.0.0.1", args.port), args.latency, args.error_rate, args.days, args.end_date)
+    print(f"FMP stub listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"{len(server.request_times)} requests, {server.errors_sent} errors injected, "
+          f"peak {server.peak_rate()} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+# load_replay.py
+"""
+Traffic replay load generator modeled on the React frontend's access patterns.
+
+Each virtual user loops over sessions picked from a weighted mix:
+  search    per-keystroke /api/reits?search= (Header.js), then often a detail page
+  detail    DetailPage's 4-call fan-out fired concurrently (/api/reits?ticker=,
+            /price, /financials?include_scores=true, /breakdowns), sometimes
+            followed by a statements tab
+  analysis  POST /start-analysis, then /analysis-result polled every 4s
+            (ScoringDonutOverlay.js) until the job finishes
+  filter    /api/reits/advanced-filter with 1-3 bounds (FilterPage.js)
+  llm       POST /api/llm-filter, then the advanced filter with its result
+  checkout  POST /api/create-checkout-session (Pricing.js)
+
+Users ramp through stages (e.g. 1, 2, 4, ... concurrent users); the report
+has p50/p95/p99 per route for each stage and the throughput at saturation.
+
+Run from Backend/:
+    # build the synthetic SQLite database
+    python -m benchmarks.load_replay prepare --db /tmp/reit_load.sqlite
+    # start a stubbed local instance (gunicorn when installed)
+    python -m benchmarks.load_replay serve --db /tmp/reit_load.sqlite --port 5055
+    # replay traffic against it
+    python -m benchmarks.load_replay run --base-url http://127.0.0.1:5055 \
+        --users 1,4,16,64 --stage-seconds 30 --output load.json
+
+`run` without --base-url prepares and serves an instance itself.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SESSION_TYPES = ("search", "detail", "analysis", "filter", "llm", "checkout")
+DEFAULT_MIX = "search=4,detail=3,filter=2,analysis=1,llm=0.5,checkout=0.2"
+
+# Think times in seconds before --think-scale
+KEYSTROKE_GAP = 0.15
+PAGE_DWELL = 4.0
+SESSION_GAP = 1.0
+
+# Bounds the FilterPage sends: (filter prefix, low, high)
+FILTER_BOUNDS = [
+    ("operating_margin", -0.2, 0.5),
+    ("revenue_growth", -0.1, 0.2),
+    ("ffo_growth", -0.1, 0.2),
+    ("interest_coverage", 0, 8),
+    ("debt_to_asset", 0.1, 0.8),
+    ("pe_ratio", 5, 60),
+    ("pffo_ratio", 5, 30),
+    ("net_debt_to_ebitda", 1, 12),
+]
+
+LLM_QUERIES = [
+    "Profitable REITs with low debt",
+    "Fast growing industrial REITs",
+    "Cheap REITs by price to FFO with stable payouts",
+]
+
+
+class Recorder:
+    """Thread-safe list of (route, status, latency_s, end_time) samples."""
+
+    def __init__(self):
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def add(self, route, status, latency, end_time):
+        with self.lock:
+            self.samples.append((route, status, latency, end_time))
+
+    def window(self, start, end):
+        with self.lock:
+            return [s for s in self.samples if start <= s[3] < end]
+
+
+class VirtualUser:
+    """One simulated browser tab replaying frontend sessions."""
+
+    def __init__(self, base_url, tickers, recorder, stop, rng, think_scale, poll_interval, max_polls):
+        self.base_url = base_url.rstrip("/")
+        self.tickers = tickers
+        self.recorder = recorder
+        self.stop = stop
+        self.rng = rng
+        self.think_scale = think_scale
+        self.poll_interval = poll_interval
+        self.max_polls = max_polls
+        self.http = requests.Session()
+        # Browsers open up to 6 connections per host
+        self.http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=6))
+        self.fan_out_pool = ThreadPoolExecutor(max_workers=4)
+
+    # --- plumbing -------------------------------------------------------
+    def request(self, method, route, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=120, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 0
+        end = time.perf_counter()
+        self.recorder.add(f"{method} {route}", status, end - start, end)
+        return response
+
+    def get(self, route, path, **kwargs):
+        return self.request("GET", route, path, **kwargs)
+
+    def post(self, route, path, **kwargs):
+        return self.request("POST", route, path, **kwargs)
+
+    def think(self, seconds):
+        if self.think_scale > 0:
+            self.stop.wait(seconds * self.think_scale * self.rng.uniform(0.5, 1.5))
+
+    def pick_ticker(self):
+        return self.rng.choice(self.tickers)
+
+    # --- sessions -------------------------------------------------------
+    def search(self):
+        ticker = self.pick_ticker()
+        for i in range(1, len(ticker) + 1):
+            if self.stop.is_set():
+                return
+            self.get("/api/reits?search=", "/api/reits", params={"search": ticker[:i]})
+            self.think(KEYSTROKE_GAP)
+        if self.rng.random() < 0.6:
+            self.detail(ticker)
+
+    def detail(self, ticker=None):
+        ticker = ticker or self.pick_ticker()
+        calls = [
+            ("/api/reits?ticker=", f"/api/reits?ticker={ticker}"),
+            ("/api/reits/<ticker>/price", f"/api/reits/{ticker}/price"),
+            ("/api/reits/<ticker>/financials", f"/api/reits/{ticker}/financials?include_scores=true"),
+            ("/api/reits/<ticker>/breakdowns", f"/api/reits/{ticker}/breakdowns"),
+        ]
+        # Promise.all in DetailPage.js: all four in flight at once
+        futures = [self.fan_out_pool.submit(self.get, route, path) for route, path in calls]
+        for future in futures:
+            future.result()
+        self.think(PAGE_DWELL)
+        if self.rng.random() < 0.3 and not self.stop.is_set():
+            statement_type = self.rng.choice(["is", "bs", "cf", "industry"])
+            self.get("/api/reits/<ticker>/statements/quarterly",
+                     f"/api/reits/{ticker}/statements/quarterly?type={statement_type}")
+            self.think(PAGE_DWELL)
+
+    def analysis(self):
+        ticker = self.pick_ticker()
+        response = self.post("/api/reits/<ticker>/start-analysis", f"/api/reits/{ticker}/start-analysis")
+        if response is None or response.status_code != 202:
+            return
+        task_id = response.json()["task_id"]
+        # setInterval(pollForResult, 4000): first poll 4s after the job starts
+        for _ in range(self.max_polls):
+            if self.stop.wait(self.poll_interval):
+                return
+            poll = self.get("/api/reits/analysis-result/<task_id>", f"/api/reits/analysis-result/{task_id}")
+            if poll is None or poll.status_code != 202:
+                return
+
+    def filter(self, params=None):
+        if params is None:
+            params = {}
+            for prefix, low, high in self.rng.sample(FILTER_BOUNDS, self.rng.randint(1, 3)):
+                bound = "min" if self.rng.random() < 0.5 else "max"
+                params[f"{bound}_{prefix}"] = round(self.rng.uniform(low, high), 3)
+        self.get("/api/reits/advanced-filter", "/api/reits/advanced-filter", params=params)
+        self.think(PAGE_DWELL)
+
+    def llm(self):
+        response = self.post("/api/llm-filter", "/api/llm-filter", json={"query": self.rng.choice(LLM_QUERIES)})
+        if response is not None and response.status_code == 200:
+            # The same {"explanation", "filters"} payload LlmScreenerPage.js reads
+            self.filter(response.json()["filters"])
+
+    def checkout(self):
+        self.post("/api/create-checkout-session", "/api/create-checkout-session",
+                  json={"email": f"load-{self.rng.randint(0, 10**6)}@example.com"})
+
+    def run(self, mix):
+        names = list(mix)
+        weights = [mix[n] for n in names]
+        while not self.stop.is_set():
+            getattr(self, self.rng.choices(names, weights)[0])()
+            self.think(SESSION_GAP)
+        self.fan_out_pool.shutdown(wait=False)
+
+
+# -------------------------------------------------------------------------
+# Reporting
+# -------------------------------------------------------------------------
+def latency_summary(latencies):
+    ms = np.asarray(latencies) * 1000
+    return {
+        "count": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+def summarize_stage(users, samples, seconds):
+    routes = {}
+    for route, status, latency, _ in samples:
+        routes.setdefault(route, {"latencies": [], "errors": 0})
+        routes[route]["latencies"].append(latency)
+        if status == 0 or status >= 500:
+            routes[route]["errors"] += 1
+    return {
+        "users": users,
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / seconds, 2),
+        "errors": sum(r["errors"] for r in routes.values()),
+        "overall": latency_summary([s[2] for s in samples]) if samples else None,
+        "routes": {
+            route: dict(latency_summary(r["latencies"]), errors=r["errors"])
+            for route, r in sorted(routes.items())
+        },
+    }
+
+
+def find_saturation(stages, min_gain=0.05):
+    """
+    The stage with peak throughput, and the knee: the first stage after which
+    adding users raised throughput by less than min_gain.
+    """
+    if not stages:
+        return None
+    peak = max(stages, key=lambda s: s["throughput_rps"])
+    knee = stages[-1]
+    for prev, cur in zip(stages, stages[1:]):
+        if cur["throughput_rps"] < prev["throughput_rps"] * (1 + min_gain):
+            knee = prev
+            break
+    return {
+        "peak_throughput_rps": peak["throughput_rps"],
+        "peak_users": peak["users"],
+        "knee_users": knee["users"],
+        "knee_throughput_rps": knee["throughput_rps"],
+        "knee_p99_ms": knee["overall"]["p99_ms"] if knee["overall"] else None,
+    }
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        if name.strip() not in SESSION_TYPES:
+            raise ValueError(f"Unknown session type '{name}'")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+# -------------------------------------------------------------------------
+# Commands
+# -------------------------------------------------------------------------
+def prepare(args):
+    from benchmarks.synthetic_universe import generate_universe, load_universe
+    from benchmarks.sqlite_standin import create_standin_engine
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    tables = generate_universe(args.tickers, args.quarters, args.days, args.seed)
+    counts = load_universe(create_standin_engine(args.db), tables)
+    print(json.dumps({"db": args.db, "rows": counts}, indent=2))
+
+
+def serve_command(args):
+    """argv to run the stubbed instance, preferring gunicorn like the Procfile."""
+    if shutil.which("gunicorn") and not args.werkzeug:
+        return [
+            "gunicorn", "benchmarks.stub_wsgi:app",
+            "--bind", f"127.0.0.1:{args.port}",
+            "--workers", str(args.workers),
+            "--threads", str(args.threads),
+            "--log-level", "warning",
+        ]
+    return [
+        sys.executable, "-c",
+        "from werkzeug.serving import run_simple; from benchmarks.stub_wsgi import app; "
+        f"run_simple('127.0.0.1', {args.port}, app, threaded=True)",
+    ]
+
+
+def serve_env(args):
+    env = dict(os.environ)
+    env.update({
+        "LOAD_DB_PATH": os.path.abspath(args.db),
+        "STUB_GEMINI_LATENCY": str(args.gemini_latency),
+        "STUB_STRIPE_LATENCY": str(args.stripe_latency),
+        "STUB_ANALYSIS_WORKERS": str(args.analysis_workers),
+        "STUB_LOG_LEVEL": args.log_level,
+        "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+    })
+    return env
+
+
+def serve(args):
+    os.execvpe(serve_command(args)[0], serve_command(args), serve_env(args))
+
+
+def wait_until_up(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(base_url + "/", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout}s")
+
+
+def run_stage(base_url, tickers, users, args, mix, seed):
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = []
+    for i in range(users):
+        user = VirtualUser(base_url, tickers, recorder, stop, random.Random(seed * 1000 + i),
+                           args.think_scale, args.poll_interval, args.max_polls)
+        thread = threading.Thread(target=user.run, args=(mix,), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    start = time.perf_counter()
+    measure_start = start + args.warmup_seconds
+    measure_end = measure_start + args.stage_seconds
+    time.sleep(max(measure_end - time.perf_counter(), 0))
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=130)
+    return summarize_stage(users, recorder.window(measure_start, measure_end), args.stage_seconds)
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        workdir = tempfile.mkdtemp(prefix="reit_load_")
+        args.db = os.path.join(workdir, "load.sqlite")
+        prepare(args)
+        server = subprocess.Popen(serve_command(args), env=serve_env(args), cwd=BACKEND_DIR)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        wait_until_up(base_url)
+        tickers = [r["Ticker"] for r in requests.get(base_url + "/api/reits", params={"fields": "Ticker"}).json()["reits"]]
+
+        stages = []
+        for n, users in enumerate(int(u) for u in args.users.split(",")):
+            stage = run_stage(base_url, tickers, users, args, mix, args.seed + n)
+            stages.append(stage)
+            print(f"{users:>4} users: {stage['throughput_rps']:>8.2f} req/s, "
+                  f"p99 {stage['overall']['p99_ms'] if stage['overall'] else 'n/a'} ms, "
+                  f"{stage['errors']} errors", file=sys.stderr)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "base_url": base_url,
+        "mix": mix,
+        "think_scale": args.think_scale,
+        "stage_seconds": args.stage_seconds,
+        "saturation": find_saturation(stages),
+        "stages": stages,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_universe_args(p):
+        p.add_argument("--tickers", type=int, default=200)
+        p.add_argument("--quarters", type=int, default=40)
+        p.add_argument("--days", type=int, default=2520)
+        p.add_argument("--seed", type=int, default=0)
+
+    def add_serve_args(p):
+        p.add_argument("--port", type=int, default=5055)
+        p.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+        p.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+        p.add_argument("--werkzeug", action="store_true", help="Use the werkzeug server even if gunicorn is installed")
+        p.add_argument("--gemini-latency", type=float, default=1.5)
+        p.add_argument("--stripe-latency", type=float, default=0.3)
+        p.add_argument("--analysis-workers", type=int, default=4, help="Threads standing in for Celery workers")
+        p.add_argument("--log-level", default="warning", help="App log level on the server (info matches production)")
+
+    p = commands.add_parser("prepare", help="Build the synthetic SQLite database")
+    p.add_argument("--db", required=True)
+    add_universe_args(p)
+    p.set_defaults(func=prepare)
+
+    p = commands.add_parser("serve", help="Run a stubbed local instance")
+    p.add_argument("--db", required=True)
+    add_serve_args(p)
+    p.set_defaults(func=serve)
+
+    p = commands.add_parser("run", help="Replay traffic and report latencies")
+    p.add_argument("--base-url", help="Target instance (default: prepare and serve one locally)")
+    p.add_argument("--users", default="1,2,4,8,16,32", help="Concurrent users per stage")
+    p.add_argument("--stage-seconds", type=float, default=30)
+    p.add_argument("--warmup-seconds", type=float, default=5)
+    p.add_argument("--mix", default=DEFAULT_MIX)
+    p.add_argument("--think-scale", type=float, default=1.0, help="Multiplier on think times; 0 for closed-loop")
+    p.add_argument("--poll-interval", type=float, default=4.0)
+    p.add_argument("--max-polls", type=int, default=15)
+    p.add_argument("--output")
+    add_universe_args(p)
+    add_serve_args(p)
+    p.set_defaults(func=run)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    main()
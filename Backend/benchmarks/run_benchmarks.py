@@ -0,0 +1,191 @@
+# run_benchmarks.py
+"""
+Benchmark suite for the screener API and the risk-scoring script.
+
+Generates a synthetic universe, loads it into a local SQLite stand-in, and
+times the API endpoints through Flask's test client (query, pandas work and
+JSON serialization included) plus a full run of
+"Python Run/2. Stock data analysis - risk.py". Results are written as JSON so
+runs can be compared across commits.
+
+Run from Backend/:
+    python -m benchmarks.run_benchmarks --tickers 200 --quarters 40 --days 2520 \
+        --repeat 5 --output bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_universe import generate_universe, load_universe
+from benchmarks.sqlite_standin import create_standin_engine, install_mysql_compat
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_DIR = os.path.join(BACKEND_DIR, "..", "Python Run")
+RISK_SCRIPT = os.path.join(SCRIPT_DIR, "2. Stock data analysis - risk.py")
+
+
+def summarize(samples):
+    """Timing samples (seconds) -> summary in milliseconds."""
+    ms = np.asarray(samples) * 1000
+    return {
+        "runs": len(ms),
+        "min_ms": round(float(ms.min()), 3),
+        "median_ms": round(float(np.median(ms)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def time_call(fn, repeat, warmup=1):
+    """Runs fn warmup + repeat times; returns the timed durations in seconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def endpoint_cases(tickers):
+    """(name, [urls]) for each benchmarked endpoint; urls rotate across runs."""
+    sample = tickers[:20]
+    return [
+        ("get_reits", ["/api/reits"]),
+        ("get_reits_search", [f"/api/reits?search={t[:2]}" for t in sample]),
+        ("get_advanced_filtered_reits", ["/api/reits/advanced-filter?min_operating_margin=0"]),
+        ("get_advanced_filtered_reits_sorted", [
+            "/api/reits/advanced-filter?sort=pffo_ratio&order=asc&limit=25&facets=true"
+        ]),
+        ("get_price_data", [f"/api/reits/{t}/price" for t in sample]),
+        ("get_financials", [f"/api/reits/{t}/financials?include_scores=true" for t in sample]),
+    ]
+
+
+def bench_endpoints(client, tickers, repeat):
+    results = {}
+    for name, urls in endpoint_cases(tickers):
+        calls = iter(urls * (repeat + 1))
+
+        def call():
+            url = next(calls)
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+        results[name] = summarize(time_call(call, repeat))
+    return results
+
+
+def bench_risk_scoring(repeat):
+    """Times a full run of script 2 (load prices, compute, write scores)."""
+    # The script imports its helper modules (db_upsert, bulk_load, sharding)
+    # from its own directory, which runpy does not put on sys.path
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            runpy.run_path(RISK_SCRIPT, run_name="__main__")
+    return summarize(time_call(run, repeat, warmup=0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--quarters", type=int, default=40)
+    parser.add_argument("--days", type=int, default=2520)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", help="SQLite file for the stand-in database (default: a temp file)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--skip-risk", action="store_true", help="Skip the risk-scoring script")
+    parser.add_argument("--log", action="store_true", help="Keep the app's INFO logging on while timing")
+    args = parser.parse_args(argv)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="reit_bench_"), "bench.sqlite")
+
+    # The app reads DATABASE_URL at import time, and the local mirror must not
+    # shadow the stand-in database
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["REIT_MIRROR_DIR"] = os.path.join(os.path.dirname(db_path), "mirror")
+
+    start = time.perf_counter()
+    tables = generate_universe(args.tickers, args.quarters, args.days, args.seed)
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    row_counts = load_universe(create_standin_engine(db_path), tables)
+    load_seconds = time.perf_counter() - start
+    tickers = list(tables["reit_business_data"]["Ticker"])
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app, db
+
+    if not args.log:
+        app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        install_mysql_compat(db.engine)
+
+    results = bench_endpoints(app.test_client(), tickers, args.repeat)
+    if not args.skip_risk:
+        results["risk_scoring"] = bench_risk_scoring(args.repeat)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": pd.Timestamp.now(tz="UTC").isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "scale": {
+            "tickers": args.tickers,
+            "quarters": args.quarters,
+            "days": args.days,
+            "seed": args.seed,
+            "rows": row_counts,
+        },
+        "setup_seconds": {
+            "generate": round(generate_seconds, 3),
+            "load": round(load_seconds, 3),
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# service_stubs.py
+"""
+In-process stand-ins for the external services the API calls, so a local
+instance can be load tested without hitting Gemini, Stripe or Redis:
+
+  - Gemini: requests.post to generativelanguage.googleapis.com returns a
+    canned response after a configurable latency
+  - Stripe: stripe.checkout.Session.create returns a fake session
+  - Celery: generate_stability_analysis_task.delay() runs the real task on a
+    local thread pool and stores its result in a filesystem result backend
+    shared by all server processes, so /analysis-result polling behaves as
+    with a real worker
+"""
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import requests
+import stripe
+
+GEMINI_HOST = "generativelanguage.googleapis.com"
+
+STUB_FILTERS = {"min_operating_margin": 0.1, "max_debt_to_asset": 0.6}
+STUB_EXPLANATION = (
+    "Its stock price has been more stable than its peers, but returns have "
+    "lagged. Sudden drops have been rare."
+)
+
+
+class _StubResponse:
+    def __init__(self, payload):
+        self._payload = payload
+        self.status_code = 200
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+def _gemini_payload(request_json):
+    # JSON mode is the LLM filter, whose prompt asks for {"explanation", "filters"}
+    wants_json = (request_json or {}).get("generationConfig", {}).get("response_mime_type") == "application/json"
+    if wants_json:
+        text = json.dumps({"explanation": STUB_EXPLANATION, "filters": STUB_FILTERS})
+    else:
+        text = STUB_EXPLANATION
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+def install_service_stubs(results_dir, gemini_latency=1.5, stripe_latency=0.3, analysis_workers=4):
+    """
+    Patches the Gemini, Stripe and Celery entry points used by app and
+    worker. Task results are written under results_dir.
+    """
+    real_post = requests.post
+
+    def post(url, *args, **kwargs):
+        if GEMINI_HOST in str(url):
+            time.sleep(gemini_latency)
+            return _StubResponse(_gemini_payload(kwargs.get("json")))
+        return real_post(url, *args, **kwargs)
+
+    requests.post = post
+
+    def create_session(**kwargs):
+        time.sleep(stripe_latency)
+        session_id = f"cs_test_{uuid.uuid4().hex[:24]}"
+        return SimpleNamespace(id=session_id, url=f"https://checkout.stripe.com/c/pay/{session_id}")
+
+    stripe.checkout.Session.create = create_session
+
+    from worker import celery_app, generate_stability_analysis_task
+
+    os.makedirs(results_dir, exist_ok=True)
+    celery_app.conf.update(
+        broker_url="memory://",
+        result_backend=f"file://{results_dir}",
+        task_always_eager=True,
+        task_store_eager_result=True,
+    )
+    pool = ThreadPoolExecutor(max_workers=analysis_workers, thread_name_prefix="stub-celery")
+
+    def delay(*args, **kwargs):
+        task_id = str(uuid.uuid4())
+        pool.submit(generate_stability_analysis_task.apply, args=args, kwargs=kwargs, task_id=task_id)
+        return SimpleNamespace(id=task_id)
+
+    generate_stability_analysis_task.delay = delay
+    return pool
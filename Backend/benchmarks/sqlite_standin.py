@@ -0,0 +1,65 @@
+# sqlite_standin.py
+"""
+Lets the app's MySQL-flavoured SQL run unchanged on a local SQLite file.
+
+Only the constructs the API actually uses are covered:
+  - `IN :tickers` with a tuple parameter (expanded to IN (?, ?, ...)),
+    which PyMySQL supports natively and sqlite3 does not
+  - YEAR(), QUARTER() and FIELD()
+Backtick identifiers and ROW_NUMBER() OVER (...) are supported by SQLite.
+"""
+import sqlite3
+
+from sqlalchemy import create_engine, event
+
+
+def _year(value):
+    return int(str(value)[:4]) if value is not None else None
+
+
+def _quarter(value):
+    return (int(str(value)[5:7]) - 1) // 3 + 1 if value is not None else None
+
+
+def _field(value, *options):
+    return options.index(value) + 1 if value in options else 0
+
+
+def install_mysql_compat(engine):
+    """Registers the compatibility hooks on a SQLite engine."""
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_conn, connection_record):
+        dbapi_conn.create_function("YEAR", 1, _year, deterministic=True)
+        dbapi_conn.create_function("QUARTER", 1, _quarter, deterministic=True)
+        dbapi_conn.create_function("FIELD", -1, _field, deterministic=True)
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _expand_tuple_params(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not any(isinstance(p, (tuple, list)) for p in parameters):
+            return statement, parameters
+        # The app's SQL has no literal '?', so every one is a placeholder
+        pieces = statement.split("?")
+        expanded_sql = [pieces[0]]
+        expanded_params = []
+        for param, piece in zip(parameters, pieces[1:]):
+            if isinstance(param, (tuple, list)):
+                expanded_sql.append("(" + ", ".join("?" * len(param)) + ")")
+                expanded_params.extend(param)
+            else:
+                expanded_sql.append("?")
+                expanded_params.append(param)
+            expanded_sql.append(piece)
+        return "".join(expanded_sql), tuple(expanded_params)
+
+    return engine
+
+
+def create_standin_engine(path, parse_dates=False):
+    """
+    SQLite engine at `path` with the MySQL compatibility hooks installed.
+    With parse_dates, DATE / TIMESTAMP columns are read back as date and
+    datetime objects, as PyMySQL returns them, instead of strings.
+    """
+    connect_args = {"detect_types": sqlite3.PARSE_DECLTYPES} if parse_dates else {}
+    return install_mysql_compat(create_engine(f"sqlite:///{path}", connect_args=connect_args))
@@ -0,0 +1,29 @@
+# stub_wsgi.py
+"""
+WSGI entry point for a local, stubbed instance of the API (see
+load_replay.py). Reads LOAD_DB_PATH (a SQLite file built by
+`load_replay prepare`), the stub latencies and STUB_LOG_LEVEL from the
+environment:
+
+    LOAD_DB_PATH=/tmp/reit_load.sqlite gunicorn benchmarks.stub_wsgi:app -w 4 --threads 8
+"""
+import os
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.environ['LOAD_DB_PATH']}"
+os.environ.setdefault("REIT_MIRROR_DIR", os.path.join(os.path.dirname(os.environ["LOAD_DB_PATH"]), "mirror"))
+os.environ.setdefault("GEMINI_API_KEY", "stub")
+
+from app import app, db  # noqa: E402
+from benchmarks.service_stubs import install_service_stubs  # noqa: E402
+from benchmarks.sqlite_standin import install_mysql_compat  # noqa: E402
+
+app.logger.setLevel(os.getenv("STUB_LOG_LEVEL", "WARNING").upper())
+with app.app_context():
+    install_mysql_compat(db.engine)
+
+install_service_stubs(
+    os.path.join(os.path.dirname(os.environ["LOAD_DB_PATH"]), "celery_results"),
+    gemini_latency=float(os.getenv("STUB_GEMINI_LATENCY", 1.5)),
+    stripe_latency=float(os.getenv("STUB_STRIPE_LATENCY", 0.3)),
+    analysis_workers=int(os.getenv("STUB_ANALYSIS_WORKERS", 4)),
+)
@@ -0,0 +1,237 @@
+# synthetic_universe.py
+"""
+Synthetic REIT universe for benchmarks: reit_business_data,
+reit_scoring_analysis, reit_price_data, reit_latest_price,
+reit_portfolio_analysis and the four statement tables at a configurable scale of N tickers x Q quarters x D trading days.
+
+Values are random but shaped like the production tables (same columns,
+names and line items), so the API code paths do the same work they do on the
+real database.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+PROPERTY_TYPES = [
+    "Office", "Retail", "Industrial", "Residential", "Healthcare",
+    "Hotel", "Data Center", "Self Storage", "Diversified", "Specialty",
+]
+COUNTRIES = ["United States", "United States", "United States", "Canada", "Singapore", "Australia"]
+
+# The line items read by the API (METRIC_CONFIG and the overview endpoint),
+# grouped by the statement table they live in
+STATEMENT_LINE_ITEMS = {
+    "reit_income_statement": [
+        "Total Revenue", "Operating Income", "EBIT", "Interest Expense, Total",
+        "Basic EPS", "EBITDA", "Dividends per Share",
+    ],
+    "reit_balance_sheet": ["Total Debt", "Total Assets", "Net Debt"],
+    "reit_cash_flow": ["Cash from Operations", "Capital Expenditure"],
+    "reit_industry_metrics": [
+        "FFO", "FFO Payout Ratio", "FFO per Share (Basic)", "FFO / Total Revenue %",
+    ],
+}
+
+LIQUIDITY_TIERS = ["Excellent", "Good", "Moderate", "Low", "Very Low"]
+
+
+def make_tickers(n_tickers, rng):
+    """n unique 3-4 letter tickers in random order."""
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    pool = ["".join(p) for p in itertools.product(letters, repeat=3)]
+    if n_tickers > len(pool):
+        pool += ["".join(p) for p in itertools.product(letters, repeat=4)]
+    return list(rng.choice(pool, size=n_tickers, replace=False))
+
+
+def make_business_data(tickers, rng):
+    n = len(tickers)
+    primary = rng.choice(PROPERTY_TYPES, size=n)
+    secondary = rng.choice(PROPERTY_TYPES, size=n)
+    property_type = np.where(rng.random(n) < 0.3, np.char.add(np.char.add(primary, ", "), secondary), primary)
+    return pd.DataFrame({
+        "Ticker": tickers,
+        "Company_Name": [f"{t} Realty Trust" for t in tickers],
+        "Business_Description": [
+            f"{t} owns and operates a portfolio of {p.lower()} properties. " * 4 for t, p in zip(tickers, primary)
+        ],
+        "Website": [f"https://www.{t.lower()}reit.com" for t in tickers],
+        "Numbers_Employee": rng.integers(20, 5000, size=n),
+        "Target_Price": np.round(rng.uniform(5, 200, size=n), 2),
+        "Year_Founded": rng.integers(1960, 2020, size=n),
+        "US_Investment_Regions": rng.choice(["Northeast", "South", "Midwest", "West", "National"], size=n),
+        "Overseas_Investment": rng.choice(["Yes", "No"], size=n),
+        "Property_Type": property_type,
+        "Country_Region": rng.choice(COUNTRIES, size=n),
+        "Total_Real_Estate_Assets_M_": np.round(rng.lognormal(8, 1.2, size=n), 1),
+        "5yr_FFO_Growth": np.round(rng.normal(0.03, 0.05, size=n), 4),
+        "FFO_PS_Annualized": np.round(rng.uniform(0.2, 8, size=n), 2),
+    })
+
+
+def make_scoring_analysis(tickers, rng):
+    """Columns written by scripts 2 and 3."""
+    n = len(tickers)
+    daily = rng.normal(0.0003, 0.0004, size=n)
+    std = rng.uniform(0.01, 0.04, size=n)
+    skew = rng.normal(-0.2, 0.6, size=n)
+    kurt = rng.uniform(2, 15, size=n)
+    volume = rng.lognormal(13, 1.5, size=n)
+    dollar_volume = volume * rng.uniform(5, 150, size=n)
+
+    def z(x):
+        return (x - x.mean()) / x.std()
+
+    risk_score = 2.0 * z(std) + 0.7 * -np.abs(z(skew)) + 0.5 * z(np.abs(kurt - 3)) - z(daily)
+    risk_pct = pd.Series(risk_score).rank(pct=True).to_numpy() * 100
+    fundamental = rng.normal(0, 1, size=n)
+    return pd.DataFrame({
+        "Ticker": tickers,
+        "Average Daily Return": daily,
+        "Average Annual Return": daily * 252,
+        "Standard Deviation": std,
+        "Skewness": skew,
+        "Kurtosis": kurt,
+        "Average Volume": volume,
+        "Average Dollar Volume": dollar_volume,
+        "Data Length": rng.integers(250, 5000, size=n),
+        "Adjusted Kurtosis": np.abs(kurt - 3),
+        "Data Length Factor": rng.uniform(0.2, 1, size=n),
+        "Risk Score": risk_score,
+        "Risk Percentile": risk_pct,
+        "Stability Percentile": 100 - risk_pct,
+        "Z_Score_Std_Dev": z(std),
+        "Z_Score_Return": z(daily),
+        "Z_Score_Skew": -np.abs(z(skew)),
+        "Z_Score_Kurtosis": z(np.abs(kurt - 3)),
+        "Z_Score_Illiquidity": -z(volume),
+        "P_Rank_Return": rng.integers(0, 101, size=n).astype(float),
+        "P_Rank_Volatility": rng.integers(0, 101, size=n).astype(float),
+        "P_Rank_Skew": rng.integers(0, 101, size=n).astype(float),
+        "P_Rank_Kurtosis": rng.integers(0, 101, size=n).astype(float),
+        "Liquidity_Tier": rng.choice(LIQUIDITY_TIERS, size=n),
+        "FFO_Payout_Score": rng.uniform(0, 1, size=n),
+        "FFO_Yield": rng.uniform(0.01, 0.15, size=n),
+        "FFO_Yield_Z": rng.normal(0, 1, size=n),
+        "5YR_FFO_Growth_Z": rng.normal(0, 1, size=n),
+        "Fundamental_Score": fundamental,
+        "Fundamental_Percentile": pd.Series(fundamental).rank(pct=True).to_numpy() * 100,
+    })
+
+
+def make_price_data(tickers, n_days, rng, end_date="2025-06-30"):
+    """Geometric random-walk closes over the last n_days business days."""
+    dates = pd.bdate_range(end=end_date, periods=n_days)
+    frames = []
+    for ticker in tickers:
+        # Some REITs listed later and have a shorter history
+        start = 0 if rng.random() < 0.8 else int(rng.integers(0, max(n_days - 20, 1)))
+        days = n_days - start
+        returns = rng.normal(0.0003, rng.uniform(0.01, 0.03), size=days)
+        closes = rng.uniform(10, 100) * np.exp(np.cumsum(returns))
+        frames.append(pd.DataFrame({
+            "date": dates[start:].date,
+            "ticker": ticker,
+            "close_price": np.round(closes, 4),
+            "volume": np.round(rng.lognormal(13, 1.0, size=days)),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def make_latest_prices(price_data):
+    """reit_latest_price: each ticker's last row of price_data."""
+    return (price_data.sort_values("date")
+            .drop_duplicates(subset=["ticker"], keep="last")
+            .sort_values("ticker", ignore_index=True))
+
+
+def make_statement_data(tickers, n_quarters, rng, last_year=2025, last_quarter=1):
+    """Quarterly rows for every STATEMENT_LINE_ITEMS item, one frame per table."""
+    last = last_year * 4 + last_quarter - 1
+    tables = {}
+    for table_name, line_items in STATEMENT_LINE_ITEMS.items():
+        frames = []
+        for ticker in tickers:
+            # Recent listings report fewer quarters
+            n = n_quarters if rng.random() < 0.85 else int(rng.integers(1, n_quarters + 1))
+            quarters = np.arange(last - n + 1, last + 1)
+            for row_index, line_item in enumerate(line_items):
+                base = rng.lognormal(4, 1.5)
+                growth = np.cumprod(1 + rng.normal(0.01, 0.05, size=n))
+                values = base * growth
+                # ~3% of values missing, as in the scraped source files
+                values[rng.random(n) < 0.03] = np.nan
+                frames.append(pd.DataFrame({
+                    "ticker": ticker,
+                    "line_item": line_item,
+                    "fiscal_year": quarters // 4,
+                    "fiscal_quarter": quarters % 4 + 1,
+                    "value": values,
+                    "excel_row_index": row_index,
+                }))
+        table = pd.concat(frames, ignore_index=True)
+        # The AUTO_INCREMENT key of the real tables
+        table.insert(0, "id", np.arange(1, len(table) + 1))
+        tables[table_name] = table
+    return tables
+
+
+def make_portfolio_analysis(tickers, rng):
+    """reit_portfolio_analysis rows for the four breakdown types."""
+    categories = {
+        "property_type": PROPERTY_TYPES,
+        "secondary_type": ["Class A", "Class B", "Class C", "Flex", "Warehouse", "Garden"],
+        "state": ["CA", "TX", "NY", "FL", "IL", "WA", "GA", "MA", "CO", "AZ"],
+        "country": ["United States", "Canada", "United Kingdom", "Mexico"],
+    }
+    rows = []
+    for ticker in tickers:
+        for breakdown_type, options in categories.items():
+            chosen = rng.choice(options, size=int(rng.integers(1, len(options) + 1)), replace=False)
+            gla = rng.lognormal(13, 1, size=len(chosen))
+            for category, rba_gla in zip(chosen, gla):
+                rows.append((ticker, breakdown_type, category, rba_gla, rba_gla / gla.sum(), "CoStar", "RBA"))
+    return pd.DataFrame(rows, columns=["ticker", "breakdown_type", "category", "rba_gla", "pct", "source", "basis"])
+
+
+def generate_universe(n_tickers=200, n_quarters=40, n_days=2520, seed=0):
+    """All synthetic tables as {table_name: DataFrame}."""
+    rng = np.random.default_rng(seed)
+    tickers = make_tickers(n_tickers, rng)
+    tables = {
+        "reit_business_data": make_business_data(tickers, rng),
+        "reit_scoring_analysis": make_scoring_analysis(tickers, rng),
+        "reit_price_data": make_price_data(tickers, n_days, rng),
+        "reit_portfolio_analysis": make_portfolio_analysis(tickers, rng),
+    }
+    tables["reit_latest_price"] = make_latest_prices(tables["reit_price_data"])
+    tables.update(make_statement_data(tickers, n_quarters, rng))
+    return tables
+
+
+def load_universe(engine, tables):
+    """
+    Writes the tables (replacing any existing ones) with the same primary
+    and unique keys as production. Returns {table_name: row_count}.
+    """
+    indexes = {
+        "reit_price_data": "CREATE UNIQUE INDEX idx_price_pk ON reit_price_data (date, ticker)",
+        "reit_latest_price": "CREATE UNIQUE INDEX idx_latest_price_ticker ON reit_latest_price (ticker)",
+        "reit_business_data": "CREATE UNIQUE INDEX idx_business_ticker ON reit_business_data (Ticker)",
+    }
+    for table_name in STATEMENT_LINE_ITEMS:
+        indexes[table_name] = (
+            f"CREATE UNIQUE INDEX idx_{table_name}_row "
+            f"ON {table_name} (ticker, line_item, fiscal_year, fiscal_quarter)"
+        )
+
+    counts = {}
+    with engine.begin() as conn:
+        for table_name, df in tables.items():
+            df.to_sql(table_name, con=conn, if_exists="replace", index=False, chunksize=50_000)
+            if table_name in indexes:
+                conn.execute(text(indexes[table_name]))
+            counts[table_name] = len(df)
+    return counts
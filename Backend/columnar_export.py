@@ -0,0 +1,162 @@
+# columnar_export.py
+"""
+Streams query results as Arrow IPC or Parquet for bulk consumers (notebooks,
+power users) instead of JSON records.
+
+Rows are read from MySQL in chunks, converted to Arrow record batches and
+written to the response as they arrive, so memory stays bounded by one chunk
+and the client can start decoding before the query finishes.
+"""
+import struct
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+EXPORT_CHUNK_ROWS = 50_000
+
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parse_export_format(args):
+    """Returns 'arrow' or 'parquet'. Raises ValueError otherwise."""
+    export_format = args.get("format", "arrow").lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError("Invalid 'format' parameter. Must be arrow|parquet.")
+    return export_format
+
+
+def resolve_columns(conn, table_name, requested):
+    """
+    Validates a comma-separated column projection against the table's
+    columns. Returns all columns when nothing was requested.
+    """
+    available = list(pd.read_sql(text(f"SELECT * FROM {table_name} LIMIT 0"), conn).columns)
+    if not requested:
+        return available
+    columns = [c.strip() for c in requested.split(",") if c.strip()]
+    unknown = [c for c in columns if c not in available]
+    if unknown:
+        raise ValueError(f"Invalid 'columns' parameter: {', '.join(unknown)}")
+    return columns
+
+
+def _record_batches(engine, sql, params):
+    """
+    Yields Arrow record batches for a query, cast to the first chunk's
+    schema. Always yields at least one (possibly empty) batch so the writer
+    has a schema to emit.
+    """
+    schema = None
+    yielded = False
+    # Server-side cursor: PyMySQL's default cursor would buffer the whole
+    # result before the first chunk is yielded
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(sql, conn, params=params, chunksize=EXPORT_CHUNK_ROWS):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if schema is None:
+                # A column that is entirely NULL in the first chunk has no type
+                # yet; export it as string so later chunks can be cast to it.
+                schema = pa.schema([
+                    pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                    for f in table.schema
+                ])
+            for batch in table.cast(schema).to_batches():
+                yielded = True
+                yield batch
+    if not yielded:
+        yield pa.RecordBatch.from_pylist([], schema=schema or pa.schema([]))
+
+
+def _open_writer(sink, schema, export_format):
+    if export_format == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="snappy")
+    return pa.ipc.new_stream(sink, schema)
+
+
+def _write_batch(writer, batch, export_format):
+    if export_format == "parquet":
+        writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer.write_batch(batch)
+
+
+def open_export(engine, sql, params, export_format, logger):
+    """
+    Runs `sql` and encodes its first chunk, then returns a generator of the
+    response bytes: an Arrow IPC stream or a Parquet file (one row group per
+    chunk).
+
+    Query and schema errors in the first chunk raise here, before anything
+    is sent, so the endpoint can still answer with an error status. A later
+    chunk that fails is logged and ends the stream without its footer (see
+    _truncate), so the client gets an unreadable file rather than a
+    silently short one.
+    """
+    batches = _record_batches(engine, sql, params)
+    try:
+        first = next(batches)
+        sink = _ChunkSink()
+        writer = _open_writer(sink, first.schema, export_format)
+        _write_batch(writer, first, export_format)
+    except Exception:
+        batches.close()
+        raise
+    return _stream(batches, writer, sink, export_format, logger)
+
+
+def _stream(batches, writer, sink, export_format, logger):
+    try:
+        yield sink.drain()
+        for batch in batches:
+            _write_batch(writer, batch, export_format)
+            data = sink.drain()
+            if data:
+                yield data
+    except Exception as e:
+        logger.error(f"Export stream failed after its first chunk; sending a truncated file: {e}")
+        yield _truncate(export_format)
+        return
+    finally:
+        batches.close()
+    writer.close()
+    yield sink.drain()
+
+
+def _truncate(export_format):
+    """
+    Trailing bytes that make a partial export fail to decode. A Parquet file
+    without its footer is already unreadable, but an Arrow IPC stream may end
+    after any message, so this sends the start of a message whose metadata
+    never arrives.
+    """
+    if export_format == "parquet":
+        return b""
+    return b"\xff\xff\xff\xff" + struct.pack("<i", 1 << 20)
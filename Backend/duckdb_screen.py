@@ -0,0 +1,204 @@
+# duckdb_screen.py
+"""
+Embedded DuckDB engine for the advanced filter (?engine=duckdb).
+
+The pandas path pulls every statement row over a four-way UNION ALL and runs
+calculate_metrics_for_ticker() once per ticker. Here the same METRIC_CONFIG
+metrics are computed in one vectorized, multi-threaded DuckDB query over the
+local Arrow mirror (local_mirror.py), with TTM, YoY and latest values written
+as window functions over each (ticker, line item) series:
+
+    ttm     -> SUM over the 4-quarter RANGE frame ending at the latest quarter,
+               only when all 4 quarters are reported
+    yoy     -> value / the value 4 quarters earlier (RANGE 4 PRECEDING) - 1
+    avg_yoy -> AVG of the last 4 yoy values, only when all 4 exist
+    latest  -> LAST_VALUE(... IGNORE NULLS) of the series
+
+"Latest quarter" is per ticker: the last quarter with any fetched line item,
+as in the pandas path. Zero values count as missing, as in load_statement_rows().
+Where a (ticker, line item, quarter) has several rows, the most recent one
+(later statement table, then higher id) is used, like the pandas path, which
+keeps the last of load_statement_rows()' ordered rows.
+"""
+import duckdb
+import pandas as pd
+
+from local_mirror import read_table
+
+STATEMENT_TABLES = [
+    "reit_income_statement",
+    "reit_industry_metrics",
+    "reit_balance_sheet",
+    "reit_cash_flow",
+]
+
+# calculation_type -> SQL over the per-item kernels of its line_items.
+# {ttm0}, {latest1}, ... name kernel columns; `price` is the latest close.
+CALCULATION_SQL = {
+    'ttm_margin': "CASE WHEN {ttm1} <> 0 THEN {ttm0} / {ttm1} END",
+    'avg_yoy_growth': "{avg_yoy0}",
+    'ttm_ratio': "CASE WHEN {ttm1} <> 0 THEN {ttm0} / ABS({ttm1}) END",
+    'latest_ratio': "CASE WHEN {latest1} <> 0 THEN {latest0} / {latest1} END",
+    'latest_value': "{latest0}",
+    'price_to_ttm_value': "CASE WHEN {ttm0} > 0 THEN price / {ttm0} END",
+    'latest_to_ttm_ratio': "CASE WHEN {ttm1} <> 0 THEN {latest0} / {ttm1} END",
+}
+
+SERIES_SQL = """
+    WITH statement_rows AS (
+        SELECT ticker, TRIM(line_item) AS line_item,
+               fiscal_year * 4 + fiscal_quarter - 1 AS qn,
+               NULLIF(value, 0) AS value, source_table, id
+          FROM statements
+         WHERE fiscal_quarter IS NOT NULL
+           AND TRIM(line_item) IN (SELECT line_item FROM requested_items)
+           AND ticker IN (SELECT ticker FROM candidates)
+    ),
+    ends AS (
+        SELECT ticker, MAX(qn) AS end_qn FROM statement_rows GROUP BY ticker
+    ),
+    series AS (
+        -- One value per (ticker, line item, quarter): the most recent row's
+        SELECT ticker, line_item, qn, value FROM (
+            SELECT ticker, line_item, qn, value,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY ticker, line_item, qn ORDER BY source_table DESC, id DESC
+                   ) AS rn
+              FROM statement_rows
+        ) WHERE rn = 1
+    ),
+    growth AS (
+        SELECT *,
+               SUM(value) OVER last_4 AS sum_4,
+               COUNT(value) OVER last_4 AS count_4,
+               value / FIRST_VALUE(value) OVER (
+                   PARTITION BY ticker, line_item ORDER BY qn
+                   RANGE BETWEEN 4 PRECEDING AND 4 PRECEDING
+               ) - 1 AS yoy,
+               LAST_VALUE(value IGNORE NULLS) OVER (
+                   PARTITION BY ticker, line_item ORDER BY qn
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+               ) AS latest
+          FROM series
+        WINDOW last_4 AS (
+            PARTITION BY ticker, line_item ORDER BY qn
+            RANGE BETWEEN 3 PRECEDING AND CURRENT ROW
+        )
+    ),
+    kernels AS (
+        SELECT g.*, e.end_qn,
+               AVG(yoy) OVER last_4 AS avg_yoy,
+               COUNT(yoy) OVER last_4 AS yoy_count
+          FROM growth g JOIN ends e USING (ticker)
+        WINDOW last_4 AS (
+            PARTITION BY g.ticker, line_item ORDER BY qn
+            RANGE BETWEEN 3 PRECEDING AND CURRENT ROW
+        )
+    ),
+    per_item AS (
+        SELECT ticker, line_item,
+               MAX(CASE WHEN qn = end_qn AND count_4 = 4 THEN sum_4 END) AS ttm,
+               MAX(CASE WHEN qn = end_qn AND yoy_count = 4 THEN avg_yoy END) AS avg_yoy,
+               MAX(latest) AS latest
+          FROM kernels
+         GROUP BY ticker, line_item
+    )
+"""
+
+LATEST_CLOSE_SQL = """
+    SELECT ticker, close_price FROM (
+        SELECT ticker, close_price,
+               ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC) AS rn
+          FROM prices
+         WHERE ticker IN (SELECT ticker FROM candidates)
+    ) WHERE rn = 1
+"""
+
+
+def open_mirror_connection(tickers):
+    """
+    In-memory DuckDB connection with the mirrored statement and price tables
+    and the candidate tickers registered. Returns None when any mirrored
+    table is missing or stale, so the caller can use the MySQL path.
+    """
+    statement_parts = [
+        read_table(table_name, ["line_item", "fiscal_year", "fiscal_quarter", "value", "id"])
+        for table_name in STATEMENT_TABLES
+    ]
+    prices = read_table("reit_price_data", ["date", "close_price"])
+    if prices is None or any(part is None for part in statement_parts):
+        return None
+
+    con = duckdb.connect()
+    for i, part in enumerate(statement_parts):
+        con.register(f"statement_part_{i}", part)
+    con.execute("CREATE VIEW statements AS " + " UNION ALL ".join(
+        f"SELECT *, {i} AS source_table FROM statement_part_{i}" for i in range(len(statement_parts))
+    ))
+    con.register("prices", prices)
+    con.register("candidates", pd.DataFrame({"ticker": list(tickers)}))
+    return con
+
+
+def latest_closes(con):
+    """Each candidate's latest close as a Series indexed by ticker."""
+    return con.execute(LATEST_CLOSE_SQL).df().set_index('ticker')['close_price']
+
+
+def statement_rows(con, line_items):
+    """Same frame as metric_panel.load_statement_rows(), read from the mirror."""
+    con.register("requested_items", pd.DataFrame({"line_item": sorted(line_items)}))
+    return con.execute("""
+        SELECT ticker, TRIM(line_item) AS line_item, fiscal_year, fiscal_quarter,
+               NULLIF(value, 0) AS value
+          FROM statements
+         WHERE fiscal_quarter IS NOT NULL
+           AND TRIM(line_item) IN (SELECT line_item FROM requested_items)
+           AND ticker IN (SELECT ticker FROM candidates)
+         ORDER BY source_table, id
+    """).df()
+
+
+def compute_latest_metrics(con, line_items, metric_config):
+    """
+    Latest-quarter value of every metric in metric_config for each candidate
+    with statement rows. Returns a DataFrame with 'Ticker' plus one column per
+    metric, matching the pandas calculate_metrics_for_ticker() path.
+    `line_items` is the full fetched set, which decides each ticker's
+    latest quarter.
+    """
+    con.register("requested_items", pd.DataFrame({"line_item": sorted(line_items)}))
+
+    # Pivot each (kernel, line item) a metric needs into its own column
+    kernel_columns = {}
+    params = []
+    metric_selects = []
+    for conf in metric_config:
+        names = {}
+        for i, line_item in enumerate(conf['line_items']):
+            for kernel in ("ttm", "avg_yoy", "latest"):
+                key = (kernel, line_item)
+                if key not in kernel_columns:
+                    kernel_columns[key] = f"k{len(kernel_columns)}"
+                names[f"{kernel}{i}"] = kernel_columns[key]
+        template = CALCULATION_SQL[conf['calculation_type']]
+        metric_selects.append(f'{template.format(**names)} AS "{conf["metric_name"]}"')
+
+    pivot_selects = []
+    for (kernel, line_item), column in kernel_columns.items():
+        pivot_selects.append(f"MAX(CASE WHEN line_item = ? THEN {kernel} END) AS {column}")
+        params.append(line_item)
+
+    sql = SERIES_SQL + f"""
+    , pivoted AS (
+        SELECT ticker, {", ".join(pivot_selects)}
+          FROM per_item
+         GROUP BY ticker
+    ),
+    closes AS ({LATEST_CLOSE_SQL})
+    SELECT pivoted.ticker AS Ticker, {", ".join(metric_selects)}
+      FROM pivoted
+      LEFT JOIN (SELECT ticker, close_price AS price FROM closes) c USING (ticker)
+     ORDER BY Ticker
+    """
+    return con.execute(sql, params).df()
@@ -0,0 +1,269 @@
+# local_mirror.py
+"""
+Local, memory-mapped mirror of the hot read tables (reit_price_data and the
+four statement tables).
+
+`flask --app app sync-mirror` copies each table into uncompressed Feather
+(Arrow IPC) files, one file per ticker:
+
+    <REIT_MIRROR_DIR>/<table>/<version>/<TICKER>.feather
+    <REIT_MIRROR_DIR>/manifest.json
+
+API workers open the files with memory mapping, so repeated reads are served
+from the OS page cache without a MySQL round trip. A sync writes a new
+version directory and then atomically replaces manifest.json, so readers see
+either the old or the new version, never a partial one. read_partition()
+returns None when the mirror is missing, older than REIT_MIRROR_MAX_AGE
+seconds, or has no partition for a ticker it did not record as empty, and
+callers fall back to MySQL.
+"""
+import json
+import os
+import re
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from sqlalchemy import text
+
+MIRROR_DIR = os.getenv(
+    "REIT_MIRROR_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "mirror"),
+)
+MIRROR_MAX_AGE_SECONDS = int(os.getenv("REIT_MIRROR_MAX_AGE", 36 * 3600))
+MIRROR_CHUNK_ROWS = 200_000
+MIRROR_KEEP_VERSIONS = 2
+# Bumped when MIRROR_TABLES schemas change; mirrors of another format are stale
+MIRROR_FORMAT = 2
+
+_STATEMENT_SCHEMA = pa.schema([
+    ("line_item", pa.string()),
+    ("fiscal_year", pa.int64()),
+    ("fiscal_quarter", pa.int64()),
+    ("value", pa.float64()),
+    ("excel_row_index", pa.int64()),
+    # Insert order, which decides between duplicate rows (see duckdb_screen.py)
+    ("id", pa.int64()),
+])
+_STATEMENT_ORDER = "ticker, excel_row_index ASC, fiscal_year ASC, fiscal_quarter ASC"
+
+# table -> (stored schema, ORDER BY used when syncing). Rows inside each
+# partition keep the order the API endpoints return them in.
+MIRROR_TABLES = {
+    "reit_price_data": (
+        pa.schema([
+            ("date", pa.date32()),
+            ("close_price", pa.float64()),
+            ("volume", pa.float64()),
+        ]),
+        "ticker, date ASC",
+    ),
+    "reit_income_statement": (_STATEMENT_SCHEMA, _STATEMENT_ORDER),
+    "reit_balance_sheet": (_STATEMENT_SCHEMA, _STATEMENT_ORDER),
+    "reit_cash_flow": (_STATEMENT_SCHEMA, _STATEMENT_ORDER),
+    "reit_industry_metrics": (_STATEMENT_SCHEMA, _STATEMENT_ORDER),
+}
+
+TICKER_RE = re.compile(r"^[A-Za-z0-9.\-]+$")
+
+_manifest_cache = {"mtime": None, "data": None}
+_table_cache = {}
+
+
+def _manifest_path():
+    return os.path.join(MIRROR_DIR, "manifest.json")
+
+
+def _partition_path(table_name, version, ticker):
+    return os.path.join(MIRROR_DIR, table_name, version, f"{ticker.upper()}.feather")
+
+
+# -------------------------------------------------------------------------
+# Reading
+# -------------------------------------------------------------------------
+def load_manifest():
+    """The current manifest.json, re-read only when its mtime changes."""
+    try:
+        mtime = os.stat(_manifest_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _manifest_cache["mtime"] != mtime:
+        with open(_manifest_path()) as f:
+            _manifest_cache["data"] = json.load(f)
+        _manifest_cache["mtime"] = mtime
+    return _manifest_cache["data"]
+
+
+def fresh_version(table_name):
+    """The mirrored version of table_name, or None if missing or stale."""
+    manifest = load_manifest()
+    if (manifest or {}).get("format") != MIRROR_FORMAT:
+        return None
+    entry = manifest.get("tables", {}).get(table_name)
+    if entry is None or time.time() - entry["synced_at"] > MIRROR_MAX_AGE_SECONDS:
+        return None
+    return entry["version"]
+
+
+def read_partition(table_name, ticker, columns=None):
+    """
+    All mirrored rows of table_name for one ticker as a DataFrame, in the
+    order the API endpoints return them. A ticker the sync recorded as having
+    no rows gives an empty frame. Returns None when the mirror cannot answer
+    (missing, stale, or a ticker it does not know, e.g. one added to MySQL
+    since the sync), in which case the caller should query MySQL.
+    """
+    if table_name not in MIRROR_TABLES or not TICKER_RE.match(ticker):
+        return None
+    version = fresh_version(table_name)
+    if version is None:
+        return None
+
+    path = _partition_path(table_name, version, ticker)
+    try:
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    except FileNotFoundError:
+        if ticker.upper() not in load_manifest()["tables"][table_name].get("empty_tickers", []):
+            return None
+        schema = MIRROR_TABLES[table_name][0]
+        names = columns or schema.names
+        return pd.DataFrame({name: pd.Series(dtype=object) for name in names})
+    return table.to_pandas()
+
+
+def read_table(table_name, columns=None):
+    """
+    The whole mirrored table as one Arrow table with a leading 'ticker'
+    column, built from the memory-mapped partitions without copying their
+    buffers. Cached per mirror version. Returns None when missing or stale.
+    """
+    if table_name not in MIRROR_TABLES:
+        return None
+    version = fresh_version(table_name)
+    if version is None:
+        return None
+
+    columns = list(columns or MIRROR_TABLES[table_name][0].names)
+    cache_key = (table_name, tuple(columns))
+    cached = _table_cache.get(cache_key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    version_dir = os.path.join(MIRROR_DIR, table_name, version)
+    parts = []
+    for file_name in sorted(os.listdir(version_dir)):
+        ticker = file_name[:-len(".feather")]
+        part = feather.read_table(os.path.join(version_dir, file_name), columns=columns, memory_map=True)
+        parts.append(part.add_column(0, "ticker", pa.repeat(pa.scalar(ticker), part.num_rows)))
+    if parts:
+        table = pa.concat_tables(parts)
+    else:
+        schema = MIRROR_TABLES[table_name][0]
+        table = pa.schema([("ticker", pa.string())] + [schema.field(c) for c in columns]).empty_table()
+
+    _table_cache[cache_key] = (version, table)
+    return table
+
+
+# -------------------------------------------------------------------------
+# Syncing
+# -------------------------------------------------------------------------
+def _ticker_partitions(conn, sql):
+    """
+    Yields (ticker, rows) from a query ordered by ticker, reading in chunks
+    so a table never has to fit in memory at once.
+    """
+    carry = None
+    for chunk in pd.read_sql(sql, conn, chunksize=MIRROR_CHUNK_ROWS):
+        if carry is not None and not carry.empty:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        # The last ticker of a chunk may continue in the next one
+        last_ticker = chunk['ticker'].iloc[-1]
+        complete = (chunk['ticker'] != last_ticker).to_numpy()
+        for ticker, rows in chunk[complete].groupby('ticker', sort=False):
+            yield ticker, rows
+        carry = chunk[~complete]
+    if carry is not None and not carry.empty:
+        yield carry['ticker'].iloc[0], carry
+
+
+def _universe_tickers(conn):
+    """Upper-cased tickers of reit_business_data, or an empty set if it cannot be read."""
+    try:
+        tickers = pd.read_sql(text("SELECT DISTINCT Ticker FROM reit_business_data"), conn)["Ticker"]
+    except Exception:
+        return set()
+    return {str(t).upper() for t in tickers.dropna() if TICKER_RE.match(str(t))}
+
+
+def _write_manifest(manifest):
+    tmp_path = _manifest_path() + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, _manifest_path())
+
+
+def _prune_versions(table_name, keep):
+    """Removes old version directories, keeping the newest `keep`."""
+    table_dir = os.path.join(MIRROR_DIR, table_name)
+    versions = sorted(os.listdir(table_dir))
+    for version in versions[:-keep]:
+        shutil.rmtree(os.path.join(table_dir, version), ignore_errors=True)
+
+
+def sync_mirror(engine, tables=None):
+    """
+    Copies each table in MIRROR_TABLES (or the given subset) into a new
+    version directory of per-ticker Feather files, then publishes it in the
+    manifest. Returns {table: row_count}.
+    """
+    tables = list(tables or MIRROR_TABLES)
+    os.makedirs(MIRROR_DIR, exist_ok=True)
+    manifest = load_manifest()
+    if (manifest or {}).get("format") != MIRROR_FORMAT:
+        manifest = {"format": MIRROR_FORMAT, "tables": {}}
+    counts = {}
+
+    for table_name in tables:
+        schema, order_by = MIRROR_TABLES[table_name]
+        # Versions sort by creation time; a sync never writes into a
+        # directory that readers may already be using.
+        version = str(time.time_ns())
+        os.makedirs(os.path.join(MIRROR_DIR, table_name, version))
+
+        synced_at = time.time()
+        sql = text(f"SELECT ticker, {', '.join(schema.names)} FROM {table_name} ORDER BY {order_by}")
+        rows = 0
+        mirrored = set()
+        # Server-side cursor, so the table is read chunk by chunk rather than
+        # buffered whole by PyMySQL
+        with engine.connect().execution_options(stream_results=True) as conn:
+            for ticker, group in _ticker_partitions(conn, sql):
+                if not TICKER_RE.match(str(ticker)):
+                    continue
+                table = pa.Table.from_pandas(group[schema.names], schema=schema, preserve_index=False)
+                # Uncompressed so readers can memory-map the buffers directly
+                feather.write_feather(table, _partition_path(table_name, version, ticker), compression="uncompressed")
+                rows += len(group)
+                mirrored.add(str(ticker).upper())
+        with engine.connect() as conn:
+            # Known tickers without rows: the only missing partitions that
+            # read_partition() answers with an empty frame
+            empty_tickers = sorted(_universe_tickers(conn) - mirrored)
+
+        manifest["tables"][table_name] = {
+            "version": version,
+            "synced_at": synced_at,
+            "rows": rows,
+            "tickers": len(mirrored),
+            "empty_tickers": empty_tickers,
+        }
+        _write_manifest(manifest)
+        _prune_versions(table_name, MIRROR_KEEP_VERSIONS)
+        counts[table_name] = rows
+
+    return counts
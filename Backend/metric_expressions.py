@@ -0,0 +1,458 @@
+# metric_expressions.py
+"""
+A small expression language for screener metrics, compiled to NumPy.
+
+Example:
+    ttm("FFO") / latest("Total Debt")
+
+Line-item functions (the argument is a quoted line item name):
+    ttm("X")      trailing four-quarter sum (all four quarters required)
+    latest("X")   last reported value
+    yoy("X")      year-over-year growth of the latest quarter
+    avg_yoy("X")  mean of the last four year-over-year growths
+
+Other terms:
+    price         latest close price
+    abs(expr)     absolute value
+    pos(expr)     expr where it is > 0, otherwise missing
+    numbers, + - * /, unary minus and parentheses
+
+Division by zero yields a missing value. Expressions are parsed and validated
+once (compile_expression is cached) and evaluated over a StatementCube, a
+dense tickers x line items x quarters array, so adding a metric adds a few
+array operations rather than per-ticker Python work.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+MAX_EXPRESSION_LENGTH = 500
+# Parentheses, function calls and unary signs; each level is one Python frame
+# in the parser, so without a limit a short input can exhaust the stack
+MAX_NESTING_DEPTH = 32
+
+LINE_ITEM_FUNCTIONS = ("ttm", "latest", "yoy", "avg_yoy")
+VALUE_FUNCTIONS = ("abs", "pos")
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression cannot be parsed or validated."""
+
+
+# -------------------------------------------------------------------------
+# Statement cube
+# -------------------------------------------------------------------------
+def quarter_number(period):
+    """Absolute quarter count (year * 4 + quarter - 1) of a quarterly Period."""
+    return period.year * 4 + period.quarter - 1
+
+
+def period_from_quarter_number(number):
+    """Inverse of quarter_number()."""
+    return pd.Period(year=int(number // 4), quarter=int(number % 4) + 1, freq="Q")
+
+
+class StatementCube:
+    """
+    Quarterly statement values pivoted to a dense array.
+
+    values   float64 array (tickers, line_items, quarters), NaN where missing
+    present  bool array (tickers, quarters), True where the ticker reported
+             any fetched line item in that quarter
+    tickers  ticker for each row of the first axis
+    periods  pandas Period (quarterly) for each position of the last axis
+    """
+
+    def __init__(self, tickers, line_items, first_period, values, present):
+        self.tickers = tickers
+        self.line_items = line_items
+        self.item_index = {item: i for i, item in enumerate(line_items)}
+        self.first_period = first_period
+        self.values = values
+        self.present = present
+
+    @property
+    def periods(self):
+        return pd.period_range(start=self.first_period, periods=self.values.shape[2], freq="Q")
+
+    def series(self, line_item):
+        """(tickers, quarters) panel for one line item; all-NaN if never reported."""
+        i = self.item_index.get(line_item)
+        if i is None:
+            return np.full(self.present.shape, np.nan)
+        return self.values[:, i, :]
+
+    def end_index(self, as_of=None):
+        """
+        Index of each ticker's latest reported quarter, optionally no later
+        than the pandas Period `as_of`. -1 for tickers with nothing reported.
+        """
+        present = self.present
+        if as_of is not None:
+            cutoff = quarter_number(as_of) - quarter_number(self.first_period)
+            present = present.copy()
+            present[:, max(cutoff + 1, 0):] = False
+        n_quarters = present.shape[1]
+        if n_quarters == 0:
+            return np.full(present.shape[0], -1)
+        last = n_quarters - 1 - np.argmax(present[:, ::-1], axis=1)
+        return np.where(present.any(axis=1), last, -1)
+
+
+def build_statement_cube(financials_df, line_items=None, last_period=None):
+    """
+    Pivots long statement rows (ticker, line_item, fiscal_year, fiscal_quarter,
+    value) into a StatementCube. Duplicate rows keep the last value. The
+    quarter axis runs to the last reported quarter, or to last_period if later.
+    """
+    df = financials_df.dropna(subset=["fiscal_year", "fiscal_quarter"])
+    if line_items is None:
+        line_items = sorted(df["line_item"].dropna().unique())
+    line_items = list(line_items)
+
+    if df.empty:
+        empty_period = pd.Period("2000Q1", freq="Q")
+        return StatementCube(
+            np.array([], dtype=object), line_items, empty_period,
+            np.full((0, len(line_items), 0), np.nan), np.zeros((0, 0), dtype=bool)
+        )
+
+    ordinals = df["fiscal_year"].to_numpy(dtype="int64") * 4 + df["fiscal_quarter"].to_numpy(dtype="int64") - 1
+    first_ordinal = ordinals.min()
+    q_idx = ordinals - first_ordinal
+    n_quarters = int(q_idx.max()) + 1
+    if last_period is not None:
+        n_quarters = max(n_quarters, int(quarter_number(last_period) - first_ordinal) + 1)
+
+    t_idx, tickers = pd.factorize(df["ticker"], sort=True)
+    present = np.zeros((len(tickers), n_quarters), dtype=bool)
+    present[t_idx, q_idx] = True
+
+    values = np.full((len(tickers), len(line_items), n_quarters), np.nan)
+    item_codes = pd.Index(line_items).get_indexer(df["line_item"])
+    keep = item_codes >= 0
+    keyed = pd.DataFrame({
+        "t": t_idx[keep], "l": item_codes[keep], "q": q_idx[keep],
+        "v": pd.to_numeric(df["value"], errors="coerce").to_numpy(dtype="float64")[keep],
+    }).drop_duplicates(subset=["t", "l", "q"], keep="last")
+    values[keyed["t"].to_numpy(), keyed["l"].to_numpy(), keyed["q"].to_numpy()] = keyed["v"].to_numpy()
+
+    first_period = period_from_quarter_number(first_ordinal)
+    return StatementCube(np.asarray(tickers, dtype=object), line_items, first_period, values, present)
+
+
+def take_at(panel, end_index):
+    """Picks panel[t, end_index[t]] for each ticker; NaN where end_index is -1."""
+    if panel.shape[1] == 0:
+        return np.full(len(end_index), np.nan)
+    safe = np.clip(end_index, 0, panel.shape[1] - 1)
+    out = np.take_along_axis(panel, safe[:, None], axis=1)[:, 0].astype("float64")
+    out[end_index < 0] = np.nan
+    return out
+
+
+# -------------------------------------------------------------------------
+# Vectorized kernels over (tickers, quarters) panels
+# -------------------------------------------------------------------------
+def rolling_sum_4(x):
+    """Trailing four-quarter sum; NaN unless all four quarters are present."""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= 4:
+        out[:, 3:] = x[:, 3:] + x[:, 2:-1] + x[:, 1:-2] + x[:, :-3]
+    return out
+
+
+def forward_fill(x):
+    """Last non-NaN value at or before each quarter."""
+    valid = ~np.isnan(x)
+    idx = np.where(valid, np.arange(x.shape[1]), -1)
+    idx = np.maximum.accumulate(idx, axis=1)
+    out = np.take_along_axis(x, np.maximum(idx, 0), axis=1)
+    out[idx < 0] = np.nan
+    return out
+
+
+def yoy_growth(x):
+    """Quarter vs. same quarter a year earlier, (x[t] - x[t-4]) / x[t-4]."""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] > 4:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[:, 4:] = (x[:, 4:] - x[:, :-4]) / x[:, :-4]
+    return out
+
+
+def avg_yoy_growth(x):
+    """Mean of the last four YoY growths; NaN if any of them is missing."""
+    return rolling_sum_4(yoy_growth(x)) / 4
+
+
+_LINE_ITEM_KERNELS = {
+    "ttm": rolling_sum_4,
+    "latest": forward_fill,
+    "yoy": yoy_growth,
+    "avg_yoy": avg_yoy_growth,
+}
+
+
+def _safe_divide(a, b):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.divide(a, b)
+    return np.where(b == 0, np.nan, out)
+
+
+_BINARY_OPS = {
+    "+": np.add,
+    "-": np.subtract,
+    "*": np.multiply,
+    "/": _safe_divide,
+}
+
+_VALUE_KERNELS = {
+    "abs": np.abs,
+    "pos": lambda x: np.where(x > 0, x, np.nan),
+}
+
+
+# -------------------------------------------------------------------------
+# Parser
+# -------------------------------------------------------------------------
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<string>"[^"]*"|'[^']*')
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op>[-+*/(),])
+    )""", re.VERBOSE)
+
+
+def _tokenize(source):
+    tokens = []
+    pos = 0
+    source = source.rstrip()
+    while pos < len(source):
+        match = _TOKEN_RE.match(source, pos)
+        if not match:
+            raise ExpressionError(f"Unexpected character at position {pos}: {source[pos:pos + 10]!r}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "string":
+            text = text[1:-1]
+        tokens.append((kind, text, match.start(kind)))
+        pos = match.end()
+    tokens.append(("end", "", len(source)))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing tuple-based AST nodes."""
+
+    def __init__(self, source):
+        self.tokens = _tokenize(source)
+        self.pos = 0
+        self.depth = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def advance(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, text):
+        kind, value, where = self.advance()
+        if value != text or kind not in ("op",):
+            raise ExpressionError(f"Expected '{text}' at position {where}")
+
+    def enter(self):
+        self.depth += 1
+        if self.depth > MAX_NESTING_DEPTH:
+            raise ExpressionError(
+                f"Expression is nested more than {MAX_NESTING_DEPTH} levels deep at position {self.peek()[2]}"
+            )
+
+    def leave(self):
+        self.depth -= 1
+
+    def parse(self):
+        node = self.expression()
+        kind, value, where = self.peek()
+        if kind != "end":
+            raise ExpressionError(f"Unexpected '{value}' at position {where}")
+        return node
+
+    def expression(self):
+        self.enter()
+        node = self.term()
+        while self.peek()[0] == "op" and self.peek()[1] in "+-":
+            op = self.advance()[1]
+            node = ("bin", op, node, self.term())
+        self.leave()
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.peek()[0] == "op" and self.peek()[1] in "*/":
+            op = self.advance()[1]
+            node = ("bin", op, node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek()[0] == "op" and self.peek()[1] in "+-":
+            op = self.advance()[1]
+            self.enter()
+            node = self.unary()
+            self.leave()
+            return ("neg", node) if op == "-" else node
+        return self.atom()
+
+    def atom(self):
+        kind, value, where = self.advance()
+        if kind == "number":
+            return ("num", float(value))
+        if kind == "op" and value == "(":
+            node = self.expression()
+            self.expect(")")
+            return node
+        if kind == "name":
+            name = value.lower()
+            if name == "price":
+                return ("price",)
+            if name in LINE_ITEM_FUNCTIONS:
+                self.expect("(")
+                arg_kind, line_item, arg_where = self.advance()
+                if arg_kind != "string" or not line_item.strip():
+                    raise ExpressionError(f"{name}() expects a quoted line item name at position {arg_where}")
+                self.expect(")")
+                return ("item", name, line_item.strip())
+            if name in VALUE_FUNCTIONS:
+                self.expect("(")
+                node = self.expression()
+                self.expect(")")
+                return ("call", name, node)
+            raise ExpressionError(f"Unknown name '{value}' at position {where}")
+        if kind == "end":
+            raise ExpressionError("Unexpected end of expression")
+        raise ExpressionError(f"Unexpected '{value}' at position {where}")
+
+
+# -------------------------------------------------------------------------
+# Compiler
+# -------------------------------------------------------------------------
+class EvaluationContext:
+    """
+    Inputs shared by every expression evaluated in one request. Line-item
+    kernels are memoized, so ttm("FFO") used by several metrics runs once.
+
+    price may be one close per ticker or a (tickers, quarters) panel. If
+    as_of_index is given (a (tickers, quarters) array of quarter positions,
+    -1 for none), each line-item result at quarter q is read from
+    as_of_index[t, q] instead, i.e. from the latest quarter reported as of q.
+    """
+
+    def __init__(self, cube, price=None, as_of_index=None):
+        self.cube = cube
+        n_tickers = len(cube.tickers)
+        if price is None:
+            price = np.full(n_tickers, np.nan)
+        price = np.asarray(price, dtype="float64")
+        self.price = price[:, None] if price.ndim == 1 else price
+        self.as_of_index = as_of_index
+        self._memo = {}
+
+    def line_item(self, function, line_item):
+        key = (function, line_item)
+        if key not in self._memo:
+            result = _LINE_ITEM_KERNELS[function](self.cube.series(line_item))
+            if self.as_of_index is not None:
+                result = _gather(result, self.as_of_index)
+            self._memo[key] = result
+        return self._memo[key]
+
+
+def _gather(panel, index):
+    """panel[t, index[t, q]] for every (t, q); NaN where index is -1."""
+    if panel.shape[1] == 0:
+        return np.full(index.shape, np.nan)
+    out = np.take_along_axis(panel, np.maximum(index, 0), axis=1)
+    out[index < 0] = np.nan
+    return out
+
+
+def reported_as_of_index(present):
+    """
+    For every (ticker, quarter), the position of the latest quarter at or
+    before it in which the ticker reported anything; -1 before its first report.
+    """
+    idx = np.where(present, np.arange(present.shape[1]), -1)
+    return np.maximum.accumulate(idx, axis=1)
+
+
+def _compile_node(node):
+    kind = node[0]
+    if kind == "num":
+        value = node[1]
+        return lambda ctx: value
+    if kind == "price":
+        return lambda ctx: ctx.price
+    if kind == "item":
+        _, function, line_item = node
+        return lambda ctx: ctx.line_item(function, line_item)
+    if kind == "neg":
+        inner = _compile_node(node[1])
+        return lambda ctx: np.negative(inner(ctx))
+    if kind == "call":
+        kernel = _VALUE_KERNELS[node[1]]
+        inner = _compile_node(node[2])
+        return lambda ctx: kernel(inner(ctx))
+    if kind == "bin":
+        op = _BINARY_OPS[node[1]]
+        left = _compile_node(node[2])
+        right = _compile_node(node[3])
+        return lambda ctx: op(left(ctx), right(ctx))
+    raise ExpressionError(f"Unknown node type {kind}")
+
+
+def _walk(node):
+    yield node
+    for child in node[1:]:
+        if isinstance(child, tuple):
+            yield from _walk(child)
+
+
+class MetricExpression:
+    """A parsed, validated expression ready to evaluate against a cube."""
+
+    def __init__(self, source, ast):
+        self.source = source
+        nodes = list(_walk(ast))
+        self.line_items = frozenset(n[2] for n in nodes if n[0] == "item")
+        self.uses_price = any(n[0] == "price" for n in nodes)
+        self._fn = _compile_node(ast)
+
+    def evaluate_panel(self, ctx):
+        """Metric value for every (ticker, quarter) as a float64 array."""
+        result = self._fn(ctx)
+        return np.broadcast_to(np.asarray(result, dtype="float64"), ctx.cube.present.shape)
+
+    def evaluate_latest(self, ctx, end_index=None):
+        """Metric value at each ticker's latest (or given) quarter."""
+        if end_index is None:
+            end_index = ctx.cube.end_index()
+        return take_at(self.evaluate_panel(ctx), end_index)
+
+
+@lru_cache(maxsize=256)
+def compile_expression(source):
+    """
+    Parses and validates an expression string. Results are cached, so a
+    given expression is only ever parsed once per process.
+    """
+    if not source or not source.strip():
+        raise ExpressionError("Expression is empty")
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    ast = _Parser(source).parse()
+    return MetricExpression(source, ast)
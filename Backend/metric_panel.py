@@ -0,0 +1,287 @@
+# metric_panel.py
+"""
+Point-in-time ("as-of") metric panels for the advanced filter.
+
+Every METRIC_CONFIG metric is computed for every ticker and every quarter in
+one vectorized pass over the statement cube and stored in reit_metric_panel.
+A row (ticker, fiscal_year, fiscal_quarter) holds the metric values an
+investor could have computed at the end of that quarter: statement values
+from the latest quarter already filed by then, and the last close on or
+before quarter end from reit_price_data. Statements are taken as filed
+FILING_LAG_DAYS after their quarter ends (quarterly 10-Qs are due 40-45 days
+after quarter end), so the row for 2023Q2 uses 2023Q1 statements at the
+latest. Fiscal quarters are treated as calendar quarters.
+
+Rebuild the panel with:  flask --app app build-metric-panel
+"""
+import re
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from metric_expressions import (
+    compile_expression,
+    build_statement_cube,
+    EvaluationContext,
+    reported_as_of_index,
+    quarter_number,
+    period_from_quarter_number,
+)
+
+METRIC_PANEL_TABLE = "reit_metric_panel"
+
+# Days after quarter end by which a quarter's statements are taken as public
+FILING_LAG_DAYS = 45
+
+STATEMENT_TABLES = [
+    "reit_income_statement",
+    "reit_industry_metrics",
+    "reit_balance_sheet",
+    "reit_cash_flow",
+]
+
+# Each METRIC_CONFIG calculation_type as an expression over its line_items
+CALCULATION_EXPRESSIONS = {
+    'ttm_margin': 'ttm("{0}") / ttm("{1}")',
+    'avg_yoy_growth': 'avg_yoy("{0}")',
+    'ttm_ratio': 'ttm("{0}") / abs(ttm("{1}"))',
+    'latest_ratio': 'latest("{0}") / latest("{1}")',
+    'latest_value': 'latest("{0}")',
+    'price_to_ttm_value': 'price / pos(ttm("{0}"))',
+    'latest_to_ttm_ratio': 'latest("{0}") / ttm("{1}")',
+}
+
+AS_OF_RE = re.compile(r"^(\d{4})\s*-?\s*Q([1-4])$", re.IGNORECASE)
+
+
+def metric_expression(conf):
+    """The compiled expression equivalent to a METRIC_CONFIG entry."""
+    template = CALCULATION_EXPRESSIONS[conf['calculation_type']]
+    return compile_expression(template.format(*conf['line_items']))
+
+
+def parse_as_of(value):
+    """Parses 'YYYYQn' (e.g. 2023Q2) into a quarterly pandas Period."""
+    match = AS_OF_RE.match(value.strip())
+    if not match:
+        raise ValueError("Invalid 'as_of' parameter. Use the form YYYYQn, e.g. 2023Q2.")
+    return pd.Period(year=int(match.group(1)), quarter=int(match.group(2)), freq="Q")
+
+
+def latest_filed_period(as_of, lag_days=FILING_LAG_DAYS):
+    """The latest quarter whose statements are filed by the end of quarter `as_of`."""
+    period = as_of
+    while period.end_time + pd.Timedelta(days=lag_days) > as_of.end_time:
+        period -= 1
+    return period
+
+
+def filed_as_of_index(cube, lag_days=FILING_LAG_DAYS):
+    """
+    For every (ticker, quarter) of the cube, the position of the latest
+    quarter the ticker reported that was filed by the end of that quarter;
+    -1 before its first filing.
+    """
+    reported = reported_as_of_index(cube.present)
+    n_quarters = reported.shape[1]
+    if n_quarters == 0:
+        return reported
+    filed_by = np.array([
+        quarter_number(latest_filed_period(period, lag_days)) - quarter_number(cube.first_period)
+        for period in cube.periods
+    ])
+    index = reported[:, np.maximum(filed_by, 0)]
+    index[:, filed_by < 0] = -1
+    return index
+
+
+# -------------------------------------------------------------------------
+# Loaders
+# -------------------------------------------------------------------------
+def load_statement_rows(conn, line_items, tickers=None):
+    """
+    Long-format quarterly rows for the given line items from all four
+    statement tables. Zero values are treated as missing.
+
+    Rows come in STATEMENT_TABLES order and, within a table, in insert (id)
+    order, so where a (ticker, line item, quarter) appears more than once
+    (the same item in two tables, or names equal after TRIM) the last row is
+    the most recent one; that is the row every consumer keeps.
+    """
+    ticker_clause = " AND ticker IN :tickers" if tickers is not None else ""
+    union_sql = "\n UNION ALL \n".join(
+        f"""
+            SELECT ticker, TRIM(line_item) as line_item, fiscal_year, fiscal_quarter, value,
+                   {position} AS source_table, id AS source_id
+            FROM {table}
+            WHERE TRIM(line_item) IN :line_items{ticker_clause} AND fiscal_quarter IS NOT NULL
+        """
+        for position, table in enumerate(STATEMENT_TABLES)
+    )
+    sql = f"""
+        SELECT ticker, line_item, fiscal_year, fiscal_quarter, value
+          FROM ({union_sql}) AS statement_rows
+         ORDER BY source_table, source_id
+    """
+    params = {"line_items": tuple(line_items)}
+    if tickers is not None:
+        params["tickers"] = tuple(tickers)
+    financials_df = pd.read_sql(text(sql), conn, params=params)
+    financials_df['value'] = financials_df['value'].replace(0, np.nan)
+    return financials_df
+
+
+def load_quarter_end_closes(conn):
+    """Last close of every (ticker, calendar quarter) in reit_price_data."""
+    sql = text("""
+        SELECT p.ticker,
+               YEAR(p.date) AS fiscal_year,
+               QUARTER(p.date) AS fiscal_quarter,
+               p.close_price
+          FROM reit_price_data p
+          JOIN (
+                SELECT ticker, MAX(date) AS last_date
+                  FROM reit_price_data
+                 GROUP BY ticker, YEAR(date), QUARTER(date)
+               ) q
+            ON p.ticker = q.ticker AND p.date = q.last_date
+    """)
+    return pd.read_sql(sql, conn)
+
+
+def load_closes_as_of(conn, as_of, tickers):
+    """Each ticker's last close on or before the end of quarter `as_of`."""
+    sql = text("""
+        WITH AsOfPrices AS (
+            SELECT
+                ticker,
+                close_price,
+                ROW_NUMBER() OVER(PARTITION BY ticker ORDER BY date DESC) as rn
+            FROM reit_price_data
+            WHERE ticker IN :tickers AND date <= :as_of_date
+        )
+        SELECT ticker, close_price FROM AsOfPrices WHERE rn = 1
+    """)
+    price_df = pd.read_sql(sql, conn, params={
+        "tickers": tuple(tickers),
+        "as_of_date": as_of.end_time.date(),
+    })
+    return price_df.set_index('ticker')['close_price']
+
+
+def load_metric_panel_snapshot(conn, as_of, tickers, metric_columns):
+    """
+    Stored metric values for the given tickers as of quarter `as_of`, one row
+    per ticker with a 'Ticker' column plus metric_columns.
+    """
+    columns = ", ".join(f"`{c}`" for c in metric_columns)
+    sql = text(f"""
+        SELECT ticker AS Ticker, {columns}
+          FROM {METRIC_PANEL_TABLE}
+         WHERE fiscal_year = :year AND fiscal_quarter = :quarter AND ticker IN :tickers
+    """)
+    return pd.read_sql(sql, conn, params={
+        "year": as_of.year,
+        "quarter": as_of.quarter,
+        "tickers": tuple(tickers),
+    })
+
+
+# -------------------------------------------------------------------------
+# Panel computation
+# -------------------------------------------------------------------------
+def compute_metric_panel(financials_df, quarter_closes, metric_config):
+    """
+    Computes every metric in metric_config for every (ticker, quarter) from
+    the quarter the ticker's first statements were filed in to the latest
+    quarter with either statement or price data. Returns a long DataFrame with ticker,
+    fiscal_year, fiscal_quarter, close_price and one column per metric.
+    """
+    line_items = sorted({item for conf in metric_config for item in conf['line_items']})
+
+    last_period = None
+    if not quarter_closes.empty:
+        last_period = period_from_quarter_number(
+            (quarter_closes['fiscal_year'] * 4 + quarter_closes['fiscal_quarter'] - 1).max()
+        )
+    cube = build_statement_cube(financials_df, line_items=line_items, last_period=last_period)
+    n_tickers, n_quarters = cube.present.shape
+
+    # Quarter-end closes aligned to the cube's (ticker, quarter) grid
+    price_panel = np.full((n_tickers, n_quarters), np.nan)
+    if n_tickers and not quarter_closes.empty:
+        t_idx = pd.Index(cube.tickers).get_indexer(quarter_closes['ticker'])
+        q_idx = (
+            quarter_closes['fiscal_year'].to_numpy(dtype="int64") * 4
+            + quarter_closes['fiscal_quarter'].to_numpy(dtype="int64") - 1
+            - quarter_number(cube.first_period)
+        )
+        keep = (t_idx >= 0) & (q_idx >= 0) & (q_idx < n_quarters)
+        price_panel[t_idx[keep], q_idx[keep]] = quarter_closes['close_price'].to_numpy(dtype="float64")[keep]
+
+    as_of_index = filed_as_of_index(cube)
+    ctx = EvaluationContext(cube, price=price_panel, as_of_index=as_of_index)
+
+    t_rows, q_cols = np.nonzero(as_of_index >= 0)
+    ordinals = quarter_number(cube.first_period) + q_cols
+    panel_df = pd.DataFrame({
+        'ticker': cube.tickers[t_rows],
+        'fiscal_year': ordinals // 4,
+        'fiscal_quarter': ordinals % 4 + 1,
+        'close_price': price_panel[t_rows, q_cols],
+    })
+    for conf in metric_config:
+        values = metric_expression(conf).evaluate_panel(ctx)
+        panel_df[conf['metric_name']] = values[t_rows, q_cols]
+
+    return panel_df.replace([np.inf, -np.inf], np.nan)
+
+
+def refresh_metric_panel(engine, metric_config):
+    """
+    Recomputes reit_metric_panel from the statement and price tables. The new
+    panel is written to a shadow table and swapped in with RENAME TABLE, so
+    readers never see a partial panel.
+    """
+    line_items = sorted({item for conf in metric_config for item in conf['line_items']})
+    with engine.connect() as conn:
+        financials_df = load_statement_rows(conn, line_items)
+        quarter_closes = load_quarter_end_closes(conn)
+
+    panel_df = compute_metric_panel(financials_df, quarter_closes, metric_config)
+
+    shadow_table = f"{METRIC_PANEL_TABLE}_new"
+    old_table = f"{METRIC_PANEL_TABLE}_old"
+    metric_ddl = "".join(f"`{conf['metric_name']}` DOUBLE NULL, " for conf in metric_config)
+    create_query = f"""
+        CREATE TABLE {shadow_table} (
+            ticker VARCHAR(10) NOT NULL,
+            fiscal_year INT NOT NULL,
+            fiscal_quarter INT NOT NULL,
+            close_price DOUBLE NULL,
+            {metric_ddl}
+            PRIMARY KEY (ticker, fiscal_year, fiscal_quarter),
+            INDEX idx_period (fiscal_year, fiscal_quarter)
+        );
+    """
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {shadow_table}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {old_table}"))
+        conn.execute(text(create_query))
+        panel_df.to_sql(shadow_table, con=conn, if_exists='append', index=False, chunksize=2000, method='multi')
+
+        exists = conn.execute(
+            text("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :t"),
+            {"t": METRIC_PANEL_TABLE}
+        ).scalar()
+        if exists:
+            conn.execute(text(
+                f"RENAME TABLE {METRIC_PANEL_TABLE} TO {old_table}, {shadow_table} TO {METRIC_PANEL_TABLE}"
+            ))
+            conn.execute(text(f"DROP TABLE {old_table}"))
+        else:
+            conn.execute(text(f"RENAME TABLE {shadow_table} TO {METRIC_PANEL_TABLE}"))
+
+    return len(panel_df)
@@ -0,0 +1,97 @@
+# plan_access.py
+"""
+Premium-plan gate for the bulk export endpoints.
+
+Requests carry the signed-in user's Firebase ID token as
+"Authorization: Bearer <token>". The token's email is looked up in the
+Firestore users collection (the record the Stripe webhook upgrades) and only
+premium users get through. Each user is also limited to EXPORT_RATE_LIMIT
+exports per EXPORT_RATE_WINDOW_SECONDS, counted in Redis.
+"""
+import functools
+import os
+import time
+
+from firebase_admin import auth as admin_auth
+from flask import current_app, jsonify, request
+
+from worker import get_firestore_client, get_redis_client
+
+EXPORT_PLANS = {"premium"}
+EXPORT_RATE_LIMIT = int(os.getenv("EXPORT_RATE_LIMIT", "30"))
+EXPORT_RATE_WINDOW_SECONDS = 3600
+
+
+def bearer_token():
+    """The request's bearer token, or None."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+def verify_user(token):
+    """Email of a valid Firebase ID token. Raises ValueError otherwise."""
+    get_firestore_client()  # initializes the Firebase app
+    try:
+        claims = admin_auth.verify_id_token(token)
+    except Exception as e:
+        raise ValueError(f"Invalid ID token: {e}")
+    if not claims.get("email"):
+        raise ValueError("ID token has no email")
+    return claims["email"]
+
+
+def user_plan(email):
+    """Plan of the Firestore user with this email, or None if there is none."""
+    query = get_firestore_client().collection("users").where("email", "==", email).limit(1)
+    user_doc = next(query.stream(), None)
+    return user_doc.to_dict().get("plan") if user_doc else None
+
+
+def take_export_slot(email):
+    """
+    Counts one export against the user's window. Returns False once the
+    limit is reached. If Redis is unreachable, exports are let through
+    rather than failing for every user.
+    """
+    window = int(time.time() // EXPORT_RATE_WINDOW_SECONDS)
+    key = f"export_rate:{email}:{window}"
+    try:
+        redis_client = get_redis_client()
+        count = redis_client.incr(key)
+        if count == 1:
+            redis_client.expire(key, EXPORT_RATE_WINDOW_SECONDS)
+    except Exception as e:
+        current_app.logger.warning(f"Export rate limit unavailable, allowing export: {e}")
+        return True
+    return count <= EXPORT_RATE_LIMIT
+
+
+def require_export_plan(view):
+    """
+    Rejects the request with 401 (no or invalid token), 403 (not a premium
+    user) or 429 (rate limit reached) before the view runs.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = bearer_token()
+        if token is None:
+            return jsonify({"error": "Sign in to export data"}), 401
+        try:
+            email = verify_user(token)
+        except ValueError as e:
+            current_app.logger.info(f"Rejected export request: {e}")
+            return jsonify({"error": "Sign in to export data"}), 401
+        try:
+            plan = user_plan(email)
+        except Exception as e:
+            current_app.logger.error(f"Error looking up the plan of {email}: {e}")
+            return jsonify({"error": "Failed to check your plan"}), 500
+        if plan not in EXPORT_PLANS:
+            return jsonify({"error": "Data exports are a premium feature"}), 403
+        if not take_export_slot(email):
+            return jsonify({"error": "Export limit reached, try again later"}), 429
+        return view(*args, **kwargs)
+
+    return wrapper
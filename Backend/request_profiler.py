@@ -0,0 +1,233 @@
+# request_profiler.py
+"""
+Opt-in, per-request sampling profiler.
+
+A request is profiled when either
+  - it carries `X-Profile: <PROFILE_ADMIN_TOKEN>` (admin only), or
+  - it is picked at random with probability PROFILE_SAMPLE_RATE.
+
+While a profiled request runs, a background thread samples the request
+thread's Python stack every PROFILE_INTERVAL_MS and counts the stacks.
+Each profile is written under PROFILE_OUTPUT_DIR/<route>/ as
+  <id>.folded  folded stacks ("root;...;leaf count"), readable by
+               flamegraph.pl or speedscope
+  <id>.json    wall time, SQL time measured at the cursor, and the wall
+               time split into sql / pandas / serialization / python by
+               where each sample's innermost recognised frame lives
+Only the newest PROFILE_MAX_PROFILES profiles (default 200) are kept.
+
+Admin-requested profiles get a Server-Timing header with the same split and
+an X-Profile-Id header; randomly sampled ones only do when
+PROFILE_EXPOSE_HEADERS is set (or the app runs in debug mode), so public
+responses do not reveal which requests were profiled.
+
+When neither PROFILE_ADMIN_TOKEN nor PROFILE_SAMPLE_RATE is set,
+init_request_profiler() registers no hooks at all, so there is zero
+overhead.
+"""
+import glob
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_HEADER = "X-Profile"
+
+# Path fragments that attribute a sample to a category, checked from the
+# innermost frame outwards (so pd.read_sql waiting on the driver is "sql").
+# Filenames are matched lower-cased with "/" separators on every platform.
+CATEGORY_PATHS = [
+    ("sql", ("/sqlalchemy/", "/pymysql/", "/sqlite3/", "/duckdb")),
+    ("serialization", ("/flask/json/", "/json/")),
+    ("pandas", ("/pandas/", "/numpy/", "/pyarrow/")),
+]
+
+_active = threading.local()
+
+
+def _categorize(filename):
+    path = os.path.normcase(filename).replace("\\", "/").lower()
+    for category, fragments in CATEGORY_PATHS:
+        if any(fragment in path for fragment in fragments):
+            return category
+    return None
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    for marker in ("site-packages" + os.sep, "Backend" + os.sep):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True, name="request-profiler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.categories = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            category = None
+            while frame is not None:
+                if category is None:
+                    category = _categorize(frame.f_code.co_filename)
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            self.categories[category or "python"] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def _route_slug(rule):
+    slug = "".join(c if c.isalnum() else "_" for c in rule).strip("_")
+    return slug or "root"
+
+
+def _prune_profiles(output_dir, max_profiles):
+    """Deletes all but the newest max_profiles profiles under output_dir."""
+    summaries = glob.glob(os.path.join(output_dir, "*", "*.json"))
+    if len(summaries) <= max_profiles:
+        return
+    summaries.sort(key=os.path.getmtime)
+    for summary in summaries[:len(summaries) - max_profiles]:
+        for path in (summary, summary[:-len(".json")] + ".folded"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def init_request_profiler(app):
+    """
+    Registers the profiling hooks on app if profiling is configured through
+    PROFILE_ADMIN_TOKEN and/or PROFILE_SAMPLE_RATE. Returns True if enabled.
+    """
+    admin_token = os.getenv("PROFILE_ADMIN_TOKEN")
+    sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    if not admin_token and sample_rate <= 0:
+        return False
+
+    interval = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+    output_dir = os.getenv("PROFILE_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "reit_profiles"))
+    max_profiles = int(os.getenv("PROFILE_MAX_PROFILES", 200))
+    expose_headers = bool(os.getenv("PROFILE_EXPOSE_HEADERS")) or app.debug
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _sql_start(conn, cursor, statement, parameters, context, executemany):
+        if getattr(_active, "profile", None) is not None:
+            conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _sql_end(conn, cursor, statement, parameters, context, executemany):
+        profile = getattr(_active, "profile", None)
+        starts = conn.info.get("profile_query_start")
+        if profile is not None and starts:
+            profile["sql_seconds"] += time.perf_counter() - starts.pop()
+            profile["sql_queries"] += 1
+
+    def _is_admin():
+        token = request.headers.get(PROFILE_HEADER)
+        return bool(admin_token and token and hmac.compare_digest(token, admin_token))
+
+    @app.before_request
+    def _start_profile():
+        admin = _is_admin()
+        if not admin and not (sample_rate > 0 and random.random() < sample_rate):
+            return
+        sampler = StackSampler(threading.get_ident(), interval)
+        g.profile = {
+            "id": uuid.uuid4().hex[:12],
+            "admin": admin,
+            "start": time.perf_counter(),
+            "sampler": sampler,
+            "sql_seconds": 0.0,
+            "sql_queries": 0,
+        }
+        _active.profile = g.profile
+        sampler.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        _active.profile = None
+        profile["sampler"].stop()
+        wall = time.perf_counter() - profile["start"]
+
+        sampler = profile["sampler"]
+        total_samples = sum(sampler.categories.values())
+        split_ms = {
+            category: round(wall * 1000 * count / total_samples, 2)
+            for category, count in sampler.categories.items()
+        } if total_samples else {}
+
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        route_dir = os.path.join(output_dir, _route_slug(rule))
+        summary = {
+            "id": profile["id"],
+            "route": rule,
+            "method": request.method,
+            "path": request.full_path,
+            "status": response.status_code,
+            "wall_ms": round(wall * 1000, 2),
+            "sql_ms_measured": round(profile["sql_seconds"] * 1000, 2),
+            "sql_queries": profile["sql_queries"],
+            "samples": total_samples,
+            "interval_ms": interval * 1000,
+            "split_ms": split_ms,
+        }
+        try:
+            os.makedirs(route_dir, exist_ok=True)
+            with open(os.path.join(route_dir, f"{profile['id']}.folded"), "w") as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            with open(os.path.join(route_dir, f"{profile['id']}.json"), "w") as f:
+                json.dump(summary, f, indent=2)
+            _prune_profiles(output_dir, max_profiles)
+        except OSError as e:
+            app.logger.error(f"Could not write request profile {profile['id']}: {e}")
+
+        if profile["admin"] or expose_headers:
+            response.headers["Server-Timing"] = ", ".join(
+                [f"{category};dur={ms}" for category, ms in split_ms.items()]
+                + [f"total;dur={summary['wall_ms']}"]
+            )
+            response.headers["X-Profile-Id"] = profile["id"]
+        app.logger.info(f"Profiled {request.method} {rule} in {summary['wall_ms']} ms -> {route_dir}")
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request does not run when the view raised
+        profile = g.pop("profile", None)
+        if profile is not None:
+            _active.profile = None
+            profile["sampler"].stop()
+
+    return True
@@ -0,0 +1,307 @@
+# screener.py
+"""
+Helpers shared by the screener endpoints (/api/reits and /api/reits/advanced-filter).
+"""
+import base64
+import json
+import warnings
+
+import numpy as np
+import pandas as pd
+
+MAX_PAGE_LIMIT = 500
+
+
+# -------------------------------------------------------------------------
+# Sorting & keyset pagination
+# -------------------------------------------------------------------------
+def encode_cursor(sort_key, ticker):
+    """
+    Packs the sort key and ticker of the last row on a page into an opaque,
+    URL-safe token. The next page starts strictly after this (key, ticker) pair.
+    """
+    raw = json.dumps([float(sort_key), str(ticker)])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    Inverse of encode_cursor(). Raises ValueError on a malformed token.
+    """
+    try:
+        sort_key, ticker = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(sort_key), str(ticker)
+    except Exception:
+        raise ValueError("Invalid 'cursor' parameter.")
+
+
+def parse_page_args(args, sortable_columns):
+    """
+    Reads sort=<metric>&order=asc|desc&limit=<n>&cursor=<token> from the
+    request args. sortable_columns maps each accepted 'sort' value to its
+    DataFrame column. Returns None when no sorting or paging was requested,
+    so callers keep their original ordering. Raises ValueError on bad input.
+    """
+    sort = args.get("sort")
+    order = args.get("order", "asc").lower()
+    limit = args.get("limit")
+    cursor = args.get("cursor")
+
+    if sort is None and limit is None and cursor is None:
+        return None
+
+    if sort is None:
+        sort_col = "Ticker"  # keyset paging needs a total order
+    elif sort in sortable_columns:
+        sort_col = sortable_columns[sort]
+    else:
+        raise ValueError(f"Invalid 'sort' parameter '{sort}'.")
+
+    if order not in ("asc", "desc"):
+        raise ValueError("Invalid 'order' parameter. Must be asc|desc.")
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("Invalid 'limit' parameter. Must be an integer.")
+        if limit < 1 or limit > MAX_PAGE_LIMIT:
+            raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_LIMIT}.")
+
+    return {
+        "sort_col": sort_col,
+        "descending": order == "desc",
+        "limit": limit,
+        "cursor": decode_cursor(cursor) if cursor else None,
+    }
+
+
+def select_page(df, sort_col, descending=False, limit=None, cursor=None, ticker_col="Ticker"):
+    """
+    Returns (page_df, next_cursor) for a keyset-paginated, sorted view of df.
+
+    Rows are ordered by (sort key, ticker) with missing values last in either
+    direction. Only the top `limit` rows after the cursor are ordered: the
+    k-th smallest key is found with a partial sort (np.partition) and only
+    rows at or below it are fully sorted, so a first page over thousands of
+    REITs costs O(n + k log k) rather than O(n log n).
+    """
+    tickers = df[ticker_col].astype(str).to_numpy()
+
+    if sort_col == ticker_col:
+        return _select_page_by_ticker(df, tickers, descending, limit, cursor)
+
+    keys = pd.to_numeric(df[sort_col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    if descending:
+        keys = -keys
+    keys = np.where(np.isnan(keys), np.inf, keys)
+
+    if cursor is not None:
+        cursor_key, cursor_ticker = cursor
+        after = (keys > cursor_key) | ((keys == cursor_key) & (tickers > cursor_ticker))
+        candidates = np.flatnonzero(after)
+    else:
+        candidates = np.arange(len(df))
+
+    if limit is None or limit >= len(candidates):
+        order = candidates[np.lexsort((tickers[candidates], keys[candidates]))]
+        return df.iloc[order], None
+
+    candidate_keys = keys[candidates]
+    kth_key = np.partition(candidate_keys, limit - 1)[limit - 1]
+    top = candidates[candidate_keys <= kth_key]  # keeps every tie at the boundary
+    order = top[np.lexsort((tickers[top], keys[top]))][:limit]
+
+    last = order[-1]
+    return df.iloc[order], encode_cursor(keys[last], tickers[last])
+
+
+def _select_page_by_ticker(df, tickers, descending, limit, cursor):
+    """select_page() for sort=Ticker, where the ticker itself is the key."""
+    if cursor is not None:
+        after = tickers < cursor[1] if descending else tickers > cursor[1]
+        candidates = np.flatnonzero(after)
+    else:
+        candidates = np.arange(len(df))
+
+    order = candidates[np.argsort(tickers[candidates], kind="stable")]
+    if descending:
+        order = order[::-1]
+    if limit is None or limit >= len(order):
+        return df.iloc[order], None
+
+    order = order[:limit]
+    return df.iloc[order], encode_cursor(0, tickers[order[-1]])
+
+
+def parse_fields(args, allowed_columns, default_columns=None):
+    """
+    Reads fields=<col>,<col> for column projection. Returns default_columns
+    (all of allowed_columns if None) when not given. Raises ValueError on
+    unknown columns.
+    """
+    fields = args.get("fields")
+    if not fields:
+        return list(allowed_columns if default_columns is None else default_columns)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed_columns]
+    if unknown:
+        raise ValueError(f"Invalid 'fields' parameter: {', '.join(unknown)}")
+    if "Ticker" not in requested:
+        requested.insert(0, "Ticker")
+    return requested
+
+
+# -------------------------------------------------------------------------
+# Filtering
+# -------------------------------------------------------------------------
+def parse_list_arg(value):
+    """Splits a comma-separated query value into a list of stripped strings."""
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def build_filter_mask(frame, args, filter_specs):
+    """
+    Evaluates every min_/max_/in_ bound present in args as one boolean mask
+    over frame. filter_specs is a list of {'filter_prefix', 'column'} dicts;
+    for each, min_<prefix> and max_<prefix> are inclusive numeric bounds and
+    in_<prefix>=a,b keeps rows whose value is one of the listed values.
+    Rows with a missing value fail any bound on that column.
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    for spec in filter_specs:
+        prefix = spec['filter_prefix']
+        column = spec['column']
+        min_raw = args.get(f"min_{prefix}")
+        max_raw = args.get(f"max_{prefix}")
+        in_raw = args.get(f"in_{prefix}")
+        if min_raw is None and max_raw is None and in_raw is None:
+            continue
+
+        min_val = _parse_bound(min_raw)
+        max_val = _parse_bound(max_raw)
+        if min_val is not None or max_val is not None:
+            values = pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            with np.errstate(invalid="ignore"):
+                if min_val is not None:
+                    mask &= values >= min_val
+                if max_val is not None:
+                    mask &= values <= max_val
+
+        if in_raw is not None:
+            allowed = {v.lower() for v in parse_list_arg(in_raw)}
+            values = frame[column].astype(str).str.lower().to_numpy()
+            mask &= np.isin(values, list(allowed)) & frame[column].notna().to_numpy()
+    return mask
+
+
+def _parse_bound(raw):
+    """Numeric bound or None; like request.args.get(type=float), bad values are ignored."""
+    if raw is None:
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def referenced_prefixes(args, filter_specs):
+    """Filter prefixes that appear in any min_/max_/in_ argument."""
+    return {
+        spec['filter_prefix'] for spec in filter_specs
+        if any(f"{bound}_{spec['filter_prefix']}" in args for bound in ("min", "max", "in"))
+    }
+
+
+# -------------------------------------------------------------------------
+# Facets
+# -------------------------------------------------------------------------
+DEFAULT_FACET_BINS = 10
+MAX_FACET_BINS = 50
+
+
+def parse_facet_args(args):
+    """
+    Reads facets=true&facet_bins=<n>&facet_mode=fixed|quantile. Returns None
+    when facets were not requested. Raises ValueError on bad input.
+    """
+    if args.get("facets", "false").lower() != "true":
+        return None
+    mode = args.get("facet_mode", "fixed").lower()
+    if mode not in ("fixed", "quantile"):
+        raise ValueError("Invalid 'facet_mode' parameter. Must be fixed|quantile.")
+    try:
+        bins = int(args.get("facet_bins", DEFAULT_FACET_BINS))
+    except ValueError:
+        raise ValueError("Invalid 'facet_bins' parameter. Must be an integer.")
+    if bins < 1 or bins > MAX_FACET_BINS:
+        raise ValueError(f"'facet_bins' must be between 1 and {MAX_FACET_BINS}.")
+    return {"bins": bins, "mode": mode}
+
+
+def compute_facets(frame, numeric_columns, categorical_columns=(), bins=DEFAULT_FACET_BINS, mode="fixed"):
+    """
+    Per-column distribution summaries for slider UIs.
+
+    Numeric columns are stacked into one (rows, columns) float array and
+    binned together: edges are either equal-width between each column's
+    min and max ("fixed") or its quantiles ("quantile"), and counts for all
+    columns come from a single np.bincount. Categorical columns report value
+    counts. Returns {column: {...}} ready for JSON.
+    """
+    facets = {}
+    numeric_columns = list(numeric_columns)
+
+    if numeric_columns:
+        values = np.column_stack([
+            pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            for col in numeric_columns
+        ]) if len(frame) else np.empty((0, len(numeric_columns)))
+        values = np.where(np.isfinite(values), values, np.nan)
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=0)
+
+        # All-missing columns make nanmin/nanquantile warn; they are reported as empty below
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            if len(values):
+                col_min = np.nanmin(values, axis=0)
+                col_max = np.nanmax(values, axis=0)
+            else:
+                col_min = col_max = np.full(len(numeric_columns), np.nan)
+            if mode == "quantile" and len(values):
+                edges = np.nanquantile(values, np.linspace(0, 1, bins + 1), axis=0).T
+            else:
+                edges = col_min[:, None] + (col_max - col_min)[:, None] * np.linspace(0, 1, bins + 1)[None, :]
+
+        # Bin index = number of interior edges at or below the value, so the
+        # last bin is closed on the right like np.histogram.
+        interior = edges[:, 1:-1]
+        bin_index = (values[:, :, None] >= interior[None, :, :]).sum(axis=2)
+        flat = (np.arange(len(numeric_columns))[None, :] * bins + bin_index)[valid]
+        bin_counts = np.bincount(flat, minlength=len(numeric_columns) * bins).reshape(len(numeric_columns), bins)
+
+        for j, col in enumerate(numeric_columns):
+            if counts[j] == 0:
+                facets[col] = {"count": 0, "missing": int(len(frame)), "min": None, "max": None, "bins": []}
+                continue
+            facets[col] = {
+                "count": int(counts[j]),
+                "missing": int(len(frame) - counts[j]),
+                "min": float(col_min[j]),
+                "max": float(col_max[j]),
+                "bins": [
+                    {"lower": float(edges[j, k]), "upper": float(edges[j, k + 1]), "count": int(bin_counts[j, k])}
+                    for k in range(bins)
+                ],
+            }
+
+    for col in categorical_columns:
+        value_counts = frame[col].dropna().astype(str).value_counts()
+        facets[col] = {
+            "count": int(value_counts.sum()),
+            "missing": int(len(frame) - value_counts.sum()),
+            "values": {k: int(v) for k, v in value_counts.items()},
+        }
+
+    return facets
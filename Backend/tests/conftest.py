@@ -0,0 +1,177 @@
+# conftest.py
+"""
+Fixtures for running the "Python Run" scripts end to end: the synthetic
+universe's REIT list, a SQLite stand-in database holding reit_ffo_payout
+(loaded by hand in production), and the FMP stub as the price source.
+
+api is the Flask app's test client over a synthetic universe loaded into the
+SQLite stand-in, as in the benchmark suite. fake_redis replaces the Redis
+client of worker.py and plan_access.py.
+"""
+import importlib.util
+import logging
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fmp_stub import start_fmp_stub  # noqa: E402
+from benchmarks.sqlite_standin import create_standin_engine, install_mysql_compat  # noqa: E402
+from benchmarks.synthetic_universe import generate_universe, load_universe  # noqa: E402
+
+SCRIPT_DIR = os.path.join(BACKEND_DIR, "..", "Python Run")
+# The scripts' helper modules (fmp_client, db_upsert, sharding, ...) are unit tested too
+sys.path.insert(1, SCRIPT_DIR)
+N_TICKERS = 20
+API_TICKERS = 30
+
+
+@pytest.fixture(scope="session")
+def api_tables():
+    """The synthetic universe behind the api fixture, as DataFrames."""
+    return generate_universe(n_tickers=API_TICKERS, n_quarters=12, n_days=300, seed=1)
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory, api_tables):
+    """Test client of Backend/app.py on a SQLite stand-in of api_tables."""
+    db_path = tmp_path_factory.mktemp("api") / "api.sqlite"
+    load_universe(create_standin_engine(str(db_path)), api_tables)
+
+    with pytest.MonkeyPatch.context() as mp:
+        # The app reads DATABASE_URL at import time, and the local mirror must
+        # not shadow the stand-in database
+        mp.setenv("DATABASE_URL", f"sqlite:///{db_path}")
+        mp.setenv("REIT_MIRROR_DIR", str(db_path.parent / "mirror"))
+        from app import app, db
+
+        app.logger.setLevel(logging.WARNING)
+        with app.app_context():
+            install_mysql_compat(db.engine)
+        yield app.test_client()
+
+
+class FakeRedis:
+    """The few Redis commands the backend uses, on a dict. Expiry is recorded, not applied."""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        if ex is not None:
+            self.ttls[key] = ex
+        return True
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return key in self.values
+
+    def ttl(self, key):
+        return self.ttls.get(key, -1) if key in self.values else -2
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += self.values.pop(key, None) is not None
+            self.ttls.pop(key, None)
+        return removed
+
+
+@pytest.fixture
+def fake_redis(api, monkeypatch):
+    # worker.py reads DATABASE_URL at import time, as app.py does
+    import plan_access
+    import worker
+
+    client = FakeRedis()
+    monkeypatch.setattr(worker, "_redis_client", client)
+    monkeypatch.setattr(plan_access, "get_redis_client", lambda: client)
+    return client
+
+
+@pytest.fixture(scope="session")
+def fmp_stub():
+    server = start_fmp_stub(n_days=300, end_date="2025-06-10")
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def universe(tmp_path):
+    """(REIT list CSV, base database) paths."""
+    rng = np.random.default_rng(0)
+    business = generate_universe(n_tickers=N_TICKERS, n_quarters=4, n_days=10, seed=0)["reit_business_data"]
+    reit_list = tmp_path / "reit_list.csv"
+    business.to_csv(reit_list, index=False)
+
+    ffo_payout = pd.DataFrame({"Years": range(2015, 2025)})
+    for ticker in business["Ticker"]:
+        ffo_payout[f"{ticker}_US_Equity"] = rng.normal(70, 20, len(ffo_payout))
+    base_db = tmp_path / "base.sqlite"
+    engine = create_standin_engine(str(base_db))
+    ffo_payout.to_sql("reit_ffo_payout", engine, index=False)
+    engine.dispose()
+    return reit_list, base_db
+
+
+@pytest.fixture
+def make_db(tmp_path, universe):
+    """make_db(name) -> path of a fresh copy of the base database."""
+    def make(name):
+        path = tmp_path / f"{name}.sqlite"
+        shutil.copy(universe[1], path)
+        return path
+    return make
+
+
+@pytest.fixture
+def run_in(universe, fmp_stub):
+    """
+    run_in(db_path, script, *args, **env) -> CompletedProcess of a "Python Run"
+    script; env overrides the environment variables set here.
+    """
+    def run(db_path, *args, **overrides):
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{db_path}",
+            REIT_LIST_PATH=str(universe[0]),
+            FMP_BASE_URL=fmp_stub.url,
+            FMP_API_KEY="test",
+            FMP_CACHE="off",
+        )
+        env.update(overrides)
+        return subprocess.run(
+            [sys.executable, *args], cwd=SCRIPT_DIR, env=env, capture_output=True, text=True, timeout=600
+        )
+    return run
+
+
+@pytest.fixture
+def load_script(monkeypatch):
+    """
+    load_script(script, db_path) -> a "Python Run" script imported as a
+    module (its __main__ block skipped) against db_path. Its functions read
+    their settings from the module, so tests can change them there.
+    """
+    def load(script, db_path):
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{db_path}")
+        spec = importlib.util.spec_from_file_location(os.path.splitext(script)[0], os.path.join(SCRIPT_DIR, script))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    return load
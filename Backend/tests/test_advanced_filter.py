@@ -0,0 +1,56 @@
+# test_advanced_filter.py
+"""
+/api/reits/advanced-filter response shape and scoring-field screens.
+"""
+import pytest
+
+# Keys of every REIT in the response before scoring fields could be screened on
+BASELINE_KEYS = {
+    "Ticker", "Company_Name", "Business_Description", "Website",
+    "operating_margin", "avg_revenue_yoy_growth", "avg_ffo_yoy_growth",
+    "interest_coverage_ratio", "debt_to_asset_ratio", "ffo_payout_ratio",
+    "pe_ratio", "pffo_ratio", "ffo_to_revenue_ratio", "net_debt_to_ebitda",
+}
+
+
+def get_reits(api, query=""):
+    response = api.get(f"/api/reits/advanced-filter?{query}")
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def test_default_payload_keys_are_unchanged(api):
+    reits = get_reits(api)["reits"]
+    assert reits
+    assert all(set(reit) == BASELINE_KEYS for reit in reits)
+
+
+def test_default_facets_have_no_scoring_fields(api):
+    facets = get_reits(api, "facets=true")["facets"]
+    assert set(facets) == BASELINE_KEYS - {"Ticker", "Company_Name", "Business_Description", "Website"}
+
+
+@pytest.mark.parametrize("query", [
+    "fields=Ticker,Stability Percentile",
+    "min_stability_percentile=0",
+    "sort=stability_percentile&limit=5",
+])
+def test_scoring_fields_load_when_referenced(api, api_tables, query):
+    reits = get_reits(api, query)["reits"]
+    scores = api_tables["reit_scoring_analysis"].set_index("Ticker")["Stability Percentile"]
+    if query.startswith("fields="):
+        assert all(set(reit) == {"Ticker", "Stability Percentile"} for reit in reits)
+        assert all(reit["Stability Percentile"] == pytest.approx(scores[reit["Ticker"]]) for reit in reits)
+    else:
+        assert all(set(reit) == BASELINE_KEYS for reit in reits)
+
+
+def test_scoring_filter_and_sort(api, api_tables):
+    scores = api_tables["reit_scoring_analysis"].set_index("Ticker")["Stability Percentile"]
+    threshold = float(scores.median())
+    reits = get_reits(
+        api, f"min_stability_percentile={threshold}&sort=stability_percentile&order=desc"
+        "&fields=Ticker,Stability Percentile"
+    )["reits"]
+    expected = scores[scores >= threshold].sort_values(ascending=False)
+    assert [reit["Ticker"] for reit in reits] == list(expected.index)
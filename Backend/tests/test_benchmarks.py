@@ -0,0 +1,92 @@
+# test_benchmarks.py
+"""
+Smoke tests of the benchmark entry points at a tiny scale, and of the
+service stubs against the contracts the app and frontend rely on.
+"""
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+
+import requests
+from sqlalchemy import inspect
+
+from benchmarks import service_stubs
+from benchmarks.load_replay import Recorder, VirtualUser
+from benchmarks.sqlite_standin import create_standin_engine
+from conftest import BACKEND_DIR
+
+
+def test_run_benchmarks(tmp_path):
+    db_path, output = tmp_path / "bench.sqlite", tmp_path / "bench.json"
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run_benchmarks", "--tickers", "10", "--quarters", "8",
+         "--days", "300", "--repeat", "1", "--db", str(db_path), "--output", str(output)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=600,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    report = json.loads(output.read_text())
+    assert set(report["results"]) == {
+        "get_reits", "get_reits_search", "get_advanced_filtered_reits",
+        "get_advanced_filtered_reits_sorted", "get_price_data", "get_financials", "risk_scoring",
+    }
+    assert all(summary["runs"] == 1 for summary in report["results"].values())
+    # The risk script ran to the end rather than exiting on an error
+    assert inspect(create_standin_engine(str(db_path))).has_table("reit_risk_history")
+
+
+def test_load_replay(tmp_path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    output = tmp_path / "load.json"
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.load_replay", "run", "--tickers", "10", "--quarters", "8",
+         "--days", "300", "--users", "2", "--stage-seconds", "3", "--warmup-seconds", "0",
+         "--think-scale", "0", "--mix", "filter=1,llm=1", "--gemini-latency", "0",
+         "--werkzeug", "--port", str(port), "--output", str(output)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=600,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    stage = json.loads(output.read_text())["stages"][0]
+    assert stage["errors"] == 0
+    assert {"POST /api/llm-filter", "GET /api/reits/advanced-filter"} <= set(stage["routes"])
+
+
+class _TestClientSession:
+    """requests.Session stand-in sending VirtualUser's requests to a Flask test client."""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def request(self, method, url, timeout=None, params=None, json=None):
+        self.calls.append((method, url, params))
+        response = self.client.open(url, method=method, query_string=params, json=json)
+        return SimpleNamespace(status_code=response.status_code, json=lambda: response.get_json())
+
+
+def test_llm_session_screens_with_the_returned_filters(api, monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "stub")
+    monkeypatch.setattr(
+        requests, "post", lambda url, *args, **kwargs: service_stubs._StubResponse(
+            service_stubs._gemini_payload(kwargs.get("json"))
+        )
+    )
+    response = api.post("/api/llm-filter", json={"query": "Profitable REITs with low debt"})
+    assert response.status_code == 200
+    assert set(response.get_json()) == {"explanation", "filters"}
+
+    user = VirtualUser("", ["AAA"], Recorder(), threading.Event(), random.Random(0), 0, 0, 0)
+    user.http = _TestClientSession(api)
+    user.llm()
+    assert [call[:2] for call in user.http.calls] == [
+        ("POST", "/api/llm-filter"), ("GET", "/api/reits/advanced-filter"),
+    ]
+    assert user.http.calls[1][2] == service_stubs.STUB_FILTERS
+    assert all(status == 200 for _, status, _, _ in user.recorder.samples)
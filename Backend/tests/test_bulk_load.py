@@ -0,0 +1,105 @@
+# test_bulk_load.py
+"""
+"Python Run/bulk_load.py" and full price reloads: the shadow table is only
+swapped in once it is fully loaded, and a failed reload keeps the live table.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import inspect
+
+from benchmarks.sqlite_standin import create_standin_engine
+from bulk_load import BulkLoader, swap_tables
+from test_price_load import FIRST_END, SCRIPT, run_ok, stored_prices, stub_prices
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_standin_engine(str(tmp_path / "bulk.sqlite"))
+
+
+def prices(n, start=0):
+    return pd.DataFrame({
+        "date": pd.bdate_range("2025-01-01", periods=n).strftime("%Y-%m-%d"),
+        "ticker": "ABC",
+        "close_price": np.arange(start, start + n, dtype=float),
+        "volume": [np.nan] + [1.0] * (n - 1),
+    })
+
+
+def create_price_table(engine, table):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f"CREATE TABLE {table} (date DATE NOT NULL, ticker VARCHAR(10) NOT NULL, "
+            "close_price FLOAT NOT NULL, volume FLOAT, PRIMARY KEY (date, ticker))"
+        )
+
+
+def test_swap_replaces_the_live_table(engine):
+    for table, df in (("live", prices(3)), ("live_new", prices(5, start=100))):
+        create_price_table(engine, table)
+        BulkLoader(engine).load(table, df)
+
+    with engine.begin() as conn:
+        swap_tables(conn, "live", "live_new")
+    assert set(inspect(engine).get_table_names()) == {"live"}
+    assert list(pd.read_sql("SELECT close_price FROM live ORDER BY date", engine)["close_price"]) == [
+        100.0, 101.0, 102.0, 103.0, 104.0]
+
+
+def test_swap_without_a_live_table_renames(engine):
+    create_price_table(engine, "live_new")
+    with engine.begin() as conn:
+        swap_tables(conn, "live", "live_new")
+    assert set(inspect(engine).get_table_names()) == {"live"}
+
+
+def test_swap_without_a_shadow_keeps_the_live_table(engine):
+    create_price_table(engine, "live")
+    BulkLoader(engine).load("live", prices(3))
+    with pytest.raises(ValueError):
+        with engine.begin() as conn:
+            swap_tables(conn, "live", "missing_shadow")
+    assert len(pd.read_sql("SELECT * FROM live", engine)) == 3
+
+
+def test_load_data_falls_back_to_inserts(engine, capsys):
+    create_price_table(engine, "live")
+    loader = BulkLoader(engine, method="load_data")
+    assert loader.load("live", prices(4)) == 4
+    assert loader.method == "executemany"
+    assert "Falling back to batched INSERTs" in capsys.readouterr().out
+    stored = pd.read_sql("SELECT * FROM live ORDER BY date", engine)
+    assert stored["volume"].isna().tolist() == [True, False, False, False]
+
+
+def test_full_reload_swaps_in_fresh_prices(make_db, run_in):
+    db_path = make_db("full")
+    run_ok(run_in, db_path)
+    engine = create_standin_engine(str(db_path))
+    tickers = sorted(stored_prices(engine)["ticker"].unique())
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO reit_price_data VALUES ('2001-01-02', 'GONE', 1.0, 1.0)")
+        conn.exec_driver_sql("CREATE TABLE reit_risk_sums (ticker TEXT)")
+
+    result = run_ok(run_in, db_path, "--full")
+    assert "Swapped the reloaded price data into reit_price_data" in result.stdout
+    pd.testing.assert_frame_equal(stored_prices(engine), stub_prices(tickers, [FIRST_END]), check_dtype=False, rtol=1e-6)
+    assert list(stored_prices(engine, "reit_latest_price")["ticker"]) == tickers
+    tables = set(inspect(engine).get_table_names())
+    assert "reit_price_data_new" not in tables and "reit_price_data_old" not in tables
+    # Script 2's return sums described the replaced history
+    assert "reit_risk_sums" not in tables
+
+
+def test_failed_full_reload_keeps_the_live_table(make_db, run_in):
+    db_path = make_db("failed_full")
+    run_ok(run_in, db_path)
+    engine = create_standin_engine(str(db_path))
+    before = stored_prices(engine)
+
+    # Nothing listens on port 9: every fetch fails
+    result = run_in(db_path, SCRIPT, "--full", FMP_BASE_URL="http://127.0.0.1:9", FMP_MAX_RETRIES="0")
+    assert "Keeping the existing reit_price_data" in result.stdout
+    pd.testing.assert_frame_equal(stored_prices(engine), before)
+    assert "reit_price_data_new" not in inspect(engine).get_table_names()
@@ -0,0 +1,95 @@
+# test_columnar_export.py
+"""
+/api/export/*: the premium-plan gate, and streams that fail loudly instead of
+ending in a silently short file.
+"""
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import columnar_export
+
+PLANS = {"free@example.com": "free", "premium@example.com": "premium"}
+PREMIUM = {"Authorization": "Bearer premium@example.com"}
+
+
+@pytest.fixture
+def users(monkeypatch, fake_redis):
+    """Bearer tokens are the users' emails; PLANS holds their plans."""
+    import plan_access
+
+    def verify_user(token):
+        if token not in PLANS:
+            raise ValueError("Invalid ID token")
+        return token
+
+    monkeypatch.setattr(plan_access, "verify_user", verify_user)
+    monkeypatch.setattr(plan_access, "user_plan", PLANS.get)
+    return fake_redis
+
+
+def read_export(data, export_format):
+    if export_format == "parquet":
+        return pq.read_table(io.BytesIO(data))
+    return pa.ipc.open_stream(data).read_all()
+
+
+@pytest.mark.parametrize("headers, status", [
+    ({}, 401),
+    ({"Authorization": "Token premium@example.com"}, 401),
+    ({"Authorization": "Bearer unknown"}, 401),
+    ({"Authorization": "Bearer free@example.com"}, 403),
+])
+def test_exports_need_a_premium_user(api, users, headers, status):
+    for path in ("/api/export/scoring", "/api/export/metrics", "/api/export/prices"):
+        assert api.get(path, headers=headers).status_code == status
+
+
+@pytest.mark.parametrize("export_format", ["arrow", "parquet"])
+def test_premium_export(api, users, api_tables, export_format):
+    response = api.get(f"/api/export/prices?format={export_format}&columns=ticker,close_price", headers=PREMIUM)
+    assert response.status_code == 200
+    table = read_export(response.get_data(), export_format)
+    assert table.column_names == ["ticker", "close_price"]
+    assert table.num_rows == len(api_tables["reit_price_data"])
+
+
+def test_exports_are_rate_limited(api, users, monkeypatch):
+    import plan_access
+
+    monkeypatch.setattr(plan_access, "EXPORT_RATE_LIMIT", 2)
+    statuses = [api.get("/api/export/scoring", headers=PREMIUM).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    (key,) = users.values
+    assert key.startswith("export_rate:premium@example.com:")
+    assert users.ttl(key) == plan_access.EXPORT_RATE_WINDOW_SECONDS
+
+
+def failing_batches(n_good):
+    """_record_batches stand-in that fails after n_good batches."""
+    def record_batches(engine, sql, params):
+        for i in range(n_good):
+            yield pa.record_batch([pa.array([i, i + 1])], names=["value"])
+        raise RuntimeError("connection lost")
+    return record_batches
+
+
+def test_first_chunk_errors_are_a_500(api, users, monkeypatch):
+    monkeypatch.setattr(columnar_export, "_record_batches", failing_batches(0))
+    response = api.get("/api/export/scoring", headers=PREMIUM)
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "Failed to export reit_scoring_analysis"}
+
+
+@pytest.mark.parametrize("export_format", ["arrow", "parquet"])
+def test_later_chunk_errors_leave_an_unreadable_file(api, users, monkeypatch, caplog, export_format):
+    monkeypatch.setattr(columnar_export, "_record_batches", failing_batches(3))
+    response = api.get(f"/api/export/scoring?format={export_format}", headers=PREMIUM)
+    assert response.status_code == 200
+    data = response.get_data()
+    assert data
+    with pytest.raises(pa.ArrowInvalid):
+        read_export(data, export_format)
+    assert "Export stream failed after its first chunk" in caplog.text
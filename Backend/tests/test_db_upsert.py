@@ -0,0 +1,110 @@
+# test_db_upsert.py
+"""
+"Python Run/db_upsert.py": upsert_columns writes only its own columns of a
+shared table, adds the table, key and columns it needs, and with prune drops
+the rows it was not given.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import inspect
+
+from benchmarks.sqlite_standin import create_standin_engine
+from db_upsert import upsert_columns, upsert_dataframe
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_standin_engine(str(tmp_path / "upsert.sqlite"))
+
+
+def stored(engine, table="scores"):
+    return pd.read_sql(f"SELECT * FROM {table} ORDER BY Ticker", engine)
+
+
+def upsert(engine, df, **options):
+    with engine.begin() as conn:
+        return upsert_columns(conn, "scores", df, ["Ticker"], **options)
+
+
+def test_creates_the_table_with_a_key(engine):
+    df = pd.DataFrame({"Ticker": ["AAA", "BBB"], "risk": [1.0, 2.0]})
+    assert upsert(engine, df) == 2
+    pd.testing.assert_frame_equal(stored(engine), df)
+    unique = [i["column_names"] for i in inspect(engine).get_indexes("scores") if i["unique"]]
+    assert unique == [["Ticker"]]
+    # The staging table does not outlive the call
+    assert set(inspect(engine).get_table_names()) == {"scores"}
+
+
+def test_other_columns_keep_their_values(engine):
+    # A table as DataFrame.to_sql leaves it: no key
+    pd.DataFrame({"Ticker": ["AAA", "BBB"], "risk": [1.0, 2.0], "ffo": [10.0, 20.0]}).to_sql(
+        "scores", engine, index=False)
+
+    upsert(engine, pd.DataFrame({"Ticker": ["BBB", "CCC"], "risk": [5.0, 6.0], "tier": ["High", "Low"]}))
+    expected = pd.DataFrame({
+        "Ticker": ["AAA", "BBB", "CCC"],
+        "risk": [1.0, 5.0, 6.0],
+        "ffo": [10.0, 20.0, np.nan],
+        "tier": [None, "High", "Low"],
+    })
+    pd.testing.assert_frame_equal(stored(engine), expected)
+
+
+def test_prune_deletes_rows_not_given(engine):
+    upsert(engine, pd.DataFrame({"Ticker": ["AAA", "BBB", "CCC"], "risk": [1.0, 2.0, 3.0]}))
+    upsert(engine, pd.DataFrame({"Ticker": ["AAA", "CCC"], "ffo": [10.0, 30.0]}))
+
+    upsert(engine, pd.DataFrame({"Ticker": ["CCC", "DDD"], "risk": [7.0, 8.0]}), prune=True)
+    expected = pd.DataFrame({"Ticker": ["CCC", "DDD"], "risk": [7.0, 8.0], "ffo": [30.0, np.nan]})
+    pd.testing.assert_frame_equal(stored(engine), expected)
+
+    # Without prune nothing is deleted
+    upsert(engine, pd.DataFrame({"Ticker": ["EEE"], "risk": [9.0]}))
+    assert list(stored(engine)["Ticker"]) == ["CCC", "DDD", "EEE"]
+
+
+def test_composite_key_prune(engine):
+    rows = pd.DataFrame({"ticker": ["A", "A", "B"], "horizon": ["1Y", "3Y", "1Y"], "value": [1.0, 2.0, 3.0]})
+    with engine.begin() as conn:
+        upsert_columns(conn, "history", rows, ["ticker", "horizon"])
+        upsert_columns(conn, "history", rows.iloc[[0, 2]].assign(value=[4.0, 5.0]), ["ticker", "horizon"], prune=True)
+    stored_rows = pd.read_sql("SELECT * FROM history ORDER BY ticker, horizon", engine)
+    assert stored_rows.values.tolist() == [["A", "1Y", 4.0], ["B", "1Y", 5.0]]
+
+
+def test_failed_transaction_keeps_the_table(engine):
+    upsert(engine, pd.DataFrame({"Ticker": ["AAA", "BBB"], "risk": [1.0, 2.0]}))
+    with pytest.raises(RuntimeError):
+        with engine.begin() as conn:
+            upsert_columns(conn, "scores", pd.DataFrame({"Ticker": ["CCC"], "risk": [3.0]}), ["Ticker"], prune=True)
+            raise RuntimeError("later stage failed")
+    assert stored(engine)["risk"].tolist() == [1.0, 2.0]
+
+
+def test_upsert_dataframe_updates_in_place(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE prices (ticker TEXT, date TEXT, close REAL, PRIMARY KEY (ticker, date))")
+        upsert_dataframe(conn, "prices", pd.DataFrame({"ticker": ["A", "A"], "date": ["d1", "d2"], "close": [1.0, 2.0]}),
+                         ["ticker", "date"])
+        upsert_dataframe(conn, "prices", pd.DataFrame({"ticker": ["A"], "date": ["d2"], "close": [np.nan]}),
+                         ["ticker", "date"])
+    assert pd.read_sql("SELECT * FROM prices ORDER BY date", engine)["close"].isna().tolist() == [False, True]
+
+
+def test_stability_scores_keep_the_fundamental_columns(tmp_path, load_script):
+    db_path = tmp_path / "scores.sqlite"
+    risk = load_script("2. Stock data analysis - risk.py", db_path)
+    engine = create_standin_engine(str(db_path))
+    # Script 3's columns from an earlier run, for a ticker still priced and one that is not
+    pd.DataFrame({"Ticker": ["AAA", "GONE"], "FFO Payout Ratio": [0.7, 0.9]}).to_sql(
+        "reit_scoring_analysis", engine, index=False)
+
+    risk.save_stability_scores(pd.DataFrame({"Ticker": ["AAA", "BBB"], "Stability Percentile": [0.25, 0.75]}))
+    expected = pd.DataFrame({
+        "Ticker": ["AAA", "BBB"],
+        "FFO Payout Ratio": [0.7, np.nan],
+        "Stability Percentile": [0.25, 0.75],
+    })
+    pd.testing.assert_frame_equal(stored(engine, "reit_scoring_analysis"), expected)
@@ -0,0 +1,90 @@
+# test_duckdb_screen.py
+"""
+duckdb_screen.py computes the same latest-quarter metrics as the pandas path
+(calculate_metrics_for_ticker), including on duplicate statement rows.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import local_mirror
+from benchmarks.sqlite_standin import create_standin_engine
+from benchmarks.synthetic_universe import generate_universe, load_universe
+from duckdb_screen import compute_latest_metrics, latest_closes, open_mirror_connection
+from metric_panel import load_statement_rows
+
+N_DUPLICATED = 8
+
+
+def restated(rows, line_item, factor, first_id):
+    """Later, lower copies of rows under line_item, with ids after first_id."""
+    rows = rows.copy()
+    rows["line_item"] = line_item
+    rows["value"] = rows["value"] * factor
+    rows["id"] = np.arange(first_id + 1, first_id + 1 + len(rows))
+    return rows
+
+
+@pytest.fixture
+def duplicated_universe(tmp_path, monkeypatch):
+    """(engine, tables) of a universe where some tickers have restated rows, mirrored."""
+    tables = generate_universe(n_tickers=25, n_quarters=12, n_days=60, seed=2)
+    tickers = sorted(tables["reit_business_data"]["Ticker"])[:N_DUPLICATED]
+
+    # " Total Debt" is a second row for Total Debt once trimmed, inserted later
+    balance = tables["reit_balance_sheet"]
+    debt = balance[balance["ticker"].isin(tickers) & (balance["line_item"] == "Total Debt")]
+    tables["reit_balance_sheet"] = pd.concat(
+        [balance, restated(debt, " Total Debt", 0.5, balance["id"].max())], ignore_index=True
+    )
+    # Total Revenue repeated in a later statement table
+    income, industry = tables["reit_income_statement"], tables["reit_industry_metrics"]
+    revenue = income[income["ticker"].isin(tickers) & (income["line_item"] == "Total Revenue")]
+    tables["reit_industry_metrics"] = pd.concat(
+        [industry, restated(revenue, "Total Revenue", 0.6, industry["id"].max())], ignore_index=True
+    )
+
+    db_path = tmp_path / "duplicates.sqlite"
+    engine = create_standin_engine(str(db_path), parse_dates=True)
+    load_universe(engine, tables)
+
+    monkeypatch.setattr(local_mirror, "MIRROR_DIR", str(tmp_path / "mirror"))
+    monkeypatch.setattr(local_mirror, "_manifest_cache", {"mtime": None, "data": None})
+    monkeypatch.setattr(local_mirror, "_table_cache", {})
+    local_mirror.sync_mirror(engine)
+    return engine, tables
+
+
+def test_duckdb_matches_pandas_on_duplicates(api, duplicated_universe):
+    from app import METRIC_CONFIG, calculate_metrics_for_ticker
+
+    engine, tables = duplicated_universe
+    tickers = tuple(tables["reit_business_data"]["Ticker"])
+    line_items = {item for conf in METRIC_CONFIG for item in conf["line_items"]}
+
+    with engine.connect() as conn:
+        financials = load_statement_rows(conn, line_items, tickers)
+        prices = pd.read_sql("SELECT ticker, close_price FROM reit_latest_price", conn).set_index("ticker")["close_price"]
+    expected = financials.groupby("ticker").apply(lambda group: calculate_metrics_for_ticker(group, prices))
+    expected = expected.reset_index().rename(columns={"ticker": "Ticker"}).sort_values("Ticker")
+
+    con = open_mirror_connection(tickers)
+    assert con is not None
+    pd.testing.assert_series_equal(latest_closes(con).sort_index(), prices.sort_index(), check_names=False)
+    actual = compute_latest_metrics(con, line_items, METRIC_CONFIG)
+    con.close()
+
+    pd.testing.assert_frame_equal(
+        actual.reset_index(drop=True), expected.reset_index(drop=True).astype(actual.dtypes.to_dict()),
+        check_dtype=False, rtol=1e-9,
+    )
+
+    # Both use the restated (lower) values rather than the larger original
+    balance = tables["reit_balance_sheet"].assign(line_item=lambda df: df["line_item"].str.strip())
+    ticker = sorted(tickers)[0]
+    debt = balance[(balance["ticker"] == ticker) & (balance["line_item"] == "Total Debt")].dropna(subset=["value"])
+    assets = balance[(balance["ticker"] == ticker) & (balance["line_item"] == "Total Assets")].dropna(subset=["value"])
+    last_debt = debt.sort_values(["fiscal_year", "fiscal_quarter", "id"]).iloc[-1]["value"]
+    last_assets = assets.sort_values(["fiscal_year", "fiscal_quarter"]).iloc[-1]["value"]
+    ratio = actual.set_index("Ticker").loc[ticker, "debt_to_asset_ratio"]
+    assert ratio == pytest.approx(last_debt / last_assets)
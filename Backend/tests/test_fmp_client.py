@@ -0,0 +1,209 @@
+# test_fmp_client.py
+"""
+"Python Run/fmp_client.py": the token bucket's rate, concurrent fetches
+against the FMP stub that retry injected 429/503s without exceeding it, and
+the on-disk response cache.
+"""
+import gzip
+import threading
+import time
+import types
+
+import pandas as pd
+import pytest
+
+import fmp_client
+from benchmarks.fmp_stub import start_fmp_stub, synthetic_history
+from fmp_client import CacheMiss, FMPClient, ResponseCache, TokenBucket
+
+END_DATE = "2025-06-10"
+
+
+class FakeClock:
+    """monotonic() / sleep() that advance virtual time only."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(fmp_client, "time", types.SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    return clock
+
+
+def test_bucket_allows_a_burst_then_the_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == 0
+    for _ in range(7):
+        bucket.acquire()
+    assert clock.slept == pytest.approx(7 / 2)
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=4)
+    assert bucket.capacity == 4
+    for _ in range(4):
+        bucket.acquire()
+    clock.now += 60  # idle: refills to capacity, not 240 tokens
+    for _ in range(6):
+        bucket.acquire()
+    assert clock.slept == pytest.approx(2 / 4)
+
+
+def test_bucket_is_shared_by_threads():
+    bucket = TokenBucket(rate=1000, capacity=1)
+    granted = []
+
+    def take():
+        for _ in range(50):
+            bucket.acquire()
+            granted.append(1)
+
+    threads = [threading.Thread(target=take) for _ in range(4)]
+    start = fmp_client.time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(granted) == 200
+    assert fmp_client.time.monotonic() - start >= 199 / 1000
+
+
+@pytest.fixture
+def flaky_stub():
+    server = start_fmp_stub(n_days=60, end_date=END_DATE, error_rate=0.3, seed=4)
+    yield server
+    server.shutdown()
+
+
+def test_concurrent_fetch_retries_within_the_rate(flaky_stub):
+    tickers = [f"T{i:02d}" for i in range(30)]
+    client = FMPClient("test", base_url=flaky_stub.url, rate=40, burst=5, max_workers=6,
+                       max_retries=8, backoff=0.01, cache=None)
+    fetched = dict(client.iter_price_histories(tickers))
+
+    assert sorted(fetched) == tickers
+    for ticker, df in fetched.items():
+        expected = synthetic_history(ticker, 60, END_DATE).iloc[::-1]
+        assert list(df["date"]) == list(expected["date"])
+        assert list(df["close"]) == list(expected["close"])
+        assert (df["ticker"] == ticker).all()
+    assert flaky_stub.errors_sent > 0
+    # One second of sustained rate plus the initial burst
+    assert flaky_stub.peak_rate(1.0) <= 40 + 5
+
+
+def test_start_date_limits_the_history(fmp_stub):
+    client = FMPClient("test", base_url=fmp_stub.url, rate=100, cache=None)
+    df = client.fetch_price_history("ABC", start_date=pd.Timestamp("2025-06-02").date())
+    assert sorted(df["date"]) == ["2025-06-02", "2025-06-03", "2025-06-04", "2025-06-05", "2025-06-06",
+                                  "2025-06-09", "2025-06-10"]
+
+
+def test_exhausted_retries_skip_the_ticker(capsys):
+    server = start_fmp_stub(n_days=10, end_date=END_DATE, error_rate=1.0)
+    try:
+        client = FMPClient("test", base_url=server.url, rate=100, max_retries=2, backoff=0.001, cache=None)
+        assert client.fetch_price_history("ABC").empty
+    finally:
+        server.shutdown()
+    assert len(server.request_times) == 3
+    assert "Error fetching data for ABC" in capsys.readouterr().out
+
+
+def cached_client(server, cache_dir, **cache_options):
+    cache = ResponseCache(str(cache_dir), **cache_options)
+    return FMPClient("secret-key", base_url=server.url, rate=100, max_retries=0, cache=cache)
+
+
+def test_cached_responses_skip_the_network(fmp_stub, tmp_path):
+    client = cached_client(fmp_stub, tmp_path)
+    before = len(fmp_stub.request_paths)
+    first = client.fetch_price_history("ABC", start_date="2025-06-01")
+    second = client.fetch_price_history("ABC", start_date="2025-06-01")
+    pd.testing.assert_frame_equal(first, second)
+    assert len(fmp_stub.request_paths) == before + 1
+
+    # Another range is another entry; the API key is not part of the key
+    client.fetch_price_history("ABC", start_date="2025-06-02")
+    assert len(fmp_stub.request_paths) == before + 2
+    paths = list(tmp_path.rglob("*.json.gz"))
+    assert len(paths) == 2
+    assert {p.parent for p in paths} == {tmp_path / "historical-price-full" / "ABC"}
+    assert client.cache.path_for("p", {"from": 1, "apikey": "a"}) == client.cache.path_for("p", {"from": 1})
+    for path in paths:
+        with gzip.open(path, "rb") as f:
+            assert b"secret-key" not in f.read()
+
+
+def test_stale_responses_are_refetched(fmp_stub, tmp_path, monkeypatch):
+    client = cached_client(fmp_stub, tmp_path, ttl=60)
+    before = len(fmp_stub.request_paths)
+    client.fetch_price_history("ABC")
+    client.fetch_price_history("ABC")
+    assert len(fmp_stub.request_paths) == before + 1
+
+    later = time.time() + 61
+    monkeypatch.setattr(fmp_client, "time", types.SimpleNamespace(
+        time=lambda: later, monotonic=time.monotonic, sleep=time.sleep))
+    client.fetch_price_history("ABC")
+    assert len(fmp_stub.request_paths) == before + 2
+
+
+def test_offline_mode_replays_the_cache_only(fmp_stub, tmp_path, monkeypatch):
+    online = cached_client(fmp_stub, tmp_path, ttl=0.01)
+    expected = online.fetch_price_history("ABC")
+    time.sleep(0.02)
+
+    offline = cached_client(fmp_stub, tmp_path, ttl=0.01, offline=True)
+    before = len(fmp_stub.request_paths)
+    # Stale responses are still served offline
+    pd.testing.assert_frame_equal(offline.fetch_price_history("ABC"), expected)
+    with pytest.raises(CacheMiss):
+        offline.get_json("historical-price-full/XYZ")
+    # fetch_price_history skips a ticker without a cached response
+    assert offline.fetch_price_history("XYZ").empty
+    assert len(fmp_stub.request_paths) == before
+
+
+def test_error_messages_are_not_cached(tmp_path, monkeypatch):
+    client = FMPClient("test", base_url="http://127.0.0.1:9", rate=100, cache=ResponseCache(str(tmp_path)))
+    response = types.SimpleNamespace(status_code=200, raise_for_status=lambda: None,
+                                     json=lambda: {"Error Message": "Invalid API KEY."})
+    monkeypatch.setattr(client.session, "get", lambda *args, **kwargs: response)
+    assert client.get_json("historical-price-full/ABC") == {"Error Message": "Invalid API KEY."}
+    assert not list(tmp_path.rglob("*.json.gz"))
+
+
+@pytest.mark.parametrize("env, expected", [
+    ({"FMP_CACHE": "off"}, None),
+    ({"FMP_CACHE": "readwrite", "FMP_CACHE_TTL": "5"}, (5.0, False)),
+    ({"FMP_CACHE": "offline"}, (6 * 3600, True)),
+])
+def test_cache_from_env(monkeypatch, tmp_path, env, expected):
+    monkeypatch.setenv("FMP_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("FMP_CACHE_TTL", raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    cache = ResponseCache.from_env()
+    assert (cache if cache is None else (cache.ttl, cache.offline)) == expected
+    if cache is not None:
+        assert cache.directory == str(tmp_path)
+
+
+def test_cache_mode_is_validated(monkeypatch):
+    monkeypatch.setenv("FMP_CACHE", "sometimes")
+    with pytest.raises(ValueError):
+        ResponseCache.from_env()
@@ -0,0 +1,77 @@
+# test_latest_price.py
+"""
+reit_latest_price, kept by "Python Run/1. Stock universe - initial set up.py":
+after every run it holds each ticker's last reit_price_data row, whether it
+was upserted with an incremental batch or rebuilt.
+"""
+import pandas as pd
+import pytest
+
+from benchmarks.fmp_stub import start_fmp_stub
+from benchmarks.sqlite_standin import create_standin_engine
+from test_price_load import FIRST_END, LATER_END, run_ok, stored_prices
+
+
+@pytest.fixture
+def later_stub():
+    server = start_fmp_stub(n_days=300, end_date=LATER_END)
+    yield server
+    server.shutdown()
+
+
+def last_rows(engine):
+    """Each ticker's last reit_price_data row, as reit_latest_price should hold it."""
+    prices = stored_prices(engine)
+    return prices.drop_duplicates(subset=["ticker"], keep="last").reset_index(drop=True)
+
+
+def assert_latest_is_current(engine):
+    pd.testing.assert_frame_equal(stored_prices(engine, "reit_latest_price"), last_rows(engine))
+
+
+def test_incremental_batches_upsert_the_latest_rows(make_db, run_in, later_stub):
+    db_path = make_db("latest_incremental")
+    result = run_ok(run_in, db_path)
+    engine = create_standin_engine(str(db_path))
+    # The first run found the table empty
+    assert "Rebuilt reit_latest_price" in result.stdout
+    assert_latest_is_current(engine)
+
+    # Wrong latest rows are replaced by the next batch holding the ticker
+    wrong = sorted(stored_prices(engine)["ticker"].unique())[0]
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f"UPDATE reit_latest_price SET date = '2001-01-02', close_price = -1 WHERE ticker = '{wrong}'")
+
+    result = run_ok(run_in, db_path, FMP_BASE_URL=later_stub.url)
+    assert "Rebuilt reit_latest_price" not in result.stdout
+    assert set(stored_prices(engine, "reit_latest_price")["date"]) == {LATER_END}
+    assert_latest_is_current(engine)
+
+
+def test_empty_table_is_rebuilt(make_db, run_in):
+    db_path = make_db("latest_empty")
+    run_ok(run_in, db_path)
+    engine = create_standin_engine(str(db_path))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM reit_latest_price")
+
+    # Nothing new to fetch, but the emptied table is filled again
+    result = run_ok(run_in, db_path)
+    assert "already up to date" in result.stdout
+    assert "Rebuilt reit_latest_price" in result.stdout
+    assert_latest_is_current(engine)
+    assert set(stored_prices(engine, "reit_latest_price")["date"]) == {FIRST_END}
+
+
+def test_full_reload_drops_unpriced_tickers(make_db, run_in):
+    db_path = make_db("latest_full")
+    run_ok(run_in, db_path)
+    engine = create_standin_engine(str(db_path))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO reit_latest_price VALUES ('GONE', '2001-01-02', 1.0, 1.0)")
+
+    result = run_ok(run_in, db_path, "--full")
+    assert "Rebuilt reit_latest_price" in result.stdout
+    assert "GONE" not in set(stored_prices(engine, "reit_latest_price")["ticker"])
+    assert_latest_is_current(engine)
@@ -0,0 +1,134 @@
+# test_local_mirror.py
+"""
+local_mirror.py: partitions match the database, the manifest decides which
+version readers see, and reads fall back to MySQL (None) whenever the mirror
+cannot answer.
+"""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import local_mirror
+from benchmarks.sqlite_standin import create_standin_engine
+from benchmarks.synthetic_universe import generate_universe, load_universe
+
+STATEMENT_COLUMNS = ["line_item", "fiscal_year", "fiscal_quarter", "value", "excel_row_index"]
+
+
+@pytest.fixture
+def mirrored(tmp_path, monkeypatch):
+    """(engine, tables, listed-but-unpriced ticker) with an empty mirror directory."""
+    tables = generate_universe(n_tickers=12, n_quarters=6, n_days=40, seed=3)
+    unpriced = sorted(tables["reit_business_data"]["Ticker"])[0]
+    prices = tables["reit_price_data"]
+    tables["reit_price_data"] = prices[prices["ticker"] != unpriced]
+    tables["reit_latest_price"] = tables["reit_latest_price"][tables["reit_latest_price"]["ticker"] != unpriced]
+
+    engine = create_standin_engine(str(tmp_path / "mirror.sqlite"), parse_dates=True)
+    load_universe(engine, tables)
+
+    monkeypatch.setattr(local_mirror, "MIRROR_DIR", str(tmp_path / "mirror"))
+    monkeypatch.setattr(local_mirror, "_manifest_cache", {"mtime": None, "data": None})
+    monkeypatch.setattr(local_mirror, "_table_cache", {})
+    # Small chunks, so tickers straddle chunk boundaries
+    monkeypatch.setattr(local_mirror, "MIRROR_CHUNK_ROWS", 37)
+    return engine, tables, unpriced
+
+
+def manifest():
+    with open(os.path.join(local_mirror.MIRROR_DIR, "manifest.json")) as f:
+        return json.load(f)
+
+
+def test_partitions_match_the_database(mirrored):
+    engine, tables, unpriced = mirrored
+    counts = local_mirror.sync_mirror(engine)
+    assert counts == {name: len(tables[name]) for name in local_mirror.MIRROR_TABLES}
+
+    prices = tables["reit_price_data"]
+    for ticker, expected in prices.groupby("ticker"):
+        actual = local_mirror.read_partition("reit_price_data", ticker.lower(), ["date", "close_price"])
+        assert list(actual["date"]) == list(expected["date"])
+        assert list(actual["close_price"]) == list(expected["close_price"])
+
+    balance = tables["reit_balance_sheet"]
+    ticker = balance["ticker"].iloc[0]
+    expected = balance[balance["ticker"] == ticker].sort_values(["excel_row_index", "fiscal_year", "fiscal_quarter"])
+    actual = local_mirror.read_partition("reit_balance_sheet", ticker, STATEMENT_COLUMNS)
+    pd.testing.assert_frame_equal(actual, expected[STATEMENT_COLUMNS].reset_index(drop=True), check_dtype=False)
+
+    whole = local_mirror.read_table("reit_price_data", ["close_price"]).to_pandas()
+    assert len(whole) == len(prices)
+    assert whole.groupby("ticker")["close_price"].sum().to_dict() == pytest.approx(
+        prices.groupby("ticker")["close_price"].sum().to_dict())
+
+
+def test_missing_partitions(mirrored):
+    engine, tables, unpriced = mirrored
+    local_mirror.sync_mirror(engine, ["reit_price_data"])
+    assert manifest()["tables"]["reit_price_data"]["empty_tickers"] == [unpriced]
+
+    # A listed ticker without prices is answered from the mirror
+    empty = local_mirror.read_partition("reit_price_data", unpriced, ["date", "close_price"])
+    assert empty.empty and list(empty.columns) == ["date", "close_price"]
+    # Tickers the sync did not see, bad tickers and unmirrored tables go to MySQL
+    assert local_mirror.read_partition("reit_price_data", "ZZZZ") is None
+    assert local_mirror.read_partition("reit_price_data", "../manifest") is None
+    assert local_mirror.read_partition("reit_balance_sheet", unpriced) is None
+    assert local_mirror.read_partition("reit_scoring_analysis", unpriced) is None
+
+
+def test_stale_and_old_format_mirrors_are_ignored(mirrored, monkeypatch):
+    engine, tables, _ = mirrored
+    ticker = tables["reit_price_data"]["ticker"].iloc[0]
+    assert local_mirror.read_partition("reit_price_data", ticker) is None  # no mirror yet
+
+    local_mirror.sync_mirror(engine, ["reit_price_data"])
+    assert local_mirror.read_partition("reit_price_data", ticker) is not None
+
+    max_age = local_mirror.MIRROR_MAX_AGE_SECONDS
+    monkeypatch.setattr(local_mirror, "MIRROR_MAX_AGE_SECONDS", -1)
+    assert local_mirror.read_partition("reit_price_data", ticker) is None
+    assert local_mirror.read_table("reit_price_data") is None
+    monkeypatch.setattr(local_mirror, "MIRROR_MAX_AGE_SECONDS", max_age)
+
+    old = manifest()
+    old["format"] = local_mirror.MIRROR_FORMAT - 1
+    with open(os.path.join(local_mirror.MIRROR_DIR, "manifest.json"), "w") as f:
+        json.dump(old, f)
+    os.utime(os.path.join(local_mirror.MIRROR_DIR, "manifest.json"), ns=(1, 1))
+    assert local_mirror.read_partition("reit_price_data", ticker) is None
+
+    # A sync starts the manifest over in the current format
+    local_mirror.sync_mirror(engine, ["reit_balance_sheet"])
+    assert manifest()["format"] == local_mirror.MIRROR_FORMAT
+    assert set(manifest()["tables"]) == {"reit_balance_sheet"}
+
+
+def test_resync_publishes_a_new_version(mirrored):
+    engine, tables, _ = mirrored
+    versions = []
+    for _ in range(3):
+        local_mirror.sync_mirror(engine, ["reit_price_data"])
+        versions.append(manifest()["tables"]["reit_price_data"]["version"])
+        assert local_mirror.fresh_version("reit_price_data") == versions[-1]
+    assert len(set(versions)) == 3
+    table_dir = os.path.join(local_mirror.MIRROR_DIR, "reit_price_data")
+    assert sorted(os.listdir(table_dir)) == versions[-local_mirror.MIRROR_KEEP_VERSIONS:]
+
+
+def test_price_endpoint_reads_the_mirror(api, api_tables, tmp_path, monkeypatch):
+    from app import app, db
+
+    ticker = api_tables["reit_price_data"]["ticker"].iloc[0]
+    from_mysql = api.get(f"/api/reits/{ticker}/price").get_json()
+
+    monkeypatch.setattr(local_mirror, "MIRROR_DIR", str(tmp_path / "api_mirror"))
+    monkeypatch.setattr(local_mirror, "_manifest_cache", {"mtime": None, "data": None})
+    with app.app_context():
+        engine = create_standin_engine(db.engine.url.database, parse_dates=True)
+    local_mirror.sync_mirror(engine, ["reit_price_data"])
+    assert local_mirror.read_partition("reit_price_data", ticker) is not None
+    assert api.get(f"/api/reits/{ticker}/price").get_json() == from_mysql
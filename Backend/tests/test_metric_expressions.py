@@ -0,0 +1,160 @@
+# test_metric_expressions.py
+"""
+The custom-metric expression language (metric_expressions.py) and its use
+through ?expr_<name>= on the advanced filter.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from metric_expressions import (
+    MAX_NESTING_DEPTH,
+    EvaluationContext,
+    ExpressionError,
+    build_statement_cube,
+    compile_expression,
+)
+
+
+def statement_rows(values):
+    """{(ticker, line_item): [q1 value, q2 value, ...]} from 2023Q1 -> long rows."""
+    rows = []
+    for (ticker, line_item), series in values.items():
+        for i, value in enumerate(series):
+            rows.append({
+                "ticker": ticker, "line_item": line_item,
+                "fiscal_year": 2023 + i // 4, "fiscal_quarter": i % 4 + 1, "value": value,
+            })
+    return pd.DataFrame(rows)
+
+
+def evaluate(source, values=None, price=None):
+    """Latest value of an expression for each ticker, as {ticker: value}."""
+    values = values or {("AAA", "X"): [1.0]}
+    cube = build_statement_cube(statement_rows(values))
+    if price is not None:
+        price = [price[t] for t in cube.tickers]
+    result = compile_expression(source).evaluate_latest(EvaluationContext(cube, price=price))
+    return dict(zip(cube.tickers, result))
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("1 + 2 * 3", 7),
+    ("(1 + 2) * 3", 9),
+    ("8 / 4 / 2", 1),
+    ("8 - 4 - 2", 2),
+    ("-2 * 3 + 10", 4),
+    ("-(2 + 3)", -5),
+    ("2 * -3", -6),
+    ("--4", 4),
+    ("+4 - +1", 3),
+    ("abs(1 - 3) * 2", 4),
+    (".5 + 1.5", 2),
+])
+def test_precedence(source, expected):
+    assert evaluate(source)["AAA"] == pytest.approx(expected)
+
+
+def test_division_by_zero_is_missing():
+    result = evaluate('latest("X") / latest("Y")', {
+        ("AAA", "X"): [5.0], ("AAA", "Y"): [0.0],
+        ("BBB", "X"): [5.0], ("BBB", "Y"): [2.0],
+    })
+    assert math.isnan(result["AAA"])
+    assert result["BBB"] == pytest.approx(2.5)
+    assert math.isnan(evaluate("1 / 0")["AAA"])
+
+
+def test_missing_values_propagate():
+    values = {("AAA", "X"): [1.0, 2.0, 3.0, np.nan], ("AAA", "Y"): [1.0, 1.0, 1.0, 1.0]}
+    # ttm needs all four quarters
+    assert math.isnan(evaluate('ttm("X")', values)["AAA"])
+    assert math.isnan(evaluate('ttm("X") + 1', values)["AAA"])
+    assert math.isnan(evaluate('abs(ttm("X")) * 0', values)["AAA"])
+    # latest carries the last reported value forward
+    assert evaluate('latest("X")', values)["AAA"] == 3
+    # A line item the ticker never reported, and no price
+    assert math.isnan(evaluate('latest("Z") + 1', values)["AAA"])
+    assert math.isnan(evaluate('price * 2', values)["AAA"])
+    assert math.isnan(evaluate('pos(-latest("X"))', values)["AAA"])
+
+
+def test_line_item_kernels():
+    ffo = [10.0, 11.0, 12.0, 13.0, 12.0, 13.2, 15.0, 14.3]
+    values = {("AAA", "FFO"): ffo}
+    series = pd.Series(ffo)
+    yoy = series / series.shift(4) - 1
+
+    assert evaluate('ttm("FFO")', values)["AAA"] == pytest.approx(series.tail(4).sum())
+    assert evaluate('yoy("FFO")', values)["AAA"] == pytest.approx(yoy.iloc[-1])
+    assert evaluate('avg_yoy("FFO")', values)["AAA"] == pytest.approx(yoy.tail(4).mean())
+    assert evaluate('price / ttm("FFO")', values, price={"AAA": 100.0})["AAA"] == pytest.approx(
+        100 / series.tail(4).sum()
+    )
+
+
+def test_kernels_are_per_ticker():
+    values = {("AAA", "X"): [1.0, 2.0, 3.0, 4.0], ("BBB", "X"): [10.0, 20.0, 30.0, 40.0, 50.0]}
+    result = evaluate('ttm("X")', values)
+    assert result == {"AAA": pytest.approx(10), "BBB": pytest.approx(140)}
+
+
+@pytest.mark.parametrize("source", [
+    "",
+    "1 +",
+    "(1",
+    "1 2",
+    "foo",
+    'ttm(X)',
+    'ttm("")',
+    "abs 1",
+    "1 $ 2",
+    "1" * 501,
+])
+def test_invalid_expressions(source):
+    with pytest.raises(ExpressionError):
+        compile_expression(source)
+
+
+def test_nesting_depth_is_limited():
+    compile_expression("(" * (MAX_NESTING_DEPTH - 1) + "1" + ")" * (MAX_NESTING_DEPTH - 1))
+    for source in [
+        "(" * 249 + "1" + ")" * 249,
+        "-" * 400 + "1",
+        "abs(" * 40 + "1" + ")" * 40,
+    ]:
+        with pytest.raises(ExpressionError, match="nested"):
+            compile_expression(source)
+    # Long flat expressions are fine
+    compile_expression("+".join(["1"] * 250))
+
+
+@pytest.mark.parametrize("query, status", [
+    ('expr_ffo_to_debt=ttm("FFO") / latest("Total Debt")', 200),
+    ("expr_deep=" + "(" * 249 + "1" + ")" * 249, 400),
+    ("expr_bad=ttm(", 400),
+    ("expr_Upper=1", 400),
+    ("expr_pe_ratio=1", 400),
+    ("expr_stability_percentile=1", 400),
+    ("expr_ticker=1", 400),
+    ("expr_website=1", 400),
+])
+def test_custom_metric_arguments(api, query, status):
+    response = api.get(f"/api/reits/advanced-filter?{query}")
+    assert response.status_code == status, response.get_data(as_text=True)
+    if status == 400:
+        assert response.get_json()["error"]
+
+
+def test_custom_metric_values(api):
+    response = api.get(
+        '/api/reits/advanced-filter?expr_debt_share=latest("Total Debt") / latest("Total Assets")'
+        "&fields=Ticker,debt_share,debt_to_asset_ratio"
+    )
+    assert response.status_code == 200, response.get_data(as_text=True)
+    reits = [reit for reit in response.get_json()["reits"] if reit["debt_to_asset_ratio"] is not None]
+    assert reits
+    for reit in reits:
+        assert reit["debt_share"] == pytest.approx(reit["debt_to_asset_ratio"])
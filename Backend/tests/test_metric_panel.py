@@ -0,0 +1,102 @@
+# test_metric_panel.py
+"""
+metric_panel.py: point-in-time rows only use statements filed by then.
+"""
+import math
+
+import pandas as pd
+import pytest
+
+from metric_panel import (
+    METRIC_PANEL_TABLE,
+    compute_metric_panel,
+    latest_filed_period,
+    load_quarter_end_closes,
+    load_statement_rows,
+    parse_as_of,
+)
+
+METRIC_CONFIG = [
+    {'metric_name': 'debt_to_asset_ratio', 'calculation_type': 'latest_ratio',
+     'line_items': ['Total Debt', 'Total Assets']},
+    {'metric_name': 'pe_ratio', 'calculation_type': 'price_to_ttm_value', 'line_items': ['Basic EPS']},
+]
+
+
+@pytest.mark.parametrize("as_of, lag_days, expected", [
+    ("2023Q2", 45, "2023Q1"),
+    ("2023Q1", 45, "2022Q4"),
+    ("2023Q2", 0, "2023Q2"),
+    ("2023Q2", 100, "2022Q4"),
+])
+def test_latest_filed_period(as_of, lag_days, expected):
+    assert latest_filed_period(parse_as_of(as_of), lag_days) == pd.Period(expected, freq="Q")
+
+
+def statements(ticker, quarters, debt, assets, eps):
+    rows = []
+    for (year, quarter), d, a, e in zip(quarters, debt, assets, eps):
+        for line_item, value in (("Total Debt", d), ("Total Assets", a), ("Basic EPS", e)):
+            rows.append({"ticker": ticker, "line_item": line_item,
+                         "fiscal_year": year, "fiscal_quarter": quarter, "value": value})
+    return rows
+
+
+def test_rows_use_statements_filed_by_quarter_end():
+    quarters = [(2023, 1), (2023, 2), (2023, 3), (2023, 4), (2024, 1)]
+    financials = pd.DataFrame(statements("AAA", quarters, [10, 20, 30, 40, 50], [100] * 5, [1, 1, 1, 1, 2]))
+    closes = pd.DataFrame({
+        "ticker": "AAA",
+        "fiscal_year": [2023, 2023, 2023, 2023, 2024, 2024],
+        "fiscal_quarter": [1, 2, 3, 4, 1, 2],
+        "close_price": [40.0, 41.0, 42.0, 43.0, 44.0, 45.0],
+    })
+
+    panel = compute_metric_panel(financials, closes, METRIC_CONFIG)
+    panel = panel.set_index(panel["fiscal_year"].astype(str) + "Q" + panel["fiscal_quarter"].astype(str))
+
+    # Nothing is filed by the end of 2023Q1, the first reported quarter
+    assert list(panel.index) == ["2023Q2", "2023Q3", "2023Q4", "2024Q1", "2024Q2"]
+    # Each row sees the previous quarter's statements and its own quarter-end close
+    assert list(panel["debt_to_asset_ratio"]) == pytest.approx([0.1, 0.2, 0.3, 0.4, 0.5])
+    assert list(panel["close_price"]) == [41.0, 42.0, 43.0, 44.0, 45.0]
+    # TTM EPS needs four filed quarters: 2023Q1-Q4 are filed by the end of 2024Q1
+    assert math.isnan(panel.loc["2023Q4", "pe_ratio"])
+    assert panel.loc["2024Q1", "pe_ratio"] == pytest.approx(44.0 / 4)
+    assert panel.loc["2024Q2", "pe_ratio"] == pytest.approx(45.0 / 5)
+
+
+def test_late_reporters_carry_their_last_filing_forward():
+    financials = pd.DataFrame(
+        statements("AAA", [(2023, 1), (2023, 2)], [10, 20], [100, 100], [1, 1])
+        + statements("BBB", [(2023, 1)], [70], [100], [1])
+    )
+    no_closes = pd.DataFrame(columns=["ticker", "fiscal_year", "fiscal_quarter", "close_price"])
+    panel = compute_metric_panel(financials, no_closes, METRIC_CONFIG)
+    ratios = panel.set_index(["ticker", "fiscal_quarter"])["debt_to_asset_ratio"]
+    # The cube ends at the last reported quarter, 2023Q2
+    assert ratios.to_dict() == pytest.approx({("AAA", 2): 0.1, ("BBB", 2): 0.7})
+
+
+def test_as_of_custom_metrics_match_the_panel(api):
+    from app import METRIC_CONFIG as APP_METRIC_CONFIG, db
+
+    line_items = sorted({item for conf in APP_METRIC_CONFIG for item in conf['line_items']})
+    with api.application.app_context(), db.engine.begin() as conn:
+        panel = compute_metric_panel(
+            load_statement_rows(conn, line_items), load_quarter_end_closes(conn), APP_METRIC_CONFIG
+        )
+        panel.to_sql(METRIC_PANEL_TABLE, conn, if_exists="replace", index=False)
+
+    year, quarter = panel[["fiscal_year", "fiscal_quarter"]].drop_duplicates().sort_values(
+        ["fiscal_year", "fiscal_quarter"]).iloc[-3]
+    response = api.get(
+        f'/api/reits/advanced-filter?as_of={year}Q{quarter}'
+        '&expr_debt_share=latest("Total Debt") / latest("Total Assets")'
+        "&fields=Ticker,debt_share,debt_to_asset_ratio"
+    )
+    assert response.status_code == 200, response.get_data(as_text=True)
+    reits = [reit for reit in response.get_json()["reits"] if reit["debt_to_asset_ratio"] is not None]
+    assert reits
+    for reit in reits:
+        assert reit["debt_share"] == pytest.approx(reit["debt_to_asset_ratio"])
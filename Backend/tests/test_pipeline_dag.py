@@ -0,0 +1,54 @@
+# test_pipeline_dag.py
+"""
+"Python Run/pipeline_dag.py" on the synthetic universe: only stale nodes
+run, and a node's fingerprint is only recorded once its outputs are saved.
+"""
+import multiprocessing
+
+import pandas as pd
+
+import pipeline_dag
+import sharding
+from benchmarks.sqlite_standin import create_standin_engine
+from conftest import N_TICKERS
+
+
+def stored_nodes(engine):
+    return set(pd.read_sql("SELECT node FROM pipeline_stage_state", engine)["node"])
+
+
+def test_failed_stage_reruns_alone_once_fixed(make_db, run_in):
+    db_path = make_db("dag")
+    engine = create_standin_engine(str(db_path))
+    ffo_payout = pd.read_sql("SELECT * FROM reit_ffo_payout", engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE reit_ffo_payout")
+
+    # Stage 3 fails: stages 1 and 2 are recorded (their scores are saved), 3 is not
+    result = run_in(db_path, "pipeline_dag.py")
+    assert result.returncode == 1, result.stdout + result.stderr
+    assert "not completed: 3" in result.stdout
+    assert stored_nodes(engine) == {"1", "2"}
+    assert pd.read_sql("SELECT * FROM reit_scoring_analysis", engine)["Stability Percentile"].notna().sum() == N_TICKERS
+
+    # Once its input is back, only stage 3 is stale
+    ffo_payout.to_sql("reit_ffo_payout", engine, index=False)
+    result = run_in(db_path, "pipeline_dag.py")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "prices: 3\n" in result.stdout
+    assert stored_nodes(engine) == {"1", "2", "3"}
+    assert pd.read_sql("SELECT * FROM reit_scoring_analysis", engine)["Fundamental_Percentile"].notna().sum() == N_TICKERS
+
+    result = run_in(db_path, "pipeline_dag.py")
+    assert result.returncode == 0
+    assert "All stages are up to date" in result.stdout
+
+
+def test_chains_run_serially_with_a_warning_without_fork(monkeypatch, capsys):
+    monkeypatch.setattr(multiprocessing, "get_all_start_methods", lambda: ["spawn"])
+    monkeypatch.setattr(sharding, "_warned_no_fork", False)
+    monkeypatch.setattr(pipeline_dag, "run_chain", lambda chain, options: [chain[1]])
+
+    chains = [("costar", "BXP", []), ("costar", "O", [])]
+    assert pipeline_dag.run_chains(chains, {}, jobs=4) == [["BXP"], ["O"]]
+    assert "--jobs 4 is ignored" in capsys.readouterr().out
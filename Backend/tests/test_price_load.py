@@ -0,0 +1,109 @@
+# test_price_load.py
+"""
+"Python Run/1. Stock universe - initial set up.py" against the FMP stub:
+incremental runs fetch only the bars after each ticker's last stored date,
+and prices are written in bounded batches with each ticker fetched once.
+"""
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from benchmarks.fmp_stub import start_fmp_stub, synthetic_history
+from benchmarks.sqlite_standin import create_standin_engine
+
+SCRIPT = "1. Stock universe - initial set up.py"
+FIRST_END, LATER_END = "2025-06-10", "2025-06-20"
+
+
+def run_ok(run_in, db_path, *args, **env):
+    result = run_in(db_path, SCRIPT, *args, **env)
+    assert result.returncode == 0 and "❌" not in result.stdout, result.stdout + result.stderr
+    return result
+
+
+def stored_prices(engine, table="reit_price_data"):
+    return pd.read_sql(f"SELECT date, ticker, close_price, volume FROM {table} ORDER BY ticker, date", engine)
+
+
+def stub_prices(tickers, end_dates):
+    """Bars the stub serves for tickers, over the union of the given end dates."""
+    frames = [synthetic_history(t, 300, end).assign(ticker=t) for t in tickers for end in end_dates]
+    prices = pd.concat(frames).drop_duplicates(subset=["date", "ticker"])
+    prices = prices.rename(columns={"close": "close_price"})[["date", "ticker", "close_price", "volume"]]
+    return prices.sort_values(["ticker", "date"], ignore_index=True)
+
+
+@pytest.fixture
+def later_stub():
+    server = start_fmp_stub(n_days=300, end_date=LATER_END)
+    yield server
+    server.shutdown()
+
+
+def requested_from(server):
+    """{ticker: from= date or None} of the stub's price requests."""
+    requests = {}
+    for path in server.request_paths:
+        url = urlparse(path)
+        requests[url.path.rsplit("/", 1)[1]] = parse_qs(url.query).get("from", [None])[0]
+    return requests
+
+
+def test_incremental_run_fetches_only_new_bars(make_db, run_in, later_stub):
+    db_path = make_db("incremental")
+    run_ok(run_in, db_path)
+    engine = create_standin_engine(str(db_path))
+    first = stored_prices(engine)
+    tickers = sorted(first["ticker"].unique())
+    pd.testing.assert_frame_equal(first, stub_prices(tickers, [FIRST_END]), check_dtype=False, rtol=1e-6)
+
+    # One ticker lost its last week, another all of its rows
+    partial, missing = tickers[0], tickers[1]
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DELETE FROM reit_price_data WHERE ticker = '{partial}' AND date > '2025-06-03'")
+        conn.exec_driver_sql(f"DELETE FROM reit_price_data WHERE ticker = '{missing}'")
+
+    result = run_ok(run_in, db_path, FMP_BASE_URL=later_stub.url)
+    assert f"Incremental load: {len(tickers) - 1} tickers" in result.stdout
+
+    froms = requested_from(later_stub)
+    assert froms[missing] is None
+    assert froms[partial] == "2025-06-04"
+    assert {froms[t] for t in tickers if t not in (partial, missing)} == {"2025-06-11"}
+
+    # Old bars are kept, new ones appended, the emptied ticker refetched in full
+    expected = pd.concat([
+        stub_prices([t for t in tickers if t != missing], [FIRST_END, LATER_END]),
+        stub_prices([missing], [LATER_END]),
+    ]).sort_values(["ticker", "date"], ignore_index=True)
+    pd.testing.assert_frame_equal(stored_prices(engine), expected, check_dtype=False, rtol=1e-6)
+    latest = stored_prices(engine, "reit_latest_price")
+    assert list(latest["ticker"]) == tickers
+    assert set(latest["date"]) == {LATER_END}
+
+    # Up to date: every request starts after the last bar and nothing is written
+    result = run_ok(run_in, db_path, FMP_BASE_URL=later_stub.url)
+    assert "already up to date" in result.stdout
+    assert len(stored_prices(engine)) == len(expected)
+
+
+def test_small_write_batches_and_duplicate_tickers(make_db, run_in, universe, fmp_stub, tmp_path):
+    # Every ticker listed twice; 300 bars per ticker, so a batch is written
+    # after every third ticker
+    reit_list = pd.read_csv(universe[0])
+    duplicated = tmp_path / "duplicated_list.csv"
+    pd.concat([reit_list, reit_list]).to_csv(duplicated, index=False)
+    tickers = sorted(reit_list["Ticker"])
+
+    for args in ([], ["--full"]):
+        db_path = make_db("batched" + "".join(args))
+        requests_before = len(fmp_stub.request_paths)
+        result = run_ok(run_in, db_path, *args, REIT_LIST_PATH=str(duplicated), PRICE_WRITE_BATCH_ROWS="700")
+        assert result.stdout.count("price rows written") == len(tickers) // 3
+
+        requested = [urlparse(path).path.rsplit("/", 1)[1] for path in fmp_stub.request_paths[requests_before:]]
+        assert sorted(requested) == tickers
+        engine = create_standin_engine(str(db_path))
+        pd.testing.assert_frame_equal(
+            stored_prices(engine), stub_prices(tickers, [FIRST_END]), check_dtype=False, rtol=1e-6)
@@ -0,0 +1,93 @@
+# test_request_profiler.py
+"""
+request_profiler.py: sample categories, header exposure and the profile cap.
+"""
+import glob
+import os
+import time
+
+import pytest
+from flask import Flask
+
+from request_profiler import _categorize, init_request_profiler
+
+
+@pytest.mark.parametrize("filename, category", [
+    ("/usr/lib/python3.11/site-packages/sqlalchemy/engine/base.py", "sql"),
+    ("C:\\Python311\\Lib\\site-packages\\sqlalchemy\\engine\\base.py", "sql"),
+    ("C:\\Python311\\Lib\\site-packages\\PyMySQL\\connections.py", "sql"),
+    ("C:\\Python311\\Lib\\site-packages\\pandas\\core\\frame.py", "pandas"),
+    ("C:\\Python311\\Lib\\json\\encoder.py", "serialization"),
+    ("/srv/Backend/app.py", None),
+    ("C:\\Users\\me\\Backend\\app.py", None),
+])
+def test_categorize(filename, category):
+    assert _categorize(filename) == category
+
+
+def make_app(monkeypatch, tmp_path, **env):
+    for name in ("PROFILE_ADMIN_TOKEN", "PROFILE_SAMPLE_RATE", "PROFILE_EXPOSE_HEADERS", "PROFILE_MAX_PROFILES"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("PROFILE_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setenv("PROFILE_INTERVAL_MS", "1")
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+
+    app = Flask(__name__)
+
+    @app.route("/api/reits/<ticker>")
+    def reit(ticker):
+        time.sleep(0.01)
+        return {"ticker": ticker}
+
+    assert init_request_profiler(app)
+    return app.test_client()
+
+
+def profile_ids(tmp_path):
+    return sorted(os.path.basename(p)[:-len(".json")] for p in glob.glob(str(tmp_path / "*" / "*.json")))
+
+
+def test_disabled_without_configuration(monkeypatch):
+    monkeypatch.delenv("PROFILE_ADMIN_TOKEN", raising=False)
+    monkeypatch.delenv("PROFILE_SAMPLE_RATE", raising=False)
+    assert not init_request_profiler(Flask(__name__))
+
+
+def test_sampled_requests_do_not_expose_headers(monkeypatch, tmp_path):
+    client = make_app(monkeypatch, tmp_path, PROFILE_SAMPLE_RATE="1")
+    response = client.get("/api/reits/AAA")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    assert "X-Profile-Id" not in response.headers
+    # The profile is still written
+    assert len(profile_ids(tmp_path)) == 1
+
+
+def test_sampled_requests_expose_headers_when_enabled(monkeypatch, tmp_path):
+    client = make_app(monkeypatch, tmp_path, PROFILE_SAMPLE_RATE="1", PROFILE_EXPOSE_HEADERS="1")
+    response = client.get("/api/reits/AAA")
+    assert "total;dur=" in response.headers["Server-Timing"]
+    assert profile_ids(tmp_path) == [response.headers["X-Profile-Id"]]
+
+
+def test_admin_requests_expose_headers(monkeypatch, tmp_path):
+    client = make_app(monkeypatch, tmp_path, PROFILE_ADMIN_TOKEN="secret")
+    assert "X-Profile-Id" not in client.get("/api/reits/AAA").headers
+    assert "X-Profile-Id" not in client.get("/api/reits/AAA", headers={"X-Profile": "wrong"}).headers
+
+    response = client.get("/api/reits/AAA", headers={"X-Profile": "secret"})
+    assert profile_ids(tmp_path) == [response.headers["X-Profile-Id"]]
+    folded = glob.glob(str(tmp_path / "*" / "*.folded"))
+    assert len(folded) == 1 and os.path.getsize(folded[0]) > 0
+
+
+def test_profiles_are_capped(monkeypatch, tmp_path):
+    client = make_app(monkeypatch, tmp_path, PROFILE_ADMIN_TOKEN="secret", PROFILE_MAX_PROFILES="3")
+    ids = []
+    for _ in range(5):
+        ids.append(client.get("/api/reits/AAA", headers={"X-Profile": "secret"}).headers["X-Profile-Id"])
+        # Distinct modification times
+        time.sleep(0.02)
+    assert profile_ids(tmp_path) == sorted(ids[-3:])
+    assert len(glob.glob(str(tmp_path / "*" / "*.folded"))) == 3
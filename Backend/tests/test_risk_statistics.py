@@ -0,0 +1,112 @@
+# test_risk_statistics.py
+"""
+"Python Run/2. Stock data analysis - risk.py": statistics from chunked power
+sums match pandas mean / std / skew / kurt on the same returns, and the
+incremental sums and rolling history equal a full recompute.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.sqlite_standin import create_standin_engine
+from benchmarks.synthetic_universe import generate_universe, load_universe
+
+RISK_SCRIPT = "2. Stock data analysis - risk.py"
+
+
+def pandas_moments(returns):
+    returns = pd.Series(returns, dtype="float64").dropna()
+    return returns.mean(), returns.std(), returns.skew(), returns.kurt()
+
+
+@pytest.fixture
+def risk(tmp_path, load_script):
+    return load_script(RISK_SCRIPT, tmp_path / "risk.sqlite")
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 4, 5, 8, 500])
+def test_return_moments_match_pandas(risk, n):
+    rng = np.random.default_rng(n)
+    for returns in (rng.normal(0.001, 0.02, size=n), np.full(n, 0.01), rng.standard_t(3, size=n) * 0.01):
+        sums = [len(returns)] + [np.sum(returns ** k) for k in range(1, 5)]
+        actual = risk.return_moments(*sums)
+        expected = pandas_moments(returns)
+        np.testing.assert_allclose(np.array(actual, dtype=float), np.array(expected, dtype=float),
+                                   rtol=1e-6, atol=1e-12, equal_nan=True)
+
+
+def test_return_moments_broadcast(risk):
+    rng = np.random.default_rng(0)
+    returns = rng.normal(size=(50, 3))
+    n = np.full(3, 50)
+    mean, std, skew, kurt = risk.return_moments(n, *(np.sum(returns ** k, axis=0) for k in range(1, 5)))
+    frame = pd.DataFrame(returns)
+    np.testing.assert_allclose(skew, frame.skew(), rtol=1e-9)
+    np.testing.assert_allclose(kurt, frame.kurt(), rtol=1e-9)
+
+
+def test_chunked_sums_match_pandas(risk, tmp_path):
+    prices = generate_universe(n_tickers=9, n_quarters=1, n_days=120, seed=5)["reit_price_data"]
+    prices.loc[prices.sample(frac=0.05, random_state=0).index, "volume"] = np.nan
+    load_universe(create_standin_engine(str(tmp_path / "risk.sqlite")), {"reit_price_data": prices})
+
+    # Chunks far smaller than a ticker's history, so tickers span several
+    risk.PRICE_CHUNK_ROWS = 37
+    stability = risk.calculate_stability(risk.load_ticker_sums()).set_index("Ticker")
+
+    # The script reads the FLOAT columns as float32
+    closes = prices.assign(close_price=prices["close_price"].astype("float32").astype("float64"))
+    for ticker, group in closes.groupby("ticker"):
+        returns = group.sort_values("date")["close_price"].pct_change()
+        row = stability.loc[ticker]
+        mean, std, skew, kurt = pandas_moments(returns)
+        assert row["Average Daily Return"] == pytest.approx(mean, rel=1e-6)
+        assert row["Average Annual Return"] == pytest.approx(mean * 252, rel=1e-6)
+        assert row["Standard Deviation"] == pytest.approx(std, rel=1e-6)
+        assert row["Skewness"] == pytest.approx(skew, rel=1e-5, abs=1e-9)
+        assert row["Kurtosis"] == pytest.approx(kurt, rel=1e-5, abs=1e-9)
+        volume = group["volume"].astype("float32").astype("float64")
+        assert row["Average Volume"] == pytest.approx(volume.mean(), rel=1e-6)
+        assert row["Average Dollar Volume"] == pytest.approx(group["close_price"].mean() * volume.mean(), rel=1e-6)
+        assert row["Data Length"] == len(group)
+
+
+def test_incremental_updates_equal_a_full_recompute(risk, tmp_path):
+    engine = create_standin_engine(str(tmp_path / "risk.sqlite"))
+    prices = generate_universe(n_tickers=8, n_quarters=1, n_days=160, seed=6)["reit_price_data"]
+    dates = sorted(prices["date"].unique())
+    late_ticker = sorted(prices["ticker"].unique())[0]
+    day_one = prices[(prices["date"] <= dates[119]) & (prices["ticker"] != late_ticker)]
+    load_universe(engine, {"reit_price_data": day_one})
+
+    risk.PRICE_CHUNK_ROWS = 53
+    risk.RISK_HORIZONS = {"1M": 21, "3M": 63}
+
+    def stored(table, order):
+        return pd.read_sql(f"SELECT * FROM {table} ORDER BY {order}", engine)
+
+    # First run builds the store and the history from scratch
+    risk.update_ticker_sums()
+    risk.update_risk_history()
+
+    # Later days for every ticker, and a ticker that was not priced before
+    with engine.begin() as conn:
+        prices[prices["date"] > dates[119]].to_sql("reit_price_data", conn, if_exists="append", index=False)
+        prices[(prices["ticker"] == late_ticker) & (prices["date"] <= dates[119])].to_sql(
+            "reit_price_data", conn, if_exists="append", index=False)
+    incremental = risk.update_ticker_sums()
+    risk.update_risk_history()
+    incremental_store = stored("reit_risk_sums", "ticker")
+    incremental_history = stored("reit_risk_history", "ticker, horizon, date")
+
+    full = risk.update_ticker_sums(rebuild_sums=True)
+    risk.update_risk_history(rebuild_history=True)
+
+    assert late_ticker in incremental.index
+    pd.testing.assert_frame_equal(
+        risk.calculate_stability(incremental), risk.calculate_stability(full), rtol=1e-9)
+    pd.testing.assert_frame_equal(incremental_store, stored("reit_risk_sums", "ticker"), rtol=1e-9)
+    pd.testing.assert_frame_equal(
+        incremental_history, stored("reit_risk_history", "ticker, horizon, date"), rtol=1e-9)
+    assert set(incremental_history["horizon"]) == {"1M", "3M"}
+    assert incremental_history["date"].max() == str(dates[-1])
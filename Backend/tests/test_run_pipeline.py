@@ -0,0 +1,61 @@
+# test_run_pipeline.py
+"""
+End-to-end run of "Python Run/run_pipeline.py" stages 1-3 on the synthetic
+universe, checked against running the three scripts one after another.
+
+Run from Backend/:
+    python -m pytest tests
+"""
+import pandas as pd
+
+from benchmarks.sqlite_standin import create_standin_engine
+from conftest import N_TICKERS
+
+SCRIPTS = [
+    "1. Stock universe - initial set up.py",
+    "2. Stock data analysis - risk.py",
+    "3. Stock data analysis - operation.py",
+]
+COMPARED_TABLES = {
+    "reit_business_data": "Ticker",
+    "reit_latest_price": "ticker",
+    "reit_scoring_analysis": "Ticker",
+    "reit_risk_history": "ticker, horizon, date",
+}
+
+
+def test_stages_1_to_3_match_the_scripts(make_db, run_in):
+    scripts_db, pipeline_db = make_db("scripts"), make_db("pipeline")
+
+    for script in SCRIPTS:
+        result = run_in(scripts_db, script)
+        assert result.returncode == 0 and "❌" not in result.stdout, result.stdout + result.stderr
+    result = run_in(pipeline_db, "run_pipeline.py", "--stages", "1,2,3")
+    assert result.returncode == 0 and "❌" not in result.stdout, result.stdout + result.stderr
+
+    scripts_engine, pipeline_engine = create_standin_engine(str(scripts_db)), create_standin_engine(str(pipeline_db))
+    for table, order in COMPARED_TABLES.items():
+        expected = pd.read_sql(f"SELECT * FROM {table} ORDER BY {order}", scripts_engine)
+        actual = pd.read_sql(f"SELECT * FROM {table} ORDER BY {order}", pipeline_engine)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=1e-9)
+
+    scores = pd.read_sql("SELECT * FROM reit_scoring_analysis", pipeline_engine)
+    assert len(scores) == N_TICKERS
+    assert scores["Stability Percentile"].notna().all()
+    assert scores["5YR_FFO_Growth_Z"].notna().all()
+    assert scores["FFO_Yield"].notna().all()
+
+
+def test_stage_3_failure_keeps_stage_2_scores(make_db, run_in):
+    db_path = make_db("failing")
+    engine = create_standin_engine(str(db_path))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE reit_ffo_payout")
+
+    result = run_in(db_path, "run_pipeline.py", "--stages", "1,2,3")
+    assert result.returncode == 1
+    assert "Pipeline stopped in stage 3" in result.stdout
+
+    scores = pd.read_sql("SELECT * FROM reit_scoring_analysis", engine)
+    assert len(scores) == N_TICKERS
+    assert scores["Stability Percentile"].notna().all()
@@ -0,0 +1,172 @@
+# test_screener.py
+"""
+screener.py: keyset pagination agrees with a full sort, and facet
+histograms agree with np.histogram.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from screener import (
+    compute_facets,
+    decode_cursor,
+    encode_cursor,
+    parse_facet_args,
+    parse_page_args,
+    select_page,
+)
+
+
+@pytest.fixture
+def frame():
+    """Shuffled rows with tied and missing sort keys."""
+    rng = np.random.default_rng(0)
+    n = 200
+    score = rng.integers(0, 20, size=n).astype(float)
+    score[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame({
+        "Ticker": [f"T{i:03d}" for i in rng.permutation(n)],
+        "score": score,
+    })
+
+
+def full_sort(df, column, descending):
+    """(key, ticker) order with missing keys last, the order select_page pages through."""
+    key = -df[column] if descending else df[column]
+    return list(df.assign(_key=key.fillna(np.inf)).sort_values(["_key", "Ticker"])["Ticker"])
+
+
+def all_pages(df, limit, **kwargs):
+    """Tickers of every page, following each page's cursor as a client would."""
+    tickers, cursor = [], None
+    for _ in range(len(df) + 1):
+        page, token = select_page(df, limit=limit, cursor=cursor, **kwargs)
+        assert len(page) <= limit
+        tickers += list(page["Ticker"])
+        if token is None:
+            return tickers
+        cursor = decode_cursor(token)
+    raise AssertionError("pagination did not terminate")
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 7, 50, 500])
+def test_pages_concatenate_to_the_full_sort(frame, descending, limit):
+    assert all_pages(frame, limit, sort_col="score", descending=descending) == full_sort(frame, "score", descending)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_by_ticker(frame, descending):
+    expected = sorted(frame["Ticker"], reverse=descending)
+    assert all_pages(frame, 9, sort_col="Ticker", descending=descending) == expected
+
+
+def test_without_limit_returns_everything_sorted(frame):
+    page, cursor = select_page(frame, "score")
+    assert cursor is None
+    assert list(page["Ticker"]) == full_sort(frame, "score", False)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(1.5, "ABC")) == (1.5, "ABC")
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_parse_page_args():
+    sortable = {"score": "score"}
+    assert parse_page_args({}, sortable) is None
+    assert parse_page_args({"limit": "5"}, sortable) == {
+        "sort_col": "Ticker", "descending": False, "limit": 5, "cursor": None,
+    }
+    args = parse_page_args({"sort": "score", "order": "DESC", "cursor": encode_cursor(3, "X")}, sortable)
+    assert args == {"sort_col": "score", "descending": True, "limit": None, "cursor": (3.0, "X")}
+
+
+@pytest.mark.parametrize("args", [
+    {"sort": "unknown"},
+    {"sort": "score", "order": "sideways"},
+    {"limit": "ten"},
+    {"limit": "0"},
+    {"limit": "501"},
+    {"cursor": "%%%"},
+])
+def test_parse_page_args_rejects(args):
+    with pytest.raises(ValueError):
+        parse_page_args(args, {"score": "score"})
+
+
+def test_reit_list_pages(api, api_tables):
+    scores = api_tables["reit_scoring_analysis"].set_index("Ticker")["Stability Percentile"]
+    tickers, cursor = [], None
+    while True:
+        query = "sort=stability_percentile&order=desc&limit=8" + (f"&cursor={cursor}" if cursor else "")
+        body = api.get(f"/api/reits?{query}").get_json()
+        tickers += [reit["Ticker"] for reit in body["reits"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert tickers == list(scores.loc[tickers].sort_values(ascending=False).index)
+    assert sorted(tickers) == sorted(api_tables["reit_business_data"]["Ticker"])
+
+
+def test_fixed_facets_match_np_histogram():
+    rng = np.random.default_rng(1)
+    frame = pd.DataFrame({
+        "a": rng.normal(size=300),
+        "b": np.where(rng.random(300) < 0.2, np.nan, rng.lognormal(size=300)),
+        "c": [np.inf] + [np.nan] * 299,
+        "kind": rng.choice(["Office", "Retail", None], size=300),
+    })
+    facets = compute_facets(frame, ["a", "b", "c"], ["kind"], bins=12)
+
+    for column in ("a", "b"):
+        values = frame[column].dropna().to_numpy()
+        counts, edges = np.histogram(values, bins=12)
+        facet = facets[column]
+        assert facet["count"] == len(values)
+        assert facet["missing"] == len(frame) - len(values)
+        assert (facet["min"], facet["max"]) == (values.min(), values.max())
+        assert [b["count"] for b in facet["bins"]] == list(counts)
+        assert [b["lower"] for b in facet["bins"]] == pytest.approx(list(edges[:-1]))
+        assert facet["bins"][-1]["upper"] == pytest.approx(edges[-1])
+
+    # Infinite values count as missing
+    assert facets["c"] == {"count": 0, "missing": 300, "min": None, "max": None, "bins": []}
+    kinds = frame["kind"].value_counts()
+    assert facets["kind"] == {
+        "count": int(kinds.sum()), "missing": int(frame["kind"].isna().sum()),
+        "values": kinds.to_dict(),
+    }
+
+
+def test_quantile_facets_have_even_counts():
+    frame = pd.DataFrame({"a": np.arange(100.0)})
+    facet = compute_facets(frame, ["a"], bins=4, mode="quantile")["a"]
+    assert [b["count"] for b in facet["bins"]] == [25, 25, 25, 25]
+    assert facet["bins"][0]["lower"] == 0 and facet["bins"][-1]["upper"] == 99
+
+
+def test_facets_of_an_empty_frame():
+    facets = compute_facets(pd.DataFrame({"a": [], "kind": []}), ["a"], ["kind"])
+    assert facets["a"]["count"] == 0 and facets["a"]["bins"] == []
+    assert facets["kind"] == {"count": 0, "missing": 0, "values": {}}
+
+
+def test_parse_facet_args():
+    assert parse_facet_args({}) is None
+    assert parse_facet_args({"facets": "true"}) == {"bins": 10, "mode": "fixed"}
+    assert parse_facet_args({"facets": "TRUE", "facet_bins": "20", "facet_mode": "quantile"}) == {
+        "bins": 20, "mode": "quantile",
+    }
+    for args in ({"facet_mode": "log"}, {"facet_bins": "x"}, {"facet_bins": "0"}, {"facet_bins": "51"}):
+        with pytest.raises(ValueError):
+            parse_facet_args({"facets": "true", **args})
+
+
+def test_facets_describe_the_filtered_rows(api):
+    body = api.get("/api/reits/advanced-filter?facets=true&facet_bins=5&max_debt_to_asset=0.5").get_json()
+    assert body["reits"] and body["total_count"] == len(body["reits"])
+    facet = body["facets"]["debt_to_asset_ratio"]
+    assert facet["count"] == sum(b["count"] for b in facet["bins"]) == body["total_count"]
+    assert facet["max"] <= 0.5
@@ -0,0 +1,55 @@
+# test_sharding.py
+"""
+"Python Run/sharding.py": ticker shards and the process pool fallback.
+"""
+import multiprocessing
+
+import pytest
+from sqlalchemy import create_engine
+
+import sharding
+
+
+def shard_lengths(shard):
+    return {ticker: len(ticker) for ticker in shard}
+
+
+def test_shard_tickers_round_robin():
+    shards = sharding.shard_tickers(["E", "A", "D", "C", "B"], 2)
+    assert shards == [["A", "C", "E"], ["B", "D"]]
+    assert sharding.shard_tickers(["A"], 4) == [["A"]]
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_run_sharded_matches_serial():
+    tickers = [f"T{i}" for i in range(25)]
+    engine = create_engine("sqlite://")
+    parallel = sharding.run_sharded(shard_lengths, tickers, 4, engine)
+    serial = sharding.run_sharded(shard_lengths, tickers, 1, engine)
+    assert len(parallel) == 4
+    assert parallel == [shard_lengths(shard) for shard in sharding.shard_tickers(tickers, 4)]
+    assert {k: v for shard in parallel for k, v in shard.items()} == serial[0]
+
+
+def test_run_sharded_warns_without_fork(monkeypatch, capsys):
+    monkeypatch.setattr(multiprocessing, "get_all_start_methods", lambda: ["spawn"])
+    monkeypatch.setattr(sharding, "_warned_no_fork", False)
+    tickers = ["A", "BB", "CCC"]
+
+    results = sharding.run_sharded(shard_lengths, tickers, 2, create_engine("sqlite://"))
+    sharding.run_sharded(shard_lengths, tickers, 2, create_engine("sqlite://"))
+
+    assert results == [{"A": 1, "CCC": 3}, {"BB": 2}]
+    out = capsys.readouterr().out
+    assert out.count("⚠️") == 1
+    assert "--workers 2 is ignored" in out
+
+
+def test_scoring_workers(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["script.py"])
+    monkeypatch.delenv("SCORING_WORKERS", raising=False)
+    assert sharding.scoring_workers() == 1
+    monkeypatch.setenv("SCORING_WORKERS", "3")
+    assert sharding.scoring_workers() == 3
+    monkeypatch.setattr("sys.argv", ["script.py", "--workers", "5"])
+    assert sharding.scoring_workers() == 5
@@ -0,0 +1,111 @@
+# test_stripe_webhook.py
+"""
+/api/stripe-webhook and worker.upgrade_user_plan_task with Celery in eager
+mode, a fake Redis and a fake Firestore: each Stripe event upgrades the user
+once, and a failed upgrade is processed again on Stripe's retry.
+"""
+import pytest
+
+EVENT_ID = "evt_test_1"
+EMAIL = "user@example.com"
+
+
+class FakeFirestore:
+    """users collection with one user; update() fails while `failing` is set."""
+
+    def __init__(self):
+        self.plans = {EMAIL: "free"}
+        self.failing = False
+        self.updates = 0
+
+    def collection(self, name):
+        assert name == "users"
+        return self
+
+    def where(self, field, op, value):
+        self.email = value
+        return self
+
+    def limit(self, n):
+        return self
+
+    def stream(self):
+        if self.email in self.plans:
+            yield FakeUserDoc(self, self.email)
+
+
+class FakeUserDoc:
+    def __init__(self, store, email):
+        self.store = store
+        self.email = email
+        self.reference = self
+
+    def update(self, fields):
+        if self.store.failing:
+            raise ConnectionError("Firestore unavailable")
+        self.store.updates += 1
+        self.store.plans[self.email] = fields["plan"]
+
+
+@pytest.fixture
+def firestore(api, fake_redis, monkeypatch):
+    import stripe
+
+    import worker
+
+    store = FakeFirestore()
+    monkeypatch.setattr(worker, "get_firestore_client", lambda: store)
+    monkeypatch.setattr(stripe.Webhook, "construct_event", lambda payload, sig, secret: {
+        "id": EVENT_ID,
+        "type": "checkout.session.completed",
+        "data": {"object": {"client_reference_id": EMAIL}},
+    })
+    monkeypatch.setattr(worker.celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(worker.celery_app.conf, "task_eager_propagates", False)
+    # REDIS_URL is unset here; results stay in memory
+    monkeypatch.setattr(worker.celery_app.conf, "result_backend", "cache+memory://")
+    # No backoff sleeps between the eager retries
+    monkeypatch.setattr(worker.upgrade_user_plan_task, "retry_backoff", False)
+    monkeypatch.setattr(worker.upgrade_user_plan_task, "default_retry_delay", 0)
+    return store
+
+
+def deliver(api):
+    response = api.post("/api/stripe-webhook", data=b"{}", headers={"Stripe-Signature": "t=1,v1=test"})
+    return response.status_code, response.get_data(as_text=True)
+
+
+def test_duplicate_events_are_acknowledged_and_skipped(api, firestore):
+    assert deliver(api) == (200, "Success")
+    assert deliver(api) == (200, "Already processed")
+    assert firestore.updates == 1
+    assert firestore.plans[EMAIL] == "premium"
+
+
+def test_claims_expire_after_seven_days(api, firestore, fake_redis):
+    deliver(api)
+    assert fake_redis.ttl(f"stripe_event:{EVENT_ID}") == 7 * 24 * 3600
+
+
+def test_failed_upgrade_is_processed_on_stripes_retry(api, firestore, fake_redis):
+    firestore.failing = True
+    assert deliver(api) == (200, "Success")
+    assert firestore.plans[EMAIL] == "free"
+    # Every retry failed, so the claim was released
+    assert f"stripe_event:{EVENT_ID}" not in fake_redis.values
+
+    firestore.failing = False
+    assert deliver(api) == (200, "Success")
+    assert firestore.plans[EMAIL] == "premium"
+    assert deliver(api) == (200, "Already processed")
+
+
+def test_enqueue_failure_releases_the_claim(api, firestore, fake_redis, monkeypatch):
+    import worker
+
+    def broker_down(*args, **kwargs):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(worker.upgrade_user_plan_task, "delay", broker_down)
+    assert deliver(api)[0] == 500
+    assert f"stripe_event:{EVENT_ID}" not in fake_redis.values
@@ -1,8 +1,12 @@
 # worker.py
 import os
+import json
 import requests
+import redis
 from celery import Celery
 from sqlalchemy import create_engine, text
+import firebase_admin
+from firebase_admin import credentials, firestore as admin_firestore
 
 # --- Load Environment Variables ---
 DB_USERNAME = os.getenv("DB_USERNAME")
@@ -20,11 +24,47 @@ celery_app = Celery(
     backend=f"{REDIS_URL}/1"
 )
 
-# --- Database Engine ---
-engine = create_engine(
-    f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-    connect_args={"ssl": {"fake_flag_to_enable": True}}
-)
+# --- Redis client for Stripe webhook idempotency (created lazily) ---
+STRIPE_EVENT_TTL_SECONDS = 7 * 24 * 3600  # Stripe retries for up to 3 days
+_redis_client = None
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(f"{REDIS_URL}/2")
+    return _redis_client
+
+def claim_stripe_event(event_id):
+    """
+    Records a Stripe event ID as processed. Returns False if the event was
+    already claimed (a Stripe retry), so the webhook can acknowledge it
+    without enqueuing the work a second time.
+    """
+    return bool(get_redis_client().set(
+        f"stripe_event:{event_id}", 1, nx=True, ex=STRIPE_EVENT_TTL_SECONDS
+    ))
+
+def release_stripe_event(event_id):
+    """Forgets a claimed event so that Stripe's next retry is processed again."""
+    get_redis_client().delete(f"stripe_event:{event_id}")
+
+def get_firestore_client():
+    """Firestore client, initializing the Firebase app on first use."""
+    if not firebase_admin._apps:
+        raw_cred = os.getenv("FIREBASE_SERVICE_ACCOUNT")
+        cred_json = json.loads(raw_cred)
+        cred = credentials.Certificate(cred_json)
+        firebase_admin.initialize_app(cred)
+    return admin_firestore.client()
+
+# --- Database Engine (DATABASE_URL overrides it, as in app.py) ---
+if os.getenv("DATABASE_URL"):
+    engine = create_engine(os.getenv("DATABASE_URL"))
+else:
+    engine = create_engine(
+        f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+        connect_args={"ssl": {"fake_flag_to_enable": True}}
+    )
 
 @celery_app.task(name="worker.generate_stability_analysis_task")
 def generate_stability_analysis_task(ticker):
@@ -104,4 +144,52 @@ def generate_stability_analysis_task(ticker):
             "explanation": explanation_text
         }
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+# -------------------------------------------------------------------------
+# Stripe: upgrade the Firestore user after a completed checkout
+# -------------------------------------------------------------------------
+class StripeEventTask(celery_app.Task):
+    """
+    Task whose Stripe event stays claimed only if it succeeds: once the
+    retries are exhausted the claim is released, so a redelivery of the event
+    (a Stripe retry or a resend from the dashboard) is processed again
+    instead of being acknowledged as a duplicate.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        event_id = kwargs.get("event_id", args[1] if len(args) > 1 else None)
+        if not event_id:
+            return
+        try:
+            release_stripe_event(event_id)
+            print(f"🔥 Task failed for event {event_id}; released it for redelivery: {exc}")
+        except Exception as e:
+            print(f"🔥 Could not release Stripe event {event_id} after failure: {e}")
+
+@celery_app.task(
+    name="worker.upgrade_user_plan_task",
+    base=StripeEventTask,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 5},
+)
+def upgrade_user_plan_task(user_email, event_id=None):
+    """
+    Sets plan=premium on the Firestore user matching user_email.
+    Setting the plan is idempotent, so Celery retries are safe. If every
+    retry fails, event_id's claim is released (see StripeEventTask).
+    """
+    db_fs = get_firestore_client()
+    users_ref = db_fs.collection("users")
+    query = users_ref.where("email", "==", user_email).limit(1)
+    docs = query.stream()
+    user_doc = next(docs, None)
+
+    if user_doc:
+        user_doc.reference.update({"plan": "premium"})
+        print(f"✅ Successfully upgraded user {user_email} to premium (event {event_id}).")
+        return {"status": "UPGRADED", "email": user_email}
+
+    print(f"🔥 Webhook error: User not found with email {user_email} (event {event_id}).")
+    return {"status": "USER_NOT_FOUND", "email": user_email}
@@ -7,8 +7,12 @@ import re
 from sqlalchemy import create_engine, text
 from sqlalchemy.types import Integer, Float
 import os
+import sys
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from fmp_client import FMPClient
+from db_upsert import upsert_dataframe
+from bulk_load import BulkLoader, swap_tables
 
 # -------------------- CONFIGURATION --------------------
 # Load environment variables from Credentials.env
@@ -22,82 +26,52 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")        
 DB_NAME = os.getenv("DB_NAME")
 
-# Create database connection with SSL forced
-engine = create_engine(
-    f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-    connect_args={
-        "ssl": {
-            "fake_flag_to_enable": True
+# Create database connection with SSL forced (DATABASE_URL overrides it,
+# e.g. with the benchmark suite's SQLite stand-in)
+if os.getenv("DATABASE_URL"):
+    engine = create_engine(os.getenv("DATABASE_URL"))
+else:
+    engine = create_engine(
+        f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+        connect_args={
+            "ssl": {
+                "fake_flag_to_enable": True
+            },
+            # Allows the LOAD DATA LOCAL INFILE fast path of full reloads
+            "local_infile": True
         }
-    }
-)
+    )
 
 # API Key for Financial Modeling Prep (FMP)
 FMP_API_KEY = os.getenv("FMP_API_KEY")
-print(f"--- SCRIPT IS USING KEY: {FMP_API_KEY} ---")
 # File paths (loaded from environment variables)
 reit_list_path = os.getenv("REIT_LIST_PATH")
 
 # -------------------- LOAD REIT UNIVERSE --------------------
-try:
-    reit_data = pd.read_csv(reit_list_path)
+def load_reit_list():
+    """The REIT list CSV (REIT_LIST_PATH) with sanitized column names."""
+    try:
+        reit_data = pd.read_csv(reit_list_path)
     
-    def clean_column_name(col_name):
-        col_name = col_name.strip()
-        col_name = re.sub(r'[^\w]', '_', col_name)
-        col_name = re.sub(r'_+', '_', col_name)
-        return col_name
-
-    reit_data.columns = [clean_column_name(col) for col in reit_data.columns]
-    tickers = reit_data['Ticker'].dropna().astype(str).tolist()  # Ensure tickers are strings
-    print("✅ REIT data loaded and sanitized successfully.")
-except Exception as e:
-    print(f"❌ Error loading REIT list: {e}")
-    exit()
-
-# -------------------- FETCH PRICE & VOLUME FROM FMP --------------------
-end_date = datetime.now().strftime('%Y-%m-%d')
-start_date = (datetime.now() - timedelta(days=5 * 365)).strftime('%Y-%m-%d')
+        def clean_column_name(col_name):
+            col_name = col_name.strip()
+            col_name = re.sub(r'[^\w]', '_', col_name)
+            col_name = re.sub(r'_+', '_', col_name)
+            return col_name
 
-def fetch_ticker_data_fmp(ticker):
-    url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{ticker}?apikey={FMP_API_KEY}"
-    try:
-        print(f"🔄 Fetching data for {ticker} from FMP...")
-        response = requests.get(url)
-        try:
-            data = response.json()
-        except ValueError:
-            print(f"❌ Non-JSON response for {ticker}. Skipping.")
-            return pd.DataFrame()
-        
-        if not isinstance(data, dict) or "historical" not in data:
-            print(f"❌ No data found for {ticker}. Skipping.")
-            return pd.DataFrame()
-        
-        df = pd.DataFrame(data["historical"])
-        df = df[['date', 'close', 'volume']]
-        df['ticker'] = ticker  # Add ticker column
-        return df
+        reit_data.columns = [clean_column_name(col) for col in reit_data.columns]
+        print("✅ REIT data loaded and sanitized successfully.")
     except Exception as e:
-        print(f"❌ Error fetching data for {ticker}: {e}")
-        return pd.DataFrame()
-
-# -------------------- FETCH & STORE PRICE DATA --------------------
-cleaned_price_data = pd.DataFrame()
-for ticker in tickers:
-    ticker_data = fetch_ticker_data_fmp(ticker)
-    if not ticker_data.empty:
-        cleaned_price_data = pd.concat([cleaned_price_data, ticker_data], ignore_index=True)
-    time.sleep(0.02)  # Small delay to avoid rate limits
+        print(f"❌ Error loading REIT list: {e}")
+        exit()
+    return reit_data
 
-if cleaned_price_data.empty:
-    print("❌ No data fetched. Exiting.")
-    exit()
 
 # -------------------- SQL DATABASE SETUP --------------------
-drop_price_table_query = "DROP TABLE IF EXISTS reit_price_data;"
+PRICE_SHADOW_TABLE = "reit_price_data_new"
+drop_shadow_table_query = f"DROP TABLE IF EXISTS {PRICE_SHADOW_TABLE};"
 create_price_table_query = (
-    "CREATE TABLE reit_price_data ("
+    "CREATE TABLE IF NOT EXISTS {table} ("
     "date DATE NOT NULL, "
     "ticker VARCHAR(10) NOT NULL, "
     "close_price FLOAT NOT NULL, "
@@ -105,40 +79,197 @@ create_price_table_query = (
     "PRIMARY KEY (date, ticker)"
     ");"
 )
+# Serves the per-ticker MAX(date) lookup of the incremental load. Built after
+# the bulk load; named per load because SQLite index names are database-wide.
+create_price_index_query = (
+    f"CREATE INDEX idx_price_ticker_date_{datetime.now():%Y%m%d%H%M%S} "
+    f"ON {PRICE_SHADOW_TABLE} (ticker, date);"
+)
+
+# Each ticker's most recent bar, read by primary key by script 3 and the API's
+# screener instead of searching reit_price_data for the latest date. Upserted
+# with every incremental batch (whose bars are all newer than what is stored);
+# rebuilt from reit_price_data after a full reload or when still empty.
+create_latest_price_table_query = (
+    "CREATE TABLE IF NOT EXISTS reit_latest_price ("
+    "ticker VARCHAR(10) NOT NULL PRIMARY KEY, "
+    "date DATE NOT NULL, "
+    "close_price FLOAT NOT NULL, "
+    "volume FLOAT"
+    ");"
+)
+rebuild_latest_price_queries = [
+    "DELETE FROM reit_latest_price;",
+    "INSERT INTO reit_latest_price (ticker, date, close_price, volume) "
+    "SELECT p.ticker, p.date, p.close_price, p.volume FROM reit_price_data p "
+    "JOIN (SELECT ticker, MAX(date) AS last_date FROM reit_price_data GROUP BY ticker) m "
+    "ON p.ticker = m.ticker AND p.date = m.last_date;",
+]
+
+# Price rows are written in batches of about this many (see update_prices)
+PRICE_WRITE_BATCH_ROWS = int(os.getenv("PRICE_WRITE_BATCH_ROWS", 50_000))
+
+
+def update_prices(tickers, full_reload=False):
+    """
+    Fetches prices for tickers from FMP into reit_price_data (incrementally,
+    or a full reload into a shadow table that is swapped in) and keeps
+    reit_latest_price current.
+    """
+    print(f"--- SCRIPT IS USING KEY: {FMP_API_KEY} ---")
+
+    # A ticker listed twice would be fetched twice and could land in two write
+    # batches (duplicate (date, ticker) rows on the bulk path); keep the first
+    tickers = list(dict.fromkeys(tickers))
+
+    # -------------------- LOAD MODE --------------------
+    # Incremental by default: only bars after each ticker's latest stored date are
+    # fetched (FMP `from=`) and upserted, so the table stays readable and a daily
+    # refresh only transfers the new days. Tickers with no stored prices get their
+    # full history. Run with --full (or with no reit_price_data yet) to rebuild
+    # everything into a shadow table that replaces the live one in one atomic swap.
+    last_dates = {}
+    if not full_reload:
+        try:
+            with engine.connect() as conn:
+                result = conn.execute(text("SELECT ticker, MAX(date) FROM reit_price_data GROUP BY ticker"))
+                last_dates = {ticker: str(last_date)[:10] for ticker, last_date in result}
+            print(f"✅ Incremental load: {len(last_dates)} tickers already have price data.")
+        except Exception as e:
+            print(f"⚠️ Could not read existing price data ({e}). Running a full reload.")
+            full_reload = True
+
+    try:
+        with engine.begin() as conn:
+            if full_reload:
+                print(f"Creating shadow table {PRICE_SHADOW_TABLE}...")
+                conn.execute(text(drop_shadow_table_query))
+                conn.execute(text(create_price_table_query.format(table=PRICE_SHADOW_TABLE)))
+            else:
+                conn.execute(text(create_price_table_query.format(table="reit_price_data")))
+            conn.execute(text(create_latest_price_table_query))
+            rebuild_latest_price = full_reload or conn.execute(text("SELECT COUNT(*) FROM reit_latest_price")).scalar() == 0
+            print("✅ SQL Tables created successfully.")
+    except Exception as e:
+        print(f"❌ Error setting up tables: {e}")
+        exit()
+
+    # -------------------- FETCH PRICE & VOLUME FROM FMP --------------------
+    # Tickers are fetched concurrently through one pooled session, throttled by a
+    # token bucket (FMP_RATE_LIMIT requests/s, FMP_MAX_WORKERS in flight) and
+    # retried with backoff on 429/5xx. FMP_BASE_URL can point at a local stub.
+    # Raw responses are cached on disk (FMP_CACHE / FMP_CACHE_TTL); re-runs within
+    # the TTL skip the network, and FMP_CACHE=offline replays the cache only.
+    fmp_client = FMPClient(FMP_API_KEY)
+    fetch_from = {
+        ticker: (pd.Timestamp(last_dates[ticker]) + timedelta(days=1)).strftime('%Y-%m-%d')
+        for ticker in tickers if ticker in last_dates
+    }
+
+    # -------------------- FETCH & STORE PRICE DATA --------------------
+    # Rows are written as they arrive, one batch of about PRICE_WRITE_BATCH_ROWS at
+    # a time, so memory is bounded by a batch. Incremental runs upsert into the
+    # live table, and a crash keeps everything already written (the next run
+    # resumes from each ticker's MAX(date)). Full reloads bulk load the shadow
+    # table; the live table is untouched until the swap.
+    bulk_loader = BulkLoader(engine)
+
+    def write_price_batch(frames):
+        batch = pd.concat(frames, ignore_index=True)
+        batch.rename(columns={'date': 'date', 'ticker': 'ticker', 'close': 'close_price', 'volume': 'volume'}, inplace=True)
+        if last_dates:
+            # Guard against providers ignoring `from=`: keep only bars newer than stored
+            stored_until = batch['ticker'].map(last_dates)
+            batch = batch[stored_until.isna() | (batch['date'] > stored_until)]
+        batch = batch.drop_duplicates(subset=['date', 'ticker'], keep='last')[['date', 'ticker', 'close_price', 'volume']]
+        if full_reload:
+            return bulk_loader.load(PRICE_SHADOW_TABLE, batch)
+        latest = batch.sort_values('date').drop_duplicates(subset=['ticker'], keep='last')
+        with engine.begin() as conn:
+            rows = upsert_dataframe(conn, 'reit_price_data', batch, ['date', 'ticker'])
+            upsert_dataframe(conn, 'reit_latest_price', latest[['ticker', 'date', 'close_price', 'volume']], ['ticker'])
+            return rows
+
+    print(f"🔄 Fetching data for {len(tickers)} tickers from FMP...")
+    pending_frames, pending_rows = [], 0
+    rows_written, tickers_fetched = 0, 0
+    try:
+        for ticker, ticker_data in fmp_client.iter_price_histories(tickers, fetch_from):
+            if ticker_data.empty:
+                continue
+            pending_frames.append(ticker_data)
+            pending_rows += len(ticker_data)
+            tickers_fetched += 1
+            if pending_rows >= PRICE_WRITE_BATCH_ROWS:
+                rows_written += write_price_batch(pending_frames)
+                pending_frames, pending_rows = [], 0
+                print(f"💾 {rows_written} price rows written ({tickers_fetched}/{len(tickers)} tickers)...")
+        if pending_frames:
+            rows_written += write_price_batch(pending_frames)
+    except Exception as e:
+        print(f"❌ Error writing price data into MySQL after {rows_written} rows: {e}")
+        exit()
+
+    if rows_written == 0 and full_reload:
+        print("❌ No data fetched. Keeping the existing reit_price_data. Exiting.")
+        with engine.begin() as conn:
+            conn.execute(text(drop_shadow_table_query))
+        exit()
+    elif rows_written == 0:
+        print("✅ REIT price data is already up to date.")
+    else:
+        print(f"✅ {rows_written} REIT price rows for {tickers_fetched} tickers written into MySQL.")
+
+    if full_reload and rows_written:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(create_price_index_query))
+                swap_tables(conn, "reit_price_data", PRICE_SHADOW_TABLE)
+                # Script 2's stored return sums describe the replaced history
+                conn.execute(text("DROP TABLE IF EXISTS reit_risk_sums"))
+            print("✅ Swapped the reloaded price data into reit_price_data.")
+        except Exception as e:
+            print(f"❌ Error swapping in the reloaded price data: {e}")
+            exit()
+
+    if rebuild_latest_price:
+        try:
+            with engine.begin() as conn:
+                for query in rebuild_latest_price_queries:
+                    conn.execute(text(query))
+            print("✅ Rebuilt reit_latest_price from reit_price_data.")
+        except Exception as e:
+            print(f"❌ Error rebuilding reit_latest_price: {e}")
 
-# Build business table creation query explicitly
-business_columns = ""
-for col in reit_data.columns:
-    if col:
-        business_columns += f"{col} VARCHAR(255), "
-business_columns = business_columns.rstrip(", ")
-create_business_table_query = f"CREATE TABLE IF NOT EXISTS reit_business_data ({business_columns});"
-
-try:
-    with engine.connect() as conn:
-        print("Dropping existing reit_price_data table (if any)...")
-        conn.execute(text(drop_price_table_query))
-        print("Creating new reit_price_data table...")
-        conn.execute(text(create_price_table_query))
-        print("Verifying/creating reit_business_data table...")
-        conn.execute(text(create_business_table_query))
-        print("✅ SQL Tables created successfully.")
-except Exception as e:
-    print(f"❌ Error setting up tables: {e}")
-    exit()
-
-# -------------------- INSERT PRICE DATA --------------------
-cleaned_price_data.rename(columns={'date': 'date', 'ticker': 'ticker', 'close': 'close_price', 'volume': 'volume'}, inplace=True)
-cleaned_price_data.drop_duplicates(subset=['date', 'ticker'], keep='last', inplace=True)
-try:
-    cleaned_price_data.to_sql('reit_price_data', con=engine, if_exists='append', index=False, chunksize=2000, method='multi')
-    print("✅ New REIT price data inserted successfully into MySQL.")
-except Exception as e:
-    print(f"❌ Error inserting price data into MySQL: {e}")
 
 # -------------------- INSERT BUSINESS DATA --------------------
-try:
-    reit_data.to_sql('reit_business_data', con=engine, if_exists='replace', index=False)
-    print("✅ New REIT business data inserted successfully into MySQL.")
-except Exception as e:
-    print(f"❌ Error inserting business data into MySQL: {e}")
+def save_business_data(reit_data):
+    # Build business table creation query explicitly
+    business_columns = ""
+    for col in reit_data.columns:
+        if col:
+            # Quoted: some sanitized headers (5yr_FFO_Growth) start with a digit
+            business_columns += f"`{col}` VARCHAR(255), "
+    business_columns = business_columns.rstrip(", ")
+    create_business_table_query = f"CREATE TABLE IF NOT EXISTS reit_business_data ({business_columns});"
+
+    try:
+        with engine.begin() as conn:
+            print("Verifying/creating reit_business_data table...")
+            conn.execute(text(create_business_table_query))
+    except Exception as e:
+        print(f"❌ Error setting up reit_business_data: {e}")
+        exit()
+
+    try:
+        reit_data.to_sql('reit_business_data', con=engine, if_exists='replace', index=False)
+        print("✅ New REIT business data inserted successfully into MySQL.")
+    except Exception as e:
+        print(f"❌ Error inserting business data into MySQL: {e}")
+
+
+if __name__ == "__main__":
+    reit_data = load_reit_list()
+    tickers = reit_data['Ticker'].dropna().astype(str).tolist()  # Ensure tickers are strings
+    update_prices(tickers, full_reload="--full" in sys.argv)
+    save_business_data(reit_data)
@@ -1,9 +1,15 @@
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, bindparam
 import os
+import sys
+from datetime import timedelta
+from functools import partial
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from db_upsert import upsert_columns, upsert_dataframe
+from bulk_load import BulkLoader, swap_tables
+from sharding import run_sharded, scoring_workers
 
 # Load environment variables from Credentials.env
 dotenv_path = os.path.join(os.path.dirname(__file__), "Credentials.env")
@@ -16,146 +22,555 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-# Create database connection with SSL forced
-engine = create_engine(
-    f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-    connect_args={
-        "ssl": {
-            "fake_flag_to_enable": True
+# Create database connection with SSL forced (DATABASE_URL overrides it,
+# e.g. with the benchmark suite's SQLite stand-in)
+if os.getenv("DATABASE_URL"):
+    engine = create_engine(os.getenv("DATABASE_URL"))
+else:
+    engine = create_engine(
+        f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+        connect_args={
+            "ssl": {
+                "fake_flag_to_enable": True
+            }
         }
-    }
-)
+    )
 
 # --- Load REIT Price Data for Stability Score ---
-try:
+# Prices are streamed in ticker-ordered chunks (float32, as stored in the FLOAT
+# columns) and each chunk is reduced to per-ticker sums in one groupby pass:
+# count and power sums of daily returns, plus volume and close sums. Only those
+# sums are kept, so memory is bounded by one chunk however long the history.
+PRICE_CHUNK_ROWS = int(os.getenv("RISK_PRICE_CHUNK_ROWS", 200_000))
+
+# With --workers N / SCORING_WORKERS=N, tickers are split into N shards that
+# are read and reduced in parallel processes; the per-ticker results are
+# merged before the universe-wide Z-score and percentile steps. The shards are
+# forked processes, so on Windows they run serially (with a warning).
+SCORING_WORKERS = scoring_workers()
+
+def price_query(columns, tickers=None, start_date=None):
+    """Ticker-ordered price query, optionally limited to tickers / dates."""
+    sql = f"SELECT {columns} FROM reit_price_data WHERE 1=1"
+    params = {}
+    if tickers is not None:
+        sql += " AND ticker IN :tickers"
+        params["tickers"] = list(tickers)
+    if start_date is not None:
+        sql += " AND date >= :start"
+        params["start"] = start_date
+    query = text(sql + " ORDER BY ticker, date")
+    if tickers is not None:
+        query = query.bindparams(bindparam("tickers", expanding=True))
+    return query, params
+
+def load_price_tickers():
     with engine.connect() as conn:
-        query = "SELECT * FROM reit_price_data"
-        data = pd.read_sql(query, conn)
+        return [row[0] for row in conn.execute(text("SELECT DISTINCT ticker FROM reit_price_data"))]
+
+def chunk_returns(chunk, carry):
+    """
+    Daily returns (close / previous close - 1 within each ticker) for one
+    ticker-ordered chunk. carry is (ticker, last close) from the end of the
+    previous chunk, so a ticker split across chunks keeps its return.
+    """
+    tickers = chunk['ticker'].to_numpy()
+    close = chunk['close_price'].to_numpy(dtype=np.float64)
+    prev_close = np.empty_like(close)
+    prev_close[1:] = close[:-1]
+    prev_close[0] = carry[1] if tickers[0] == carry[0] else np.nan
+    prev_close[1:][tickers[1:] != tickers[:-1]] = np.nan
+    if 'stored_close' in chunk:
+        # Incremental reads: a ticker's first new row follows its stored last close
+        starts = np.isnan(prev_close)
+        prev_close[starts] = chunk['stored_close'].to_numpy(dtype=np.float64)[starts]
+    return close / prev_close - 1, (tickers[-1], close[-1])
+
+def chunk_sums(chunk, carry):
+    """Per-ticker sums for one chunk (see chunk_returns for carry)."""
+    tickers = chunk['ticker'].to_numpy()
+    close = chunk['close_price'].to_numpy(dtype=np.float64)
+    returns, carry = chunk_returns(chunk, carry)
+    returns_sq = returns * returns
+
+    sums = pd.DataFrame({
+        'ticker': tickers,
+        'r1': returns,
+        'r2': returns_sq,
+        'r3': returns_sq * returns,
+        'r4': returns_sq * returns_sq,
+        'volume': chunk['volume'].to_numpy(dtype=np.float64),
+        'close': close,
+        'date': chunk['date'].to_numpy(),
+    }).groupby('ticker', sort=False).agg(
+        n=('r1', 'count'),
+        s1=('r1', 'sum'),
+        s2=('r2', 'sum'),
+        s3=('r3', 'sum'),
+        s4=('r4', 'sum'),
+        volume_sum=('volume', 'sum'),
+        volume_count=('volume', 'count'),
+        close_sum=('close', 'sum'),
+        rows=('close', 'size'),
+        last_date=('date', 'last'),
+        last_close=('close', 'last'),
+    )
+    return sums, carry
+
+SUM_COLUMNS = ['n', 's1', 's2', 's3', 's4', 'volume_sum', 'volume_count', 'close_sum', 'rows']
+
+def fold_sums(partial_sums):
+    """
+    Adds up per-ticker sums given in date order; last_date and last_close
+    come from each ticker's latest part.
+    """
+    combined = pd.concat(partial_sums).groupby(level=0)
+    return combined[SUM_COLUMNS].sum().join(combined[['last_date', 'last_close']].last())
+
+def load_ticker_sums(tickers=None, after_stored=False):
+    """
+    Per-ticker sums over the price history of tickers (default: all). With
+    after_stored, only prices after each ticker's stored last_date are read.
+    """
+    if after_stored:
+        query, params = text(
+            "SELECT p.ticker, p.date, p.close_price, p.volume, s.last_close AS stored_close "
+            f"FROM reit_price_data p LEFT JOIN {RISK_SUMS_TABLE} s ON s.ticker = p.ticker "
+            "WHERE s.last_date IS NULL OR p.date > s.last_date "
+            "ORDER BY p.ticker, p.date"
+        ), {}
+    else:
+        query, params = price_query("ticker, date, close_price, volume", tickers)
+    partial_sums = []
+    carry = (None, np.nan)
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(query, conn, params=params, chunksize=PRICE_CHUNK_ROWS,
+                                 dtype={'close_price': 'float32', 'volume': 'float32'}):
+            if chunk.empty:
+                continue
+            sums, carry = chunk_sums(chunk, carry)
+            partial_sums.append(sums)
+    if not partial_sums:
+        return pd.DataFrame()
+    # A ticker appears in at most two consecutive chunks; fold its partial sums
+    return fold_sums(partial_sums)
+
+# --- Stored sufficient statistics ---
+# The per-ticker sums, with each ticker's last date and close, are kept in
+# reit_risk_sums. A daily run reads only the prices after those dates, folds
+# their sums into the stored ones and rescores the universe from the totals,
+# so its cost no longer grows with the length of the history. --rebuild-sums
+# (or an empty store) re-reads the full history; script 1 drops the store
+# when a full price reload replaces the history.
+RISK_SUMS_TABLE = "reit_risk_sums"
+
+create_sums_table_query = (
+    f"CREATE TABLE IF NOT EXISTS {RISK_SUMS_TABLE} ("
+    "ticker VARCHAR(10) NOT NULL PRIMARY KEY, "
+    "n BIGINT NOT NULL, "
+    "s1 DOUBLE NOT NULL, "
+    "s2 DOUBLE NOT NULL, "
+    "s3 DOUBLE NOT NULL, "
+    "s4 DOUBLE NOT NULL, "
+    "volume_sum DOUBLE NOT NULL, "
+    "volume_count BIGINT NOT NULL, "
+    "close_sum DOUBLE NOT NULL, "
+    "price_rows BIGINT NOT NULL, "
+    "last_date DATE NOT NULL, "
+    "last_close DOUBLE NOT NULL"
+    ");"
+)
+
+def update_ticker_sums(rebuild_sums=False):
+    """
+    Per-ticker sums over the whole price history: the stored ones with the
+    new prices folded in, or a full re-read when rebuilding (or the store is
+    empty). The store is updated either way.
+    """
+    stored_sums = pd.DataFrame()
+    if not rebuild_sums:
+        try:
+            with engine.connect() as conn:
+                stored_sums = pd.read_sql(text(f"SELECT * FROM {RISK_SUMS_TABLE}"), conn, index_col='ticker')
+            stored_sums = stored_sums.rename(columns={'price_rows': 'rows'})
+        except Exception:
+            stored_sums = pd.DataFrame()
+        rebuild_sums = stored_sums.empty
+
+    try:
+        if not rebuild_sums:
+            new_sums = load_ticker_sums(after_stored=True)
+            print(f"✅ Folding new prices for {len(new_sums)} tickers into the stored statistics.")
+            ticker_sums = fold_sums([stored_sums, new_sums]) if not new_sums.empty else stored_sums
+        elif SCORING_WORKERS > 1:
+            print(f"✅ Computing price statistics in {SCORING_WORKERS} shards...")
+            shard_sums = run_sharded(load_ticker_sums, load_price_tickers(), SCORING_WORKERS, engine)
+            shard_sums = [sums for sums in shard_sums if not sums.empty]
+            ticker_sums = pd.concat(shard_sums) if shard_sums else pd.DataFrame()
+        else:
+            ticker_sums = load_ticker_sums()
         print("✅ REIT price data loaded successfully.")
-except Exception as e:
-    print(f"❌ Error loading REIT price data: {e}")
-    exit()
+    except Exception as e:
+        print(f"❌ Error loading REIT price data: {e}")
+        exit()
 
-# Ensure 'date' column is in datetime format and sort
-try:
-    data['date'] = pd.to_datetime(data['date'])
-    data.sort_values(by=['ticker', 'date'], inplace=True)
-except Exception as e:
-    print(f"❌ Error processing 'date' column: {e}")
-    exit()
+    if ticker_sums.empty:
+        print("❌ No REIT price data found. Exiting.")
+        exit()
+
+    ticker_sums = ticker_sums.sort_index()
+
+    # Only the tickers with new prices change on a daily run
+    changed_sums = ticker_sums if rebuild_sums else ticker_sums.loc[new_sums.index]
+    try:
+        if not changed_sums.empty:
+            stored = changed_sums[SUM_COLUMNS + ['last_date', 'last_close']].rename(columns={'rows': 'price_rows'})
+            stored = stored.rename_axis('ticker').reset_index()
+            stored['last_date'] = pd.to_datetime(stored['last_date']).dt.date
+            with engine.begin() as conn:
+                conn.execute(text(create_sums_table_query))
+                if rebuild_sums:
+                    conn.execute(text(f"DELETE FROM {RISK_SUMS_TABLE}"))
+                upsert_dataframe(conn, RISK_SUMS_TABLE, stored, ['ticker'])
+    except Exception as e:
+        print(f"❌ Error saving the price statistics: {e}")
+    return ticker_sums
 
-# Calculate daily returns
-data['Daily Return'] = data.groupby('ticker')['close_price'].pct_change()
 
 # 2) Define function for Stability Score
-def calculate_stability(group):
-    ticker = group['ticker'].iloc[0]
-    
-    # Price-based metrics
-    avg_return = group['Daily Return'].mean()
-    avg_annual_return = avg_return * 252  # Approx annual trading days
-    std_dev = group['Daily Return'].std()
-    skewness = group['Daily Return'].skew()
-    kurtosis = group['Daily Return'].kurt()
-    
-    # Volume-based metric: average volume
-    avg_volume = group['volume'].mean()
-    
-    # --- MODIFICATION: Calculate Average Dollar Volume ---
-    avg_price = group['close_price'].mean()
-    avg_dollar_volume = avg_price * avg_volume
-    
-    data_length = len(group)
-    
-    return pd.Series({
-        'Ticker': ticker,
-        'Average Daily Return': avg_return,
-        'Average Annual Return': avg_annual_return,
+def _zero_out_fperr(values):
+    # pandas treats sums this close to zero as exactly zero in skew() / kurt()
+    return np.where(np.abs(values) < 1e-14, 0, values)
+
+def return_moments(n, s1, s2, s3, s4):
+    """
+    Mean, standard deviation, skewness and excess kurtosis from the count and
+    power sums of returns (arrays of any shape). Same estimators as pandas
+    mean(), std(), skew() and kurt(), including their small-n NaN rules.
+    """
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = s1 / n
+        # Central moment sums from the raw power sums
+        m2 = _zero_out_fperr(s2 - n * mean ** 2)
+        m3 = _zero_out_fperr(s3 - 3 * mean * s2 + 2 * n * mean ** 3)
+        m4 = s4 - 4 * mean * s3 + 6 * mean ** 2 * s2 - 3 * n * mean ** 4
+
+        std_dev = np.sqrt(m2 / (n - 1))
+        skewness = np.where(m2 == 0, 0, (n * (n - 1) ** 0.5 / (n - 2)) * (m3 / m2 ** 1.5))
+        numerator = _zero_out_fperr(n * (n + 1) * (n - 1) * m4)
+        denominator = _zero_out_fperr((n - 2) * (n - 3) * m2 ** 2)
+        kurtosis = np.where(
+            denominator == 0, 0,
+            numerator / denominator - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+        )
+    return (
+        mean,
+        np.where(n < 2, np.nan, std_dev),
+        np.where(n < 3, np.nan, skewness),
+        np.where(n < 4, np.nan, kurtosis),
+    )
+
+def calculate_stability(sums):
+    """
+    Return, volatility, skewness and excess kurtosis of daily returns, plus
+    volume metrics, from per-ticker sums.
+    """
+    mean, std_dev, skewness, kurtosis = return_moments(
+        sums['n'].to_numpy(), sums['s1'].to_numpy(), sums['s2'].to_numpy(),
+        sums['s3'].to_numpy(), sums['s4'].to_numpy(),
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Volume-based metric: average volume
+        avg_volume = sums['volume_sum'] / sums['volume_count']
+
+        # --- MODIFICATION: Calculate Average Dollar Volume ---
+        avg_price = sums['close_sum'] / sums['rows']
+        avg_dollar_volume = avg_price * avg_volume
+
+    return pd.DataFrame({
+        'Ticker': sums.index,
+        'Average Daily Return': mean,
+        'Average Annual Return': mean * 252,  # Approx annual trading days
         'Standard Deviation': std_dev,
         'Skewness': skewness,
         'Kurtosis': kurtosis,
         'Average Volume': avg_volume,
         'Average Dollar Volume': avg_dollar_volume, # <-- New metric
-        'Data Length': data_length
-    })
+        'Data Length': sums['rows'].astype(int),
+    }, index=sums.index)
 
-# 3) Group by ticker and apply the stability calculation
-stability_data = data.groupby('ticker', group_keys=False).apply(calculate_stability)
+def score_stability(ticker_sums):
+    """Stability metrics, Z-scores, percentile ranks and liquidity tiers per ticker."""
+    # 3) Calculate the stability metrics for every ticker at once
+    stability_data = calculate_stability(ticker_sums)
 
-# 4) Compute Z-scores for main risk metrics
-z_scores = stability_data[['Average Daily Return', 'Standard Deviation', 'Skewness']].apply(
-    lambda x: (x - x.mean()) / x.std()
-)
+    # 4) Compute Z-scores for main risk metrics
+    z_scores = stability_data[['Average Daily Return', 'Standard Deviation', 'Skewness']].apply(
+        lambda x: (x - x.mean()) / x.std()
+    )
 
-# Adjust kurtosis & skewness
-stability_data['Adjusted Kurtosis'] = abs(stability_data['Kurtosis'] - 3)
-z_scores['Adjusted Kurtosis'] = (
-    (stability_data['Adjusted Kurtosis'] - stability_data['Adjusted Kurtosis'].mean())
-    / stability_data['Adjusted Kurtosis'].std()
-)
+    # Adjust kurtosis & skewness
+    stability_data['Adjusted Kurtosis'] = abs(stability_data['Kurtosis'] - 3)
+    z_scores['Adjusted Kurtosis'] = (
+        (stability_data['Adjusted Kurtosis'] - stability_data['Adjusted Kurtosis'].mean())
+        / stability_data['Adjusted Kurtosis'].std()
+    )
 
-# Convert positive skew to negative (so positive skew = lower risk)
-z_scores['Skewness Adjustment'] = z_scores['Skewness'].apply(lambda x: x if x < 0 else -x)
+    # Convert positive skew to negative (so positive skew = lower risk)
+    z_scores['Skewness Adjustment'] = z_scores['Skewness'].apply(lambda x: x if x < 0 else -x)
 
-# 6) Normalize data length factor
-stability_data['Data Length Factor'] = (
-    stability_data['Data Length'] / stability_data['Data Length'].max()
-)
+    # 6) Normalize data length factor
+    stability_data['Data Length Factor'] = (
+        stability_data['Data Length'] / stability_data['Data Length'].max()
+    )
+
+    # 7) --- MODIFICATION: Compute a purer Risk Score (liquidity removed) ---
+    print("✅ Calculating purer stability risk score (liquidity component removed)...")
+    stability_data['Risk Score'] = (
+        (2.0 * z_scores['Standard Deviation']) +
+        (0.7 * z_scores['Skewness Adjustment']) +
+        (0.5 * z_scores['Adjusted Kurtosis']) -
+        (z_scores['Average Daily Return'])
+    ) * stability_data['Data Length Factor']
+
+    # Compute Stability Percentile (this is now a purer measure of price stability)
+    stability_data['Risk Percentile'] = stability_data['Risk Score'].rank(pct=True, ascending=True) * 100
+    stability_data['Stability Percentile'] = 100 - stability_data['Risk Percentile']
+
+
+    # --- Add the key Z-score components to the final DataFrame ---
+    stability_data['Z_Score_Std_Dev'] = z_scores['Standard Deviation']
+    stability_data['Z_Score_Return'] = z_scores['Average Daily Return']
+    stability_data['Z_Score_Skew'] = z_scores['Skewness Adjustment'] 
+    stability_data['Z_Score_Kurtosis'] = z_scores['Adjusted Kurtosis']
+    # The old Illiquidity Z-score is no longer needed for the main score, but we can keep it for reference if needed
+    z_scores['Volume'] = (stability_data['Average Volume'] - stability_data['Average Volume'].mean()) / stability_data['Average Volume'].std()
+    stability_data['Z_Score_Illiquidity'] = -z_scores['Volume']
+
+
+    # --- Calculate Intuitive Percentile Ranks for Price Stability Factors ---
+    print("✅ Calculating intuitive percentile ranks for stability components...")
+    stability_data['P_Rank_Return'] = stability_data['Z_Score_Return'].rank(pct=True).mul(100).round()
+    stability_data['P_Rank_Volatility'] = (1 - stability_data['Z_Score_Std_Dev'].rank(pct=True)).mul(100).round()
+    stability_data['P_Rank_Skew'] = (1 - stability_data['Z_Score_Skew'].rank(pct=True)).mul(100).round()
+    stability_data['P_Rank_Kurtosis'] = (1 - stability_data['Z_Score_Kurtosis'].rank(pct=True)).mul(100).round()
 
-# 7) --- MODIFICATION: Compute a purer Risk Score (liquidity removed) ---
-print("✅ Calculating purer stability risk score (liquidity component removed)...")
-stability_data['Risk Score'] = (
-    (2.0 * z_scores['Standard Deviation']) +
-    (0.7 * z_scores['Skewness Adjustment']) +
-    (0.5 * z_scores['Adjusted Kurtosis']) -
-    (z_scores['Average Daily Return'])
-) * stability_data['Data Length Factor']
-
-# Compute Stability Percentile (this is now a purer measure of price stability)
-stability_data['Risk Percentile'] = stability_data['Risk Score'].rank(pct=True, ascending=True) * 100
-stability_data['Stability Percentile'] = 100 - stability_data['Risk Percentile']
-
-
-# --- Add the key Z-score components to the final DataFrame ---
-stability_data['Z_Score_Std_Dev'] = z_scores['Standard Deviation']
-stability_data['Z_Score_Return'] = z_scores['Average Daily Return']
-stability_data['Z_Score_Skew'] = z_scores['Skewness Adjustment'] 
-stability_data['Z_Score_Kurtosis'] = z_scores['Adjusted Kurtosis']
-# The old Illiquidity Z-score is no longer needed for the main score, but we can keep it for reference if needed
-z_scores['Volume'] = (stability_data['Average Volume'] - stability_data['Average Volume'].mean()) / stability_data['Average Volume'].std()
-stability_data['Z_Score_Illiquidity'] = -z_scores['Volume']
-
-
-# --- Calculate Intuitive Percentile Ranks for Price Stability Factors ---
-print("✅ Calculating intuitive percentile ranks for stability components...")
-stability_data['P_Rank_Return'] = stability_data['Z_Score_Return'].rank(pct=True).mul(100).round()
-stability_data['P_Rank_Volatility'] = (1 - stability_data['Z_Score_Std_Dev'].rank(pct=True)).mul(100).round()
-stability_data['P_Rank_Skew'] = (1 - stability_data['Z_Score_Skew'].rank(pct=True)).mul(100).round()
-stability_data['P_Rank_Kurtosis'] = (1 - stability_data['Z_Score_Kurtosis'].rank(pct=True)).mul(100).round()
-
-
-# --- NEW: Tiered Liquidity Score based on Absolute Dollar Volume ---
-print("✅ Calculating new tiered liquidity score based on absolute dollar volume...")
-def get_liquidity_tier(dollar_volume):
-    if dollar_volume > 25_000_000: return "Excellent" # > $25M daily
-    if dollar_volume > 5_000_000:  return "Good"      # > $5M daily
-    if dollar_volume > 1_000_000:  return "Moderate"  # > $1M daily
-    if dollar_volume > 250_000:    return "Low"       # > $250k daily
-    return "Very Low"
+
+    # --- NEW: Tiered Liquidity Score based on Absolute Dollar Volume ---
+    print("✅ Calculating new tiered liquidity score based on absolute dollar volume...")
+    def get_liquidity_tier(dollar_volume):
+        if dollar_volume > 25_000_000: return "Excellent" # > $25M daily
+        if dollar_volume > 5_000_000:  return "Good"      # > $5M daily
+        if dollar_volume > 1_000_000:  return "Moderate"  # > $1M daily
+        if dollar_volume > 250_000:    return "Low"       # > $250k daily
+        return "Very Low"
     
-stability_data['Liquidity_Tier'] = stability_data['Average Dollar Volume'].apply(get_liquidity_tier)
-# --- END NEW SECTION ---
+    stability_data['Liquidity_Tier'] = stability_data['Average Dollar Volume'].apply(get_liquidity_tier)
+    # --- END NEW SECTION ---
+    return stability_data
+
+
+def save_stability_scores(stability_data):
+    # --- Save final data to MySQL ---
+    try:
+        # Only this script's columns are written (new ones are added to the table);
+        # script 3's fundamental columns are kept. This script defines the ticker
+        # universe, so tickers without price data any more are removed.
+        with engine.begin() as conn:
+            upsert_columns(conn, 'reit_scoring_analysis', stability_data.reset_index(drop=True), ['Ticker'], prune=True)
+        print("✅ All analysis data saved successfully to MySQL.")
+    except Exception as e:
+        print(f"❌ Error saving final data to MySQL: {e}")
+        exit()
+
+
+# --- Rolling multi-horizon risk history ---
+# Return, volatility, skew and kurtosis over trailing 1/3/5-year windows,
+# stored per (ticker, horizon, date) in reit_risk_history for trend views.
+# Windows are rows of the aligned date x ticker return matrix; a ticker gets a
+# row once at least HORIZON_MIN_COVERAGE of its window has returns.
+# By default only dates after the latest stored one are computed and upserted
+# (the nightly update); --rebuild-history (or an empty table) recomputes the
+# whole history into a shadow table and swaps it in.
+RISK_HORIZONS = {"1Y": 252, "3Y": 756, "5Y": 1260}
+HORIZON_MIN_COVERAGE = 0.8
+RISK_HISTORY_TABLE = "reit_risk_history"
+RISK_HISTORY_SHADOW_TABLE = "reit_risk_history_new"
+RISK_HISTORY_BLOCK_TICKERS = int(os.getenv("RISK_HISTORY_BLOCK_TICKERS", 250))
+
+create_history_table_query = (
+    "CREATE TABLE IF NOT EXISTS {table} ("
+    "ticker VARCHAR(10) NOT NULL, "
+    "horizon VARCHAR(4) NOT NULL, "
+    "date DATE NOT NULL, "
+    "observations INT NOT NULL, "
+    "avg_daily_return DOUBLE, "
+    "annual_return DOUBLE, "
+    "std_dev DOUBLE, "
+    "skewness DOUBLE, "
+    "kurtosis DOUBLE, "
+    "PRIMARY KEY (ticker, horizon, date)"
+    ");"
+)
+
+def load_return_matrix(start_date=None, tickers=None, dates=None):
+    """
+    date x ticker matrix of daily returns (NaN where a ticker has none) from
+    start_date on, for tickers (default: all). dates fixes the row calendar,
+    so a shard's windows line up with the whole universe's.
+    """
+    query, params = price_query("ticker, date, close_price", tickers, start_date)
+    pieces = []
+    carry = (None, np.nan)
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(query, conn, params=params, chunksize=PRICE_CHUNK_ROWS,
+                                 dtype={'close_price': 'float32'}):
+            if chunk.empty:
+                continue
+            returns, carry = chunk_returns(chunk, carry)
+            pieces.append(pd.DataFrame({
+                'date': pd.to_datetime(chunk['date']),
+                'ticker': chunk['ticker'].astype('category'),
+                'return': returns,
+            }))
+    if not pieces:
+        return pd.DataFrame()
+    long_returns = pd.concat(pieces, ignore_index=True)
+    long_returns['ticker'] = long_returns['ticker'].astype(str)
+    returns = long_returns.pivot(index='date', columns='ticker', values='return').sort_index()
+    return returns if dates is None else returns.reindex(dates)
+
+def rolling_history(returns, first_date=None):
+    """
+    Yields long-format history rows for every date >= first_date (all dates
+    if None), one block of tickers at a time, from windowed power sums.
+    """
+    dates = returns.index
+    target_rows = np.arange(len(dates)) if first_date is None else np.flatnonzero(dates >= first_date)
+    for start in range(0, returns.shape[1], RISK_HISTORY_BLOCK_TICKERS):
+        block = returns.iloc[:, start:start + RISK_HISTORY_BLOCK_TICKERS]
+        values = block.to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        values = np.where(valid, values, 0.0)
+
+        # Running power sums with a leading zero row: window (t-w, t] = C[t+1] - C[t+1-w]
+        def cumulative(x):
+            return np.vstack([np.zeros((1, x.shape[1])), np.cumsum(x, axis=0)])
+        squares = values * values
+        running = [cumulative(valid.astype(np.float64)), cumulative(values), cumulative(squares),
+                   cumulative(squares * values), cumulative(squares * squares)]
+
+        window_end = target_rows + 1
+        frames = []
+        for horizon, window in RISK_HORIZONS.items():
+            window_start = np.maximum(window_end - window, 0)
+            n, s1, s2, s3, s4 = (c[window_end] - c[window_start] for c in running)
+            mean, std_dev, skewness, kurtosis = return_moments(n, s1, s2, s3, s4)
+            row_idx, col_idx = np.nonzero(n >= window * HORIZON_MIN_COVERAGE)
+            frames.append(pd.DataFrame({
+                'ticker': block.columns.to_numpy()[col_idx],
+                'horizon': horizon,
+                'date': dates[target_rows[row_idx]].date,
+                'observations': n[row_idx, col_idx].astype(int),
+                'avg_daily_return': mean[row_idx, col_idx],
+                'annual_return': mean[row_idx, col_idx] * 252,
+                'std_dev': std_dev[row_idx, col_idx],
+                'skewness': skewness[row_idx, col_idx],
+                'kurtosis': kurtosis[row_idx, col_idx],
+            }))
+        yield pd.concat(frames, ignore_index=True)
+
+def write_history(tickers, start_date, first_date, dates, table, rebuild):
+    """
+    Computes the history rows for tickers (None: all) from start_date on and
+    writes those from first_date on to table, bulk loading when rebuilding and
+    upserting otherwise. Returns the row count.
+    """
+    returns = load_return_matrix(start_date, tickers, dates)
+    rows = 0
+    loader = BulkLoader(engine)
+    for block_history in rolling_history(returns, first_date=first_date):
+        if block_history.empty:
+            continue
+        if rebuild:
+            rows += loader.load(table, block_history)
+        else:
+            with engine.begin() as conn:
+                rows += upsert_dataframe(conn, table, block_history, ['ticker', 'horizon', 'date'])
+    return rows
+
+def load_price_dates(start_date=None):
+    """The universe's trading calendar: every priced date from start_date on."""
+    query, params = "SELECT DISTINCT date FROM reit_price_data", {}
+    if start_date is not None:
+        query += " WHERE date >= :start"
+        params["start"] = start_date
+    with engine.connect() as conn:
+        return pd.DatetimeIndex(sorted(pd.to_datetime(pd.read_sql(text(query), conn, params=params)['date'])))
+
+def load_unscored_tickers():
+    """Priced tickers without any reit_risk_history rows, e.g. newly listed ones."""
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(
+            f"SELECT DISTINCT ticker FROM reit_price_data "
+            f"WHERE ticker NOT IN (SELECT DISTINCT ticker FROM {RISK_HISTORY_TABLE})"))]
+
+def update_risk_history(rebuild_history=False):
+    """
+    Appends the new dates to reit_risk_history, or rebuilds it. Tickers that
+    have no history yet get their whole history, not just the new dates.
+    """
+    last_history_date = None
+    if not rebuild_history:
+        try:
+            with engine.connect() as conn:
+                last_history_date = conn.execute(text(f"SELECT MAX(date) FROM {RISK_HISTORY_TABLE}")).scalar()
+        except Exception:
+            last_history_date = None
+        rebuild_history = last_history_date is None
+
+    if rebuild_history:
+        history_table, history_start, history_first_date = RISK_HISTORY_SHADOW_TABLE, None, None
+    else:
+        # Enough calendar days for the longest window (trading days + holidays)
+        last_history_date = pd.Timestamp(last_history_date)
+        history_table = RISK_HISTORY_TABLE
+        history_start = (last_history_date - timedelta(days=int(max(RISK_HORIZONS.values()) * 1.5) + 30)).date()
+        history_first_date = last_history_date + timedelta(days=1)
+
+    try:
+        with engine.begin() as conn:
+            if rebuild_history:
+                print("✅ Rebuilding the rolling risk history...")
+                conn.execute(text(f"DROP TABLE IF EXISTS {RISK_HISTORY_SHADOW_TABLE}"))
+            conn.execute(text(create_history_table_query.format(table=history_table)))
+
+        new_tickers = [] if rebuild_history else load_unscored_tickers()
+        if SCORING_WORKERS > 1:
+            # Shards share the universe's trading calendar
+            worker = partial(write_history, start_date=history_start, first_date=history_first_date,
+                             dates=load_price_dates(history_start), table=history_table, rebuild=rebuild_history)
+            history_rows = sum(run_sharded(worker, load_price_tickers(), SCORING_WORKERS, engine))
+        else:
+            history_rows = write_history(None, history_start, history_first_date, None, history_table, rebuild_history)
+        if new_tickers:
+            history_rows += write_history(new_tickers, None, None, load_price_dates(), history_table, False)
+
+        if rebuild_history:
+            with engine.begin() as conn:
+                swap_tables(conn, RISK_HISTORY_TABLE, RISK_HISTORY_SHADOW_TABLE)
+        print(f"✅ {history_rows} rolling risk history rows saved to {RISK_HISTORY_TABLE}.")
+    except Exception as e:
+        print(f"❌ Error updating the rolling risk history: {e}")
 
 
-# --- Save final data to MySQL ---
-try:
-    # Using 'replace' ensures the table schema is updated with all the new columns.
-    stability_data.to_sql('reit_scoring_analysis', con=engine, if_exists='replace', index=False)
-    print("✅ All analysis data saved successfully to MySQL.")
-except Exception as e:
-    print(f"❌ Error saving final data to MySQL: {e}")
+if __name__ == "__main__":
+    stability_data = score_stability(update_ticker_sums("--rebuild-sums" in sys.argv))
+    save_stability_scores(stability_data)
 
+    # --- Display Sample Data ---
+    print("\n--- Final Data Sample ---")
+    print(stability_data[['Ticker', 'Stability Percentile', 'Average Dollar Volume', 'Liquidity_Tier']].head())
 
-# --- Display Sample Data ---
-print("\n--- Final Data Sample ---")
-print(stability_data[['Ticker', 'Stability Percentile', 'Average Dollar Volume', 'Liquidity_Tier']].head())
\ No newline at end of file
+    update_risk_history("--rebuild-history" in sys.argv)
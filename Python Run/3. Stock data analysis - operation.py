@@ -2,8 +2,11 @@ import pandas as pd
 import numpy as np
 from sqlalchemy import create_engine, text
 import os
+from functools import partial
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sharding import run_sharded, scoring_workers
+from db_upsert import upsert_columns
 
 # Load environment variables from Credentials.env
 dotenv_path = os.path.join(os.path.dirname(__file__), "Credentials.env")
@@ -16,53 +19,24 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")         # <-- Add PORT from .env
 DB_NAME = os.getenv("DB_NAME")
 
-# Create database connection with SSL forced
-engine = create_engine(
-    f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-    connect_args={
-        "ssl": {
-            "fake_flag_to_enable": True
+# Create database connection with SSL forced (DATABASE_URL overrides it,
+# e.g. with the benchmark suite's SQLite stand-in)
+if os.getenv("DATABASE_URL"):
+    engine = create_engine(os.getenv("DATABASE_URL"))
+else:
+    engine = create_engine(
+        f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+        connect_args={
+            "ssl": {
+                "fake_flag_to_enable": True
+            }
         }
-    }
-)
-
-# --- Load REIT FFO Payout Data ---
-try:
-    with engine.connect() as conn:
-        query = "SELECT * FROM reit_ffo_payout"
-        ffo_data = pd.read_sql(query, conn)
-        print("✅ REIT FFO Payout data loaded successfully.")
-except Exception as e:
-    print(f"❌ Error loading REIT FFO Payout data: {e}")
-    exit()
-
-# --- Load REIT Scoring Analysis Data ---
-try:
-    with engine.connect() as conn:
-        query = "SELECT * FROM reit_scoring_analysis"
-        scoring_data = pd.read_sql(query, conn)
-        print("✅ REIT Scoring Analysis data loaded successfully.")
-except Exception as e:
-    print(f"❌ Error loading REIT Scoring Analysis data: {e}")
-    exit()
-
-# --- Standardize column names ---
-if "Ticker" in scoring_data.columns:
-    scoring_data.rename(columns={"Ticker": "ticker"}, inplace=True)
-
-# Remove previous FFO_Payout_Score before merging
-scoring_data.drop(columns=["FFO_Payout_Score"], errors="ignore", inplace=True)
-
-# --- Preprocess FFO Data ---
-ffo_data_long = ffo_data.melt(id_vars=["Years"], var_name="ticker", value_name="FFO_Payout")
-ffo_data_long["ticker"] = ffo_data_long["ticker"].str.replace("_US_Equity", "", regex=True)
-
-# Find the most recent year with data
-valid_years = ffo_data_long.dropna(subset=["FFO_Payout"])["Years"]
-latest_year = valid_years.max() if not valid_years.empty else ffo_data_long["Years"].max()
-
-# Select the last 5 years dynamically
-ffo_data_filtered = ffo_data_long[ffo_data_long["Years"] >= latest_year - 4]
+    )
+
+# With --workers N / SCORING_WORKERS=N, the per-ticker FFO payout scores are
+# computed in N parallel shards and merged before the Z-score and percentile steps.
+# The shards are forked processes, so on Windows they run serially (with a warning).
+SCORING_WORKERS = scoring_workers()
 
 # --- Define FFO Payout Score Calculation ---
 def calculate_ffo_score(series):
@@ -89,124 +63,169 @@ def calculate_ffo_score(series):
     # If all values are NaN, std_dev becomes NaN, and stability is set to 0 (worst stability).
     return (0.6 * level_fit) + (0.4 * stability)
 
-# Compute FFO Payout Scores
-ffo_scores = ffo_data_filtered.groupby("ticker")["FFO_Payout"].apply(calculate_ffo_score).reset_index()
-ffo_scores.rename(columns={"FFO_Payout": "FFO_Payout_Score"}, inplace=True)
-
-# --- Merge FFO Payout Scores into REIT Scoring Analysis ---
-final_data = scoring_data.merge(ffo_scores, on="ticker", how="left")
-
-# --- Load REIT Business Data (FFO PS LTM) ---
-try:
-    with engine.connect() as conn:
-        query = "SELECT Ticker, FFO_PS_Annualized FROM reit_business_data"
-        ffo_ltm_data = pd.read_sql(query, conn)
-        print("✅ REIT Business Data (LTM FFO PS) loaded successfully.")
-except Exception as e:
-    print(f"❌ Error loading REIT Business Data: {e}")
-    exit()
-
-# --- Load Latest REIT Stock Prices ---
-try:
-    with engine.connect() as conn:
-        query = """
-            SELECT ticker, close_price
-            FROM reit_price_data
-            WHERE date = (SELECT MAX(date) FROM reit_price_data)
-        """
-        price_data = pd.read_sql(query, conn)
-        print("✅ Latest REIT stock prices loaded successfully.")
-except Exception as e:
-    print(f"❌ Error loading latest REIT stock prices: {e}")
-    exit()
-
-# --- Standardize Column Names for Merging ---
-ffo_ltm_data.rename(columns={"Ticker": "ticker"}, inplace=True)
-
-# --- Merge LTM FFO PS with Latest Price ---
-ffo_yield_data = ffo_ltm_data.merge(price_data, on="ticker", how="left")
-
-# Compute FFO Yield
-ffo_yield_data["FFO_Yield"] = ffo_yield_data["FFO_PS_Annualized"] / ffo_yield_data["close_price"]
-ffo_yield_data["FFO_Yield"].replace([np.inf, -np.inf], np.nan, inplace=True)
-
-# --- Merge FFO Yield into REIT Scoring Analysis ---
-if "FFO_Yield" in final_data.columns:
-    final_data.drop(columns=["FFO_Yield"], inplace=True)
-
-final_data = final_data.merge(ffo_yield_data[["ticker", "FFO_Yield"]], on="ticker", how="left")
-
-# --- Remove any existing FFO_Yield_Z column before merging ---
-if "FFO_Yield_Z" in final_data.columns:
-    final_data.drop(columns=["FFO_Yield_Z"], inplace=True)
-
-# --- Calculate Z-score for FFO Yield ---
-ffo_yield_data["FFO_Yield_Z"] = (ffo_yield_data["FFO_Yield"] - ffo_yield_data["FFO_Yield"].mean()) / ffo_yield_data["FFO_Yield"].std()
-
-# --- Merge FFO_Yield_Z into REIT Scoring Analysis ---
-# FFO Payout was already scaled to 0-1, so no need to scale again with Z-score.
-final_data = final_data.merge(ffo_yield_data[["ticker", "FFO_Yield_Z"]], on="ticker", how="left")
-
-# --- Load REIT Business Data (5-Year FFO Growth) ---
-try:
-    with engine.connect() as conn:
-        query = "SELECT Ticker, 5YR_FFO_Growth FROM reit_business_data"
-        ffo_growth_data = pd.read_sql(query, conn)
-        print("✅ REIT Business Data (5-Year FFO Growth) loaded successfully.")
-except Exception as e:
-    print(f"❌ Error loading REIT Business Data: {e}")
-    exit()
-
-# --- Standardize Column Names for Merging ---
-ffo_growth_data.rename(columns={"Ticker": "ticker"}, inplace=True)
-
-# --- Drop missing values before calculating Z-score ---
-ffo_growth_data.dropna(subset=["5YR_FFO_Growth"], inplace=True)
-
-# --- Calculate Z-score for 5-Year FFO Growth ---
-ffo_growth_data["5YR_FFO_Growth_Z"] = (ffo_growth_data["5YR_FFO_Growth"] - ffo_growth_data["5YR_FFO_Growth"].mean()) / ffo_growth_data["5YR_FFO_Growth"].std()
-
-# Handle potential infinite or NaN values
-ffo_growth_data["5YR_FFO_Growth_Z"].replace([np.inf, -np.inf], np.nan, inplace=True)
-
-# --- Merge 5-Year FFO Growth Z-score into REIT Scoring Analysis ---
-if "5YR_FFO_Growth_Z" in final_data.columns:
-    final_data.drop(columns=["5YR_FFO_Growth_Z"], inplace=True)
-
-final_data = final_data.merge(ffo_growth_data[["ticker", "5YR_FFO_Growth_Z"]], on="ticker", how="left")
-
-# --- Remove any existing Fundamental Score column before merging ---
-if "Fundamental_Score" in final_data.columns:
-    final_data.drop(columns=["Fundamental_Score"], inplace=True)
-
-# --- Define Weights for Fundamental Score Components ---
-w1, w2, w3 = 1/3, 1/3, 1/3  # Adjust weightings if needed
-
-# --- Calculate the Fundamental Score ---
-final_data["Fundamental_Score"] = (
-    (w1 * final_data["FFO_Payout_Score"]) +
-    (w2 * final_data["FFO_Yield_Z"]) +
-    (w3 * final_data["5YR_FFO_Growth_Z"])
-)
-
-# Handle NaN values (in case any stocks are missing some components)
-final_data["Fundamental_Score"].fillna(0, inplace=True)
-
-# -- Remove any existing Fundamental_Percentile column --
-if "Fundamental_Percentile" in final_data.columns:
-    final_data.drop(columns=["Fundamental_Percentile"], inplace=True)
-
-# -- Create a new Fundamental_Percentile column (0-100) --
-final_data["Fundamental_Percentile"] = final_data["Fundamental_Score"].rank(method="average", pct=True) * 100
-
-# --- Rename 'ticker' back to 'Ticker' before saving ---
-final_data.rename(columns={"ticker": "Ticker"}, inplace=True)
-
-# --- Save Updated REIT Scoring Analysis Back to MySQL ---
-try:
-    with engine.connect() as conn:
-        final_data.to_sql("reit_scoring_analysis", con=conn, if_exists="replace", index=False)
-        print("✅ REIT Scoring Analysis updated successfully with FFO_Payout_Score, FFO_Yield, and FFO_Yield_Z.")
-except Exception as e:
-    print(f"❌ Error saving updated REIT Scoring Analysis to MySQL: {e}")
-
+def score_tickers(tickers, ffo_data_filtered):
+    """FFO Payout Scores for tickers (None: all)."""
+    data = ffo_data_filtered if tickers is None else ffo_data_filtered[ffo_data_filtered["ticker"].isin(tickers)]
+    return data.groupby("ticker")["FFO_Payout"].apply(calculate_ffo_score).reset_index()
+
+def load_scoring_tickers():
+    """
+    The tickers of reit_scoring_analysis (written by script 2). Only the
+    tickers are needed: this script writes back just its own columns.
+    """
+    try:
+        with engine.connect() as conn:
+            query = "SELECT Ticker FROM reit_scoring_analysis"
+            scoring_data = pd.read_sql(query, conn)
+            print("✅ REIT Scoring Analysis data loaded successfully.")
+    except Exception as e:
+        print(f"❌ Error loading REIT Scoring Analysis data: {e}")
+        exit()
+    return scoring_data
+
+# The reit_business_data columns used here, named as score_fundamentals() expects
+BUSINESS_COLUMNS = ["Ticker", "FFO_PS_Annualized", "5YR_FFO_Growth"]
+
+def business_columns(reit_data):
+    """
+    BUSINESS_COLUMNS of a REIT list frame (e.g. script 1's, whose growth
+    column is 5yr_FFO_Growth), matched case-insensitively as MySQL matches
+    column names.
+    """
+    by_lower = {col.lower(): col for col in reit_data.columns}
+    return reit_data[[by_lower[col.lower()] for col in BUSINESS_COLUMNS]].set_axis(BUSINESS_COLUMNS, axis=1)
+
+def load_business_data():
+    """LTM FFO PS and 5-year FFO growth from reit_business_data (written by script 1)."""
+    try:
+        with engine.connect() as conn:
+            query = "SELECT " + ", ".join(f"`{col}`" for col in BUSINESS_COLUMNS) + " FROM reit_business_data"
+            business_data = pd.read_sql(query, conn)
+            print("✅ REIT Business Data (LTM FFO PS, 5-Year FFO Growth) loaded successfully.")
+    except Exception as e:
+        print(f"❌ Error loading REIT Business Data: {e}")
+        exit()
+    return business_columns(business_data)
+
+def score_fundamentals(scoring_data, business_data):
+    """
+    FFO Payout Score, FFO Yield (and its Z-score), 5-year FFO growth Z-score
+    and the Fundamental Score / Percentile for the tickers of scoring_data
+    (a frame with a Ticker column), as one row per Ticker.
+    """
+    # --- Load REIT FFO Payout Data ---
+    try:
+        with engine.connect() as conn:
+            query = "SELECT * FROM reit_ffo_payout"
+            ffo_data = pd.read_sql(query, conn)
+            print("✅ REIT FFO Payout data loaded successfully.")
+    except Exception as e:
+        print(f"❌ Error loading REIT FFO Payout data: {e}")
+        exit()
+
+    # --- Standardize column names ---
+    scoring_data = scoring_data[["Ticker"]].rename(columns={"Ticker": "ticker"})
+
+    # --- Preprocess FFO Data ---
+    ffo_data_long = ffo_data.melt(id_vars=["Years"], var_name="ticker", value_name="FFO_Payout")
+    ffo_data_long["ticker"] = ffo_data_long["ticker"].str.replace("_US_Equity", "", regex=True)
+
+    # Find the most recent year with data
+    valid_years = ffo_data_long.dropna(subset=["FFO_Payout"])["Years"]
+    latest_year = valid_years.max() if not valid_years.empty else ffo_data_long["Years"].max()
+
+    # Select the last 5 years dynamically
+    ffo_data_filtered = ffo_data_long[ffo_data_long["Years"] >= latest_year - 4]
+
+    # Compute FFO Payout Scores
+    if SCORING_WORKERS > 1:
+        worker = partial(score_tickers, ffo_data_filtered=ffo_data_filtered)
+        shard_scores = run_sharded(worker, ffo_data_filtered["ticker"].unique(), SCORING_WORKERS, engine)
+        ffo_scores = pd.concat(shard_scores, ignore_index=True).sort_values("ticker", ignore_index=True)
+    else:
+        ffo_scores = score_tickers(None, ffo_data_filtered)
+    ffo_scores.rename(columns={"FFO_Payout": "FFO_Payout_Score"}, inplace=True)
+
+    # --- Merge FFO Payout Scores into REIT Scoring Analysis ---
+    final_data = scoring_data.merge(ffo_scores, on="ticker", how="left")
+
+    # --- Load Latest REIT Stock Prices ---
+    # Each ticker's own last close (kept by script 1), so tickers that did not
+    # trade on the most recent date still get an FFO yield.
+    try:
+        with engine.connect() as conn:
+            query = "SELECT ticker, close_price FROM reit_latest_price"
+            price_data = pd.read_sql(query, conn)
+            print("✅ Latest REIT stock prices loaded successfully.")
+    except Exception as e:
+        print(f"❌ Error loading latest REIT stock prices: {e}")
+        exit()
+
+    # --- Standardize Column Names for Merging ---
+    ffo_ltm_data = business_data[["Ticker", "FFO_PS_Annualized"]].rename(columns={"Ticker": "ticker"})
+
+    # --- Merge LTM FFO PS with Latest Price ---
+    ffo_yield_data = ffo_ltm_data.merge(price_data, on="ticker", how="left")
+
+    # Compute FFO Yield
+    ffo_yield_data["FFO_Yield"] = ffo_yield_data["FFO_PS_Annualized"] / ffo_yield_data["close_price"]
+    ffo_yield_data["FFO_Yield"].replace([np.inf, -np.inf], np.nan, inplace=True)
+
+    # --- Merge FFO Yield into REIT Scoring Analysis ---
+    final_data = final_data.merge(ffo_yield_data[["ticker", "FFO_Yield"]], on="ticker", how="left")
+
+    # --- Calculate Z-score for FFO Yield ---
+    ffo_yield_data["FFO_Yield_Z"] = (ffo_yield_data["FFO_Yield"] - ffo_yield_data["FFO_Yield"].mean()) / ffo_yield_data["FFO_Yield"].std()
+
+    # --- Merge FFO_Yield_Z into REIT Scoring Analysis ---
+    # FFO Payout was already scaled to 0-1, so no need to scale again with Z-score.
+    final_data = final_data.merge(ffo_yield_data[["ticker", "FFO_Yield_Z"]], on="ticker", how="left")
+
+    # --- Standardize Column Names for Merging ---
+    ffo_growth_data = business_data[["Ticker", "5YR_FFO_Growth"]].rename(columns={"Ticker": "ticker"})
+
+    # --- Drop missing values before calculating Z-score ---
+    ffo_growth_data.dropna(subset=["5YR_FFO_Growth"], inplace=True)
+
+    # --- Calculate Z-score for 5-Year FFO Growth ---
+    ffo_growth_data["5YR_FFO_Growth_Z"] = (ffo_growth_data["5YR_FFO_Growth"] - ffo_growth_data["5YR_FFO_Growth"].mean()) / ffo_growth_data["5YR_FFO_Growth"].std()
+
+    # Handle potential infinite or NaN values
+    ffo_growth_data["5YR_FFO_Growth_Z"].replace([np.inf, -np.inf], np.nan, inplace=True)
+
+    # --- Merge 5-Year FFO Growth Z-score into REIT Scoring Analysis ---
+    final_data = final_data.merge(ffo_growth_data[["ticker", "5YR_FFO_Growth_Z"]], on="ticker", how="left")
+
+    # --- Define Weights for Fundamental Score Components ---
+    w1, w2, w3 = 1/3, 1/3, 1/3  # Adjust weightings if needed
+
+    # --- Calculate the Fundamental Score ---
+    final_data["Fundamental_Score"] = (
+        (w1 * final_data["FFO_Payout_Score"]) +
+        (w2 * final_data["FFO_Yield_Z"]) +
+        (w3 * final_data["5YR_FFO_Growth_Z"])
+    )
+
+    # Handle NaN values (in case any stocks are missing some components)
+    final_data["Fundamental_Score"].fillna(0, inplace=True)
+
+    # -- Create a new Fundamental_Percentile column (0-100) --
+    final_data["Fundamental_Percentile"] = final_data["Fundamental_Score"].rank(method="average", pct=True) * 100
+
+    # --- Rename 'ticker' back to 'Ticker' before saving ---
+    final_data.rename(columns={"ticker": "Ticker"}, inplace=True)
+    return final_data
+
+def save_fundamental_scores(final_data):
+    # --- Save Updated REIT Scoring Analysis Back to MySQL ---
+    # Upserts only the columns computed here; script 2's risk columns are untouched.
+    try:
+        with engine.begin() as conn:
+            upsert_columns(conn, "reit_scoring_analysis", final_data, ["Ticker"])
+            print("✅ REIT Scoring Analysis updated successfully with FFO_Payout_Score, FFO_Yield, and FFO_Yield_Z.")
+    except Exception as e:
+        print(f"❌ Error saving updated REIT Scoring Analysis to MySQL: {e}")
+        exit()
+
+if __name__ == "__main__":
+    save_fundamental_scores(score_fundamentals(load_scoring_tickers(), load_business_data()))
@@ -27,34 +27,19 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-engine = create_engine(
-    f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-    connect_args={"ssl": {"fake_flag_to_enable": True}} # Note: for production, use proper SSL config
-)
+# DATABASE_URL overrides the MySQL connection, e.g. with a local stand-in
+if os.getenv("DATABASE_URL"):
+    engine = create_engine(os.getenv("DATABASE_URL"))
+else:
+    engine = create_engine(
+        f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+        connect_args={"ssl": {"fake_flag_to_enable": True}} # Note: for production, use proper SSL config
+    )
 
 # ------------------------------------------------------------------
-# 2) Prepare the user inputs: Ticker & file path
+# 2) Financials export location: <root>/<ticker>/Financials/<ticker> Financials.xlsx
 # ------------------------------------------------------------------
-ticker = "SLG"  # Update REIT you want to process
-print(f"Processing data for Ticker={ticker}...")
-
 root_folder = os.getenv("REIT_RAW_FINANCIALS_PATH")
-xlsx_file_name = f"{ticker} Financials.xlsx"
-xls_file_name = f"{ticker} Financials.xls"
-
-file_path_xlsx = os.path.join(root_folder, ticker, "Financials", xlsx_file_name)
-file_path_xls = os.path.join(root_folder, ticker, "Financials", xls_file_name)
-
-if os.path.exists(file_path_xlsx):
-    file_path = file_path_xlsx
-elif os.path.exists(file_path_xls):
-    file_path = file_path_xls
-else:
-    print("❌ No .xlsx or .xls file found for this REIT.\n"
-          f"Tried:\n  {file_path_xlsx}\n  {file_path_xls}")
-    sys.exit(1)
-
-print(f"Using file: {file_path}")
 
 # ------------------------------------------------------------------
 # 3) Helper: Create or verify each statement table
@@ -93,9 +78,6 @@ statement_tables = {
     "Industry Specific": "reit_industry_metrics",
 }
 
-for sheet_name, table_name in statement_tables.items():
-    create_reit_table_if_not_exists(table_name)
-
 # ------------------------------------------------------------------
 # 4) Quarter/Year parsing
 # ------------------------------------------------------------------
@@ -234,19 +216,51 @@ wanted_sheets = [
     "Industry Specific"
 ]
 
-print(f"\nReading Excel: {file_path} ...")
-try:
-    xlsx_dict = pd.read_excel(file_path, sheet_name=None, header=0)
-except Exception as e:
-    print(f"❌ Error reading Excel file: {e}")
-    sys.exit(1)
-
-for sheet in wanted_sheets:
-    if sheet in xlsx_dict:
-        print(f"🔎 Processing sheet '{sheet}'...")
-        df_sheet = xlsx_dict[sheet]
-        process_financial_sheet(df_sheet, sheet, ticker)
+def ingest_financials(ticker):
+    """
+    Upserts the statement sheets of ticker's financials export into the
+    statement tables.
+    """
+    print(f"Processing data for Ticker={ticker}...")
+
+    xlsx_file_name = f"{ticker} Financials.xlsx"
+    xls_file_name = f"{ticker} Financials.xls"
+
+    file_path_xlsx = os.path.join(root_folder, ticker, "Financials", xlsx_file_name)
+    file_path_xls = os.path.join(root_folder, ticker, "Financials", xls_file_name)
+
+    if os.path.exists(file_path_xlsx):
+        file_path = file_path_xlsx
+    elif os.path.exists(file_path_xls):
+        file_path = file_path_xls
     else:
-        print(f"⚠️ Sheet '{sheet}' not found; skipping.")
+        print("❌ No .xlsx or .xls file found for this REIT.\n"
+              f"Tried:\n  {file_path_xlsx}\n  {file_path_xls}")
+        sys.exit(1)
+
+    print(f"Using file: {file_path}")
+
+    for sheet_name, table_name in statement_tables.items():
+        create_reit_table_if_not_exists(table_name)
+
+    print(f"\nReading Excel: {file_path} ...")
+    try:
+        xlsx_dict = pd.read_excel(file_path, sheet_name=None, header=0)
+    except Exception as e:
+        print(f"❌ Error reading Excel file: {e}")
+        sys.exit(1)
+
+    for sheet in wanted_sheets:
+        if sheet in xlsx_dict:
+            print(f"🔎 Processing sheet '{sheet}'...")
+            df_sheet = xlsx_dict[sheet]
+            process_financial_sheet(df_sheet, sheet, ticker)
+        else:
+            print(f"⚠️ Sheet '{sheet}' not found; skipping.")
+
+    print("\n✅ Done processing all sheets for ticker:", ticker)
+
 
-print("\n✅ Done processing all sheets for ticker:", ticker)
\ No newline at end of file
+if __name__ == "__main__":
+    ticker = "SLG"  # Update REIT you want to process
+    ingest_financials(ticker)
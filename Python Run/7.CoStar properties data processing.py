@@ -22,11 +22,14 @@ DB_NAME     = os.getenv("DB_NAME")
 
 root_folder = os.getenv("REIT_RAW_PROPERTIES_PATH")
 
-# SQLAlchemy engine
-engine = create_engine(
-    f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-    connect_args={"ssl": {"fake_flag_to_enable": True}}
-)
+# SQLAlchemy engine (DATABASE_URL overrides it, e.g. with a local stand-in)
+if os.getenv("DATABASE_URL"):
+    engine = create_engine(os.getenv("DATABASE_URL"))
+else:
+    engine = create_engine(
+        f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+        connect_args={"ssl": {"fake_flag_to_enable": True}}
+    )
 
 # ------------------------------------------------------------------
 # 2) Create reit_properties table if not exists
@@ -78,9 +81,12 @@ def parse_currency_to_float(val):
 # ------------------------------------------------------------------
 # 4) Main ingestion logic
 # ------------------------------------------------------------------
-if __name__ == "__main__":
-    # Enter REIT ticker to process
-    ticker = "BXP"  # update as needed
+def ingest_properties(ticker):
+    """
+    Replaces ticker's rows in reit_properties with its CoStar properties
+    export (<REIT_RAW_PROPERTIES_PATH>/<ticker>/Properties/<ticker> Properties.xlsx)
+    and returns the inserted rows.
+    """
     print(f"Processing property data for Ticker={ticker}...")
 
     # Locate Excel file (.xlsx or .xls) in "Properties" folder
@@ -172,3 +178,10 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"❌ Error inserting into {table_name}: {e}")
         sys.exit(1)
+    return df_to_insert
+
+
+if __name__ == "__main__":
+    # Enter REIT ticker to process
+    ticker = "BXP"  # update as needed
+    ingest_properties(ticker)
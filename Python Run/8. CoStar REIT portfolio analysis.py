@@ -18,9 +18,12 @@ DB_HOST     = os.getenv("DB_HOST")
 DB_PORT     = os.getenv("DB_PORT")
 DB_NAME     = os.getenv("DB_NAME")
 
-# SQLAlchemy engine
-environment_url = f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(environment_url, connect_args={"ssl": {"fake_flag_to_enable": True}})
+# SQLAlchemy engine (DATABASE_URL overrides it, e.g. with a local stand-in)
+if os.getenv("DATABASE_URL"):
+    engine = create_engine(os.getenv("DATABASE_URL"))
+else:
+    environment_url = f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    engine = create_engine(environment_url, connect_args={"ssl": {"fake_flag_to_enable": True}})
 
 # ------------------------------------------------------------------
 # 2) Create analysis table if not exists
@@ -42,10 +45,14 @@ def create_analysis_table(table_name):
     print(f"✅ Verified/created analysis table: {table_name}")
 
 # ------------------------------------------------------------------
-# 3) Fetch property data for ticker
+# 3) Break down a ticker's properties
 # ------------------------------------------------------------------
-if __name__ == "__main__":
-    ticker = input("Enter REIT ticker to analyze: ").strip().upper()
+def analyze_portfolio(ticker, properties=None):
+    """
+    Replaces ticker's rows in reit_portfolio_analysis with the RBA/GLA
+    breakdowns of its properties (read from reit_properties unless given)
+    and returns them.
+    """
     table_name = "reit_portfolio_analysis"
 
     # ensure analysis table exists
@@ -64,12 +71,15 @@ if __name__ == "__main__":
         print(f"❌ Error clearing old analysis data for {ticker}: {e}")
         sys.exit(1)
 
-    # load properties
-    query = text(
-        "SELECT property_type, secondary_type, market, country, rba_gla "
-        "FROM reit_properties WHERE ticker = :t"
-    )
-    df = pd.read_sql(query, engine, params={"t": ticker})
+    # load properties (unless passed in, e.g. straight from script 7)
+    if properties is None:
+        query = text(
+            "SELECT property_type, secondary_type, market, country, rba_gla "
+            "FROM reit_properties WHERE ticker = :t"
+        )
+        df = pd.read_sql(query, engine, params={"t": ticker})
+    else:
+        df = properties[["property_type", "secondary_type", "market", "country", "rba_gla"]].copy()
     if df.empty:
         print(f"❌ No property data found for {ticker}")
         sys.exit(1)
@@ -135,4 +145,10 @@ if __name__ == "__main__":
     # assemble and write back
     df_res = pd.DataFrame(results)
     df_res.to_sql(table_name, engine, if_exists="append", index=False)
-    print(f"✅ Analysis inserted ({len(df_res)} rows) into {table_name}")
\ No newline at end of file
+    print(f"✅ Analysis inserted ({len(df_res)} rows) into {table_name}")
+    return df_res
+
+
+if __name__ == "__main__":
+    ticker = input("Enter REIT ticker to analyze: ").strip().upper()
+    analyze_portfolio(ticker)
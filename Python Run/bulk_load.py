@@ -0,0 +1,99 @@
+# bulk_load.py
+"""
+Fast bulk loading into a shadow table, then an atomic swap with the live one.
+
+A full reload builds `<table>_new` while readers keep using `<table>`, then
+swap_tables() exchanges them in one RENAME TABLE, so readers never see an
+empty or half-loaded table.
+
+Rows are loaded with LOAD DATA LOCAL INFILE from a temporary CSV on MySQL
+(requires local_infile on both client and server). If the server refuses
+it, or on other databases, the loader falls back to plain executemany
+INSERTs, which PyMySQL rewrites into large multi-row statements.
+PRICE_BULK_METHOD=load_data|executemany forces either path.
+"""
+import os
+import tempfile
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+from db_upsert import bind_rows
+
+
+def insert_rows(conn, table, df, chunksize=10_000):
+    """Plain executemany INSERT of df's columns."""
+    quote = conn.dialect.identifier_preparer.quote
+    columns = list(df.columns)
+    statement = text(
+        f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) "
+        f"VALUES ({', '.join(f':p{i}' for i in range(len(columns)))})"
+    )
+    for rows in bind_rows(df, chunksize):
+        conn.execute(statement, rows)
+
+
+def load_data_local_infile(conn, table, df):
+    """LOAD DATA LOCAL INFILE of df via a temporary CSV (empty fields -> NULL)."""
+    quote = conn.dialect.identifier_preparer.quote
+    variables = [f"@v{i}" for i in range(len(df.columns))]
+    assignments = ", ".join(f"{quote(c)} = NULLIF({v}, '')" for c, v in zip(df.columns, variables))
+
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", newline="") as f:
+            df.to_csv(f, index=False, header=False, lineterminator="\n")
+        conn.exec_driver_sql(
+            f"LOAD DATA LOCAL INFILE '{path.replace(os.sep, '/')}' INTO TABLE {quote(table)} "
+            f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' "
+            f"({', '.join(variables)}) SET {assignments}"
+        )
+    finally:
+        os.remove(path)
+
+
+class BulkLoader:
+    """Loads DataFrames into a table, one transaction per call."""
+
+    def __init__(self, engine, method=None):
+        self.engine = engine
+        default = "load_data" if engine.dialect.name == "mysql" else "executemany"
+        self.method = method or os.getenv("PRICE_BULK_METHOD") or default
+
+    def load(self, table, df):
+        if self.method == "load_data":
+            try:
+                with self.engine.begin() as conn:
+                    load_data_local_infile(conn, table, df)
+                return len(df)
+            except DBAPIError as e:
+                print(f"⚠️ LOAD DATA LOCAL INFILE failed ({e.orig}). Falling back to batched INSERTs.")
+                self.method = "executemany"
+        with self.engine.begin() as conn:
+            insert_rows(conn, table, df)
+        return len(df)
+
+
+def swap_tables(conn, live, shadow):
+    """
+    Replaces live with shadow atomically and drops the old table. If live does
+    not exist yet, shadow is simply renamed. Raises ValueError, leaving live
+    untouched, if shadow does not exist.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    old = f"{live}_old"
+    inspector = inspect(conn)
+    if not inspector.has_table(shadow):
+        raise ValueError(f"Cannot swap in {shadow}: the table does not exist")
+    conn.execute(text(f"DROP TABLE IF EXISTS {quote(old)}"))
+    if not inspector.has_table(live):
+        conn.execute(text(f"ALTER TABLE {quote(shadow)} RENAME TO {quote(live)}"))
+        return
+    if conn.dialect.name == "mysql":
+        conn.execute(text(f"RENAME TABLE {quote(live)} TO {quote(old)}, {quote(shadow)} TO {quote(live)}"))
+    else:
+        # SQLite has no multi-table RENAME, and pysqlite runs DDL outside a
+        # transaction, so shadow is checked above before live is moved aside
+        conn.execute(text(f"ALTER TABLE {quote(live)} RENAME TO {quote(old)}"))
+        conn.execute(text(f"ALTER TABLE {quote(shadow)} RENAME TO {quote(live)}"))
+    conn.execute(text(f"DROP TABLE {quote(old)}"))
@@ -0,0 +1,147 @@
+# db_upsert.py
+"""
+Insert-or-update of DataFrame rows keyed on a table's primary/unique key.
+
+MySQL uses INSERT ... ON DUPLICATE KEY UPDATE (which PyMySQL batches into
+multi-row INSERTs under executemany); SQLite, used by the local benchmark
+stand-in, uses INSERT ... ON CONFLICT DO UPDATE.
+
+upsert_columns() updates only some columns of a shared table (e.g. one
+scoring stage's outputs) by loading them into a temporary staging table and
+merging that in one INSERT ... SELECT, so the table is never dropped and the
+other stages' columns are left alone.
+"""
+import pandas as pd
+from sqlalchemy import inspect, text
+
+
+def upsert_sql(dialect, table, columns, key_columns):
+    """INSERT statement for dialect with :p0..:pN bind parameters."""
+    quote = dialect.identifier_preparer.quote
+    column_list = ", ".join(quote(c) for c in columns)
+    values = ", ".join(f":p{i}" for i in range(len(columns)))
+    update_columns = [c for c in columns if c not in key_columns]
+    sql = f"INSERT INTO {quote(table)} ({column_list}) VALUES ({values})"
+
+    if dialect.name == "sqlite":
+        conflict = ", ".join(quote(c) for c in key_columns)
+        if not update_columns:
+            return f"{sql} ON CONFLICT ({conflict}) DO NOTHING"
+        updates = ", ".join(f"{quote(c)} = excluded.{quote(c)}" for c in update_columns)
+        return f"{sql} ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+
+    if not update_columns:
+        return sql.replace("INSERT INTO", "INSERT IGNORE INTO", 1)
+    updates = ", ".join(f"{quote(c)} = VALUES({quote(c)})" for c in update_columns)
+    return f"{sql} ON DUPLICATE KEY UPDATE {updates}"
+
+
+def bind_rows(df, chunksize):
+    """Yields lists of {"p0": ..., "pN": ...} parameter dicts (NaN -> NULL)."""
+    values = df.astype(object).where(df.notna(), None).to_numpy()
+    for start in range(0, len(values), chunksize):
+        yield [
+            {f"p{i}": value for i, value in enumerate(row)}
+            for row in values[start:start + chunksize]
+        ]
+
+
+def upsert_dataframe(conn, table, df, key_columns, chunksize=2000):
+    """
+    Upserts every row of df into table on an open connection (the caller owns
+    the transaction). key_columns must be the table's primary or unique key.
+    Returns the number of rows sent.
+    """
+    if df.empty:
+        return 0
+    statement = text(upsert_sql(conn.dialect, table, list(df.columns), key_columns))
+    for rows in bind_rows(df, chunksize):
+        conn.execute(statement, rows)
+    return len(df)
+
+
+def column_type(series):
+    """SQL type for a new column holding series."""
+    if pd.api.types.is_bool_dtype(series):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(series):
+        return "BIGINT"
+    if pd.api.types.is_float_dtype(series):
+        return "DOUBLE"
+    return "TEXT"
+
+
+def ensure_key(conn, table, key_columns, key_length=10):
+    """
+    Gives table a primary key (MySQL) or unique index (SQLite) on
+    key_columns if it has none, so upserts can match rows on them. Tables
+    written by DataFrame.to_sql have neither, and store strings as TEXT, which
+    MySQL cannot index without a length.
+    """
+    inspector = inspect(conn)
+    keys = [inspector.get_pk_constraint(table).get("constrained_columns") or []]
+    keys += [index["column_names"] for index in inspector.get_indexes(table) if index.get("unique")]
+    if any(sorted(key) == sorted(key_columns) for key in keys):
+        return
+    quote = conn.dialect.identifier_preparer.quote
+    if conn.dialect.name == "mysql":
+        text_keys = {c["name"] for c in inspector.get_columns(table) if "TEXT" in str(c["type"]).upper()}
+        changes = [f"MODIFY {quote(c)} VARCHAR({key_length}) NOT NULL" for c in key_columns if c in text_keys]
+        changes.append(f"ADD PRIMARY KEY ({', '.join(quote(c) for c in key_columns)})")
+        conn.execute(text(f"ALTER TABLE {quote(table)} {', '.join(changes)}"))
+    else:
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX {quote(f'uq_{table}_key')} ON {quote(table)} "
+            f"({', '.join(quote(c) for c in key_columns)})"
+        ))
+
+
+def upsert_columns(conn, table, df, key_columns, prune=False, chunksize=2000):
+    """
+    Inserts or updates df's columns in table, matching rows on key_columns;
+    columns not in df keep their values. The table, its key and any missing
+    columns are created as needed. With prune, rows whose key is not in df
+    are deleted (for the stage that defines the universe of rows).
+    Returns the number of rows sent.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        df.head(0).to_sql(table, conn, index=False)
+    else:
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        for column in df.columns:
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(column)} {column_type(df[column])}"))
+    ensure_key(conn, table, key_columns)
+
+    stage = f"{table}_stage"
+    columns = ", ".join(quote(c) for c in df.columns)
+    # A plain DROP TABLE would commit the caller's transaction on MySQL
+    drop_stage = text(f"DROP TEMPORARY TABLE IF EXISTS {quote(stage)}" if conn.dialect.name == "mysql"
+                      else f"DROP TABLE IF EXISTS temp.{quote(stage)}")
+    conn.execute(drop_stage)
+    conn.execute(text(f"CREATE TEMPORARY TABLE {quote(stage)} AS SELECT {columns} FROM {quote(table)} WHERE 1=0"))
+    statement = text(
+        f"INSERT INTO {quote(stage)} ({columns}) "
+        f"VALUES ({', '.join(f':p{i}' for i in range(len(df.columns)))})"
+    )
+    for rows in bind_rows(df, chunksize):
+        conn.execute(statement, rows)
+
+    update_columns = [c for c in df.columns if c not in key_columns]
+    merge = f"INSERT INTO {quote(table)} ({columns}) SELECT {columns} FROM {quote(stage)}"
+    if conn.dialect.name == "sqlite":
+        # WHERE true keeps SQLite from parsing ON CONFLICT as a join constraint
+        updates = ", ".join(f"{quote(c)} = excluded.{quote(c)}" for c in update_columns)
+        merge += f" WHERE true ON CONFLICT ({', '.join(quote(c) for c in key_columns)}) DO UPDATE SET {updates}"
+    else:
+        updates = ", ".join(f"{quote(c)} = VALUES({quote(c)})" for c in update_columns)
+        merge += f" ON DUPLICATE KEY UPDATE {updates}"
+    conn.execute(text(merge))
+
+    if prune:
+        key = ", ".join(quote(c) for c in key_columns)
+        conn.execute(text(f"DELETE FROM {quote(table)} WHERE ({key}) NOT IN (SELECT {key} FROM {quote(stage)})"))
+    conn.execute(drop_stage)
+    return len(df)
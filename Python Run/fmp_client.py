@@ -0,0 +1,234 @@
+# fmp_client.py
+"""
+Concurrent, rate-limited client for the Financial Modeling Prep (FMP) API.
+
+Requests share one pooled requests.Session and a token bucket, so a thread
+pool can fetch many tickers at once while staying under the plan's rate
+limit. 429 and 5xx responses (and connection errors) are retried with
+exponential backoff, honouring Retry-After when FMP sends it.
+
+Configuration (environment variables, all optional):
+  FMP_BASE_URL      API root, e.g. a local stub (default: the FMP v3 API)
+  FMP_RATE_LIMIT    sustained requests per second (default 5)
+  FMP_BURST         token bucket capacity (default: FMP_RATE_LIMIT)
+  FMP_MAX_WORKERS   concurrent requests (default 8)
+  FMP_MAX_RETRIES   retries per request after the first attempt (default 5)
+  FMP_CACHE         raw response cache: readwrite (default), off, or offline
+                    (replay from the cache only, never touch the network)
+  FMP_CACHE_DIR     cache directory (default: .fmp_cache next to this file)
+  FMP_CACHE_TTL     seconds a cached response stays fresh (default 6 hours)
+"""
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+FMP_BASE_URL = "https://financialmodelingprep.com/api/v3"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CACHE_MODES = ("readwrite", "off", "offline")
+
+
+class CacheMiss(requests.RequestException):
+    """Raised in offline mode when a request has no cached response."""
+
+
+class ResponseCache:
+    """
+    Gzipped JSON responses on disk, one file per request, named by the hash
+    of endpoint path and parameters (API key excluded) under a directory per
+    endpoint and ticker, e.g. historical-price-full/O/3f2a...json.gz.
+
+    Freshness: a response is fresh for `ttl` seconds. Offline mode serves any
+    cached response regardless of age.
+    """
+
+    def __init__(self, directory, ttl=6 * 3600, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+
+    @classmethod
+    def from_env(cls):
+        """The cache configured by FMP_CACHE*, or None when FMP_CACHE=off."""
+        mode = os.getenv("FMP_CACHE", "readwrite")
+        if mode not in CACHE_MODES:
+            raise ValueError(f"FMP_CACHE must be one of {', '.join(CACHE_MODES)}, got {mode!r}")
+        if mode == "off":
+            return None
+        directory = os.getenv("FMP_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fmp_cache")
+        return cls(directory, float(os.getenv("FMP_CACHE_TTL", 6 * 3600)), offline=mode == "offline")
+
+    def path_for(self, path, params):
+        key_params = {k: str(v) for k, v in sorted(params.items()) if k != "apikey"}
+        digest = hashlib.sha256(json.dumps([path, key_params]).encode()).hexdigest()
+        return os.path.join(self.directory, *path.strip("/").split("/"), f"{digest}.json.gz")
+
+    def is_fresh(self, fetched_at):
+        if self.offline:
+            return True
+        return time.time() - fetched_at < self.ttl
+
+    def get(self, path, params):
+        """Cached body for the request, or None if missing or stale."""
+        try:
+            with gzip.open(self.path_for(path, params), "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry["body"] if self.is_fresh(entry["fetched_at"]) else None
+
+    def put(self, path, params, body):
+        target = self.path_for(path, params)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        entry = {
+            "path": path,
+            "params": {k: str(v) for k, v in params.items() if k != "apikey"},
+            "fetched_at": time.time(),
+            "body": body,
+        }
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, target)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class FMPClient:
+    def __init__(self, api_key, base_url=None, rate=None, burst=None, max_workers=None,
+                 max_retries=None, backoff=0.5, timeout=30, cache="env"):
+        self.api_key = api_key
+        self.cache = ResponseCache.from_env() if cache == "env" else cache
+        self.base_url = (base_url or os.getenv("FMP_BASE_URL") or FMP_BASE_URL).rstrip("/")
+        rate = float(rate or os.getenv("FMP_RATE_LIMIT", 5))
+        burst = burst or os.getenv("FMP_BURST")
+        self.bucket = TokenBucket(rate, float(burst) if burst else None)
+        self.max_workers = int(max_workers or os.getenv("FMP_MAX_WORKERS", 8))
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv("FMP_MAX_RETRIES", 5))
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _retry_delay(self, attempt, response=None):
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return float(response.headers["Retry-After"])
+        return self.backoff * 2 ** attempt * (0.5 + random.random())
+
+    def get_json(self, path, **params):
+        """
+        GET base_url/path with the API key, served from the response cache
+        when a fresh copy exists. Retries 429/5xx and connection errors;
+        raises requests.HTTPError / RequestException once retries are
+        exhausted or for other error statuses, and CacheMiss offline.
+        """
+        if self.cache is not None:
+            body = self.cache.get(path, params)
+            if body is not None:
+                return body
+            if self.cache.offline:
+                raise CacheMiss(f"No cached response for {path} {params} (FMP_CACHE=offline)")
+
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        params = {**params, "apikey": self.api_key}
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            response = None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    body = response.json()
+                    # FMP reports bad keys and plan limits as 200 {"Error Message": ...}
+                    if self.cache is not None and not (isinstance(body, dict) and "Error Message" in body):
+                        self.cache.put(path, params, body)
+                    return body
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+            except requests.HTTPError:
+                raise
+            except requests.RequestException:
+                if attempt == self.max_retries:
+                    raise
+            time.sleep(self._retry_delay(attempt, response))
+
+    def fetch_price_history(self, ticker, start_date=None):
+        """
+        Daily close and volume for ticker as a DataFrame with columns
+        date, close, volume, ticker (empty if FMP has no data). start_date
+        limits the history to bars on or after it (FMP `from=`).
+        """
+        params = {"from": str(start_date)} if start_date else {}
+        try:
+            data = self.get_json(f"historical-price-full/{ticker}", **params)
+        except ValueError:
+            print(f"❌ Non-JSON response for {ticker}. Skipping.")
+            return pd.DataFrame()
+        except requests.RequestException as e:
+            print(f"❌ Error fetching data for {ticker}: {e}")
+            return pd.DataFrame()
+
+        if not isinstance(data, dict) or "historical" not in data:
+            print(f"❌ No data found for {ticker}. Skipping.")
+            return pd.DataFrame()
+
+        df = pd.DataFrame(data["historical"], columns=["date", "close", "volume"])
+        df["ticker"] = ticker
+        return df
+
+    def iter_price_histories(self, tickers, start_dates=None):
+        """
+        Fetches tickers concurrently and yields (ticker, DataFrame) as each
+        completes. start_dates optionally maps ticker -> first date wanted.
+        At most 2 x max_workers requests are queued ahead of the consumer, so
+        memory stays bounded by what the caller keeps.
+        """
+        start_dates = start_dates or {}
+        remaining = iter(tickers)
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fmp") as pool:
+            def submit_next():
+                ticker = next(remaining, None)
+                if ticker is not None:
+                    pending[pool.submit(self.fetch_price_history, ticker, start_dates.get(ticker))] = ticker
+
+            for _ in range(2 * self.max_workers):
+                submit_next()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ticker = pending.pop(future)
+                    submit_next()
+                    yield ticker, future.result()
@@ -0,0 +1,302 @@
+# pipeline_dag.py
+"""
+Refreshes only the pipeline stages whose inputs have changed.
+
+The stages form three independent branches:
+
+  prices      1 price fetch  ->  2 risk  ->  3 operation
+  financials  4 statements, per ticker (<ticker> Financials.xlsx)
+  costar      7 properties   ->  8 portfolio analysis, per ticker
+              (<ticker> Properties.xlsx)
+
+Each node (a stage, or a stage for one ticker) has a fingerprint: a hash of
+its script and helper modules, its input files, the content of the tables it
+reads that no stage writes (reit_ffo_payout), and its upstream node's
+fingerprint. Stage 1's inputs also include today's date, since FMP prices
+move every trading day. A node's fingerprint is kept in pipeline_stage_state
+once its stage has completed, which includes saving its outputs (every
+run_pipeline stage writes its own tables before returning). A node runs only
+when its fingerprint differs from the stored one; a changed input therefore
+makes everything downstream of it stale too.
+
+Each branch (and each ticker's chain) with stale nodes runs in its own
+process, in parallel, through run_pipeline so that results still pass in
+memory along the chain. Where fork is unavailable (Windows) the chains run
+one after another in-process, with a warning, and --jobs / --workers have no
+effect.
+
+Usage (from Python Run/):
+    python pipeline_dag.py [--financials-tickers SLG] [--costar-tickers BXP,O]
+        [--force 2,3] [--dry-run] [--jobs N] [--workers N]
+        [--full] [--rebuild-sums] [--rebuild-history]
+
+--full forces stage 1, --rebuild-sums / --rebuild-history force stage 2,
+and --force reruns the given stages; forced stages also rerun their
+downstream stages.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+import run_pipeline
+from db_upsert import upsert_dataframe
+from sharding import fork_available, warn_no_fork
+
+SCRIPT_DIR = run_pipeline.SCRIPT_DIR
+
+BRANCHES = {
+    "prices": ["1", "2", "3"],
+    "financials": ["4"],
+    "costar": ["7", "8"],
+}
+
+# Helper modules each stage's script imports; their code is an input too
+STAGE_HELPERS = {
+    "1": ["fmp_client.py", "db_upsert.py", "bulk_load.py"],
+    "2": ["db_upsert.py", "bulk_load.py", "sharding.py"],
+    "3": ["db_upsert.py", "sharding.py"],
+    "4": [],
+    "7": [],
+    "8": [],
+}
+
+# Tables a stage reads that are loaded outside the pipeline
+EXTERNAL_TABLES = {
+    "3": ["reit_ffo_payout"],
+}
+
+create_state_table_query = (
+    "CREATE TABLE IF NOT EXISTS pipeline_stage_state ("
+    "node VARCHAR(20) NOT NULL PRIMARY KEY, "
+    "fingerprint CHAR(64) NOT NULL, "
+    "finished_at DATETIME NOT NULL"
+    ");"
+)
+
+
+def file_hash(path):
+    """SHA-256 of a file's content, or "missing"."""
+    if not path or not os.path.exists(path):
+        return "missing"
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def table_version(conn, table):
+    """Hash of a (small) table's content, or "missing"."""
+    if not inspect(conn).has_table(table):
+        return "missing"
+    df = pd.read_sql(text(f"SELECT * FROM {table}"), conn)
+    content = pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+    return hashlib.sha256(",".join(df.columns).encode() + content).hexdigest()
+
+
+def export_file(root_env, ticker, folder, name):
+    """<root>/<ticker>/<folder>/<ticker> <name>.xlsx (or .xls), as the scripts look it up."""
+    root = os.getenv(root_env) or ""
+    for extension in (".xlsx", ".xls"):
+        path = os.path.join(root, ticker, folder, f"{ticker} {name}{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def stage_inputs(conn, stage, ticker, upstream):
+    """Everything node (stage, ticker)'s output depends on, as a JSON-able dict."""
+    code = [run_pipeline.STAGE_SCRIPTS[stage], "run_pipeline.py"] + STAGE_HELPERS[stage]
+    inputs = {
+        "code": {name: file_hash(os.path.join(SCRIPT_DIR, name)) for name in code},
+        "tables": {table: table_version(conn, table) for table in EXTERNAL_TABLES.get(stage, [])},
+        "upstream": upstream,
+    }
+    if stage == "1":
+        inputs["reit_list"] = file_hash(os.getenv("REIT_LIST_PATH"))
+        inputs["prices_as_of"] = date.today().isoformat()
+    elif stage == "4":
+        inputs["export"] = file_hash(export_file("REIT_RAW_FINANCIALS_PATH", ticker, "Financials", "Financials"))
+    elif stage == "7":
+        inputs["export"] = file_hash(export_file("REIT_RAW_PROPERTIES_PATH", ticker, "Properties", "Properties"))
+    return inputs
+
+
+def fingerprint(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def load_state(conn):
+    """{node: fingerprint} of the last completed run of every node."""
+    conn.execute(text(create_state_table_query))
+    rows = conn.execute(text("SELECT node, fingerprint FROM pipeline_stage_state"))
+    return dict(rows.fetchall())
+
+
+def save_fingerprint(engine, node, node_fingerprint):
+    row = pd.DataFrame([{
+        "node": node,
+        "fingerprint": node_fingerprint,
+        "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }])
+    with engine.begin() as conn:
+        upsert_dataframe(conn, "pipeline_stage_state", row, ["node"])
+
+
+def plan_chains(engine, financials_tickers=(), costar_tickers=(), forced=()):
+    """
+    The chains with stale nodes, as (branch, ticker, [(stage, node,
+    fingerprint), ...]) with only the stale nodes of each chain (ticker is
+    None for the prices branch).
+    """
+    with engine.begin() as conn:
+        stored = load_state(conn)
+        chains = []
+        for branch, stages in BRANCHES.items():
+            tickers = {"prices": [None], "financials": financials_tickers, "costar": costar_tickers}[branch]
+            for ticker in tickers:
+                upstream = None
+                force_rest = False
+                stale = []
+                for stage in stages:
+                    node = stage if ticker is None else f"{stage}:{ticker}"
+                    node_fingerprint = fingerprint(stage_inputs(conn, stage, ticker, upstream))
+                    force_rest = force_rest or stage in forced
+                    if force_rest or stored.get(node) != node_fingerprint:
+                        stale.append((stage, node, node_fingerprint))
+                    upstream = node_fingerprint
+                if stale:
+                    chains.append((branch, ticker, stale))
+    return chains
+
+
+def run_chain(chain, options):
+    """Runs one chain's stale stages; returns the nodes that completed."""
+    branch, ticker, nodes = chain
+    fingerprints = {stage: (node, node_fingerprint) for stage, node, node_fingerprint in nodes}
+    tickers = [ticker] if ticker else []
+    engine = run_pipeline.create_pipeline_engine()
+    completed = []
+
+    def record(stage):
+        node, node_fingerprint = fingerprints[stage]
+        save_fingerprint(engine, node, node_fingerprint)
+        completed.append(node)
+
+    try:
+        run_pipeline.run_pipeline(
+            list(fingerprints),
+            full_reload=options["full"],
+            rebuild_sums=options["rebuild_sums"],
+            rebuild_history=options["rebuild_history"],
+            costar_tickers=tickers if branch == "costar" else (),
+            financials_tickers=tickers if branch == "financials" else (),
+            after_stage=record,
+        )
+    except SystemExit:
+        # run_pipeline has reported the failed stage; its downstream stays stale
+        pass
+    except Exception as e:
+        # Kept to this chain, so the other chains still run and get reported
+        print(f"❌ Error in {chain_label(branch, ticker)}: {e!r}")
+    finally:
+        engine.dispose()
+    return completed
+
+
+def run_chains(chains, options, jobs):
+    """Runs the chains, up to jobs at a time; returns each chain's completed nodes."""
+    if jobs <= 1 or len(chains) <= 1:
+        return [run_chain(chain, options) for chain in chains]
+    if not fork_available():
+        warn_no_fork(f"--jobs {jobs} is ignored and the chains")
+        return [run_chain(chain, options) for chain in chains]
+
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(chains)),
+        mp_context=multiprocessing.get_context("fork"),
+    ) as pool:
+        return list(pool.map(run_chain, chains, [options] * len(chains)))
+
+
+def chain_label(branch, ticker):
+    return branch if ticker is None else f"{branch} {ticker}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--financials-tickers", default="", help="Comma-separated tickers for stage 4")
+    parser.add_argument("--costar-tickers", default="", help="Comma-separated tickers for stages 7 and 8")
+    parser.add_argument("--force", default="", help="Comma-separated stages to rerun regardless of fingerprints")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the stale stages")
+    parser.add_argument("--jobs", type=int, default=4, help="Chains run in parallel (default 4; needs fork, so not on Windows)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Scoring shards for stages 2 and 3, run in parallel processes (needs fork, so not on Windows)")
+    parser.add_argument("--full", action="store_true", help="Full price reload in stage 1 (forces stage 1)")
+    parser.add_argument("--rebuild-sums", action="store_true", help="Re-read the full price history in stage 2 (forces stage 2)")
+    parser.add_argument("--rebuild-history", action="store_true", help="Rebuild reit_risk_history in stage 2 (forces stage 2)")
+    args = parser.parse_args(argv)
+
+    financials_tickers = [t.strip().upper() for t in args.financials_tickers.split(",") if t.strip()]
+    costar_tickers = [t.strip().upper() for t in args.costar_tickers.split(",") if t.strip()]
+    forced = {s.strip() for s in args.force.split(",") if s.strip()}
+    unknown = forced - set(run_pipeline.STAGE_SCRIPTS)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+    if args.full:
+        forced.add("1")
+    if args.rebuild_sums or args.rebuild_history:
+        forced.add("2")
+    if args.workers:
+        # Read by the scripts' scoring_workers() when they are loaded
+        os.environ["SCORING_WORKERS"] = str(args.workers)
+
+    engine = run_pipeline.create_pipeline_engine()
+    try:
+        chains = plan_chains(engine, financials_tickers, costar_tickers, forced)
+    except Exception as e:
+        print(f"❌ Error reading pipeline state: {e}")
+        sys.exit(1)
+    finally:
+        # No connections may be shared with the forked chains
+        engine.dispose()
+
+    if not chains:
+        print("✅ All stages are up to date.")
+        return
+    print("Stale stages:")
+    for branch, ticker, nodes in chains:
+        print(f"  {chain_label(branch, ticker)}: {', '.join(stage for stage, _, _ in nodes)}")
+    if args.dry_run:
+        return
+
+    options = {"full": args.full, "rebuild_sums": args.rebuild_sums, "rebuild_history": args.rebuild_history}
+    start = time.perf_counter()
+    results = run_chains(chains, options, args.jobs)
+
+    print("\n--- Pipeline DAG ---")
+    failed = False
+    for (branch, ticker, nodes), completed in zip(chains, results):
+        pending = [node for _, node, _ in nodes if node not in completed]
+        ran = ', '.join(completed) or 'nothing'
+        if pending:
+            failed = True
+            print(f"❌ {chain_label(branch, ticker)}: ran {ran}; not completed: {', '.join(pending)}")
+        else:
+            print(f"✅ {chain_label(branch, ticker)}: ran {ran}")
+    print(f"Finished in {time.perf_counter() - start:.1f}s.")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
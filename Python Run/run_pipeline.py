@@ -0,0 +1,193 @@
+# run_pipeline.py
+"""
+Runs the numbered data scripts as one pipeline, in one process:
+
+  1  prices and business data      1. Stock universe - initial set up.py
+  2  risk scores and history       2. Stock data analysis - risk.py
+  3  fundamental scores            3. Stock data analysis - operation.py
+  4  financial statements          4. Inidividual REIT data processing.py
+  7  CoStar properties             7.CoStar properties data processing.py
+  8  CoStar portfolio breakdowns   8. CoStar REIT portfolio analysis.py
+
+The scripts are loaded as modules (their own steps only run under
+__main__) and share one pooled engine. Results are handed to the next stage
+in memory instead of being written and read back:
+
+- stage 1 passes the REIT list to stage 3 (no reit_business_data reads);
+- stage 2 passes its scored tickers to stage 3 (no reit_scoring_analysis
+  read); each stage still upserts its own columns as soon as it is done, so
+  a failure in stage 3 does not lose stage 2's scores;
+- stage 7 passes each ticker's properties to stage 8.
+
+Every script still runs on its own exactly as before.
+
+Usage (from Python Run/):
+    python run_pipeline.py [--stages 1,2,3] [--full] [--rebuild-sums]
+        [--rebuild-history] [--workers N] [--financials-tickers SLG]
+        [--costar-tickers BXP,O]
+
+Stage 4 runs for the tickers in --financials-tickers, stages 7 and 8 for
+those in --costar-tickers; each is skipped without its tickers.
+pipeline_dag.py runs only the stages whose inputs have changed.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STAGE_SCRIPTS = {
+    "1": "1. Stock universe - initial set up.py",
+    "2": "2. Stock data analysis - risk.py",
+    "3": "3. Stock data analysis - operation.py",
+    "4": "4. Inidividual REIT data processing.py",
+    "7": "7.CoStar properties data processing.py",
+    "8": "8. CoStar REIT portfolio analysis.py",
+}
+
+
+def create_pipeline_engine():
+    """The engine shared by all stages (DATABASE_URL overrides the MySQL one)."""
+    load_dotenv(os.path.join(SCRIPT_DIR, "Credentials.env"))
+    if os.getenv("DATABASE_URL"):
+        return create_engine(os.getenv("DATABASE_URL"))
+    return create_engine(
+        f"mysql+pymysql://{os.getenv('DB_USERNAME')}:{os.getenv('DB_PASSWORD')}"
+        f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}",
+        connect_args={
+            "ssl": {
+                "fake_flag_to_enable": True
+            },
+            # Allows the LOAD DATA LOCAL INFILE fast path of full price reloads
+            "local_infile": True
+        },
+        pool_pre_ping=True,
+    )
+
+
+def load_stage(stage, engine):
+    """
+    Imports a stage script as module stage_<n> and points its module-level
+    engine (used by all of its functions) at the shared one.
+    """
+    name = f"stage_{stage}"
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, STAGE_SCRIPTS[stage]))
+    module = importlib.util.module_from_spec(spec)
+    # Registered so forked shard workers can unpickle the script's functions
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    module.engine.dispose()
+    module.engine = engine
+    return module
+
+
+def run_pipeline(stages, full_reload=False, rebuild_sums=False, rebuild_history=False,
+                 costar_tickers=(), financials_tickers=(), after_stage=None):
+    """
+    Runs the given stages in order, calling after_stage(stage) as each one
+    completes; returns {stage: seconds}.
+    """
+    engine = create_pipeline_engine()
+    modules = {stage: load_stage(stage, engine) for stage in stages}
+    timings = {}
+    reit_data = stability_data = None
+
+    def timed(stage, step):
+        print(f"\n▶️ Stage {stage}: {STAGE_SCRIPTS[stage]}")
+        start = time.perf_counter()
+        try:
+            step(modules[stage])
+        except SystemExit:
+            # The scripts exit() on errors they have already reported
+            print(f"❌ Pipeline stopped in stage {stage}.")
+            raise SystemExit(1)
+        except Exception as e:
+            print(f"❌ Error in stage {stage}: {e!r}")
+            print(f"❌ Pipeline stopped in stage {stage}.")
+            raise SystemExit(1)
+        timings[stage] = time.perf_counter() - start
+        if after_stage:
+            after_stage(stage)
+
+    def prices(m1):
+        nonlocal reit_data
+        reit_data = m1.load_reit_list()
+        m1.update_prices(reit_data['Ticker'].dropna().astype(str).tolist(), full_reload=full_reload)
+        m1.save_business_data(reit_data)
+
+    def risk(m2):
+        nonlocal stability_data
+        stability_data = m2.score_stability(m2.update_ticker_sums(rebuild_sums)).reset_index(drop=True)
+        m2.save_stability_scores(stability_data)
+        m2.update_risk_history(rebuild_history)
+
+    def fundamentals(m3):
+        scoring_data = stability_data if stability_data is not None else m3.load_scoring_tickers()
+        business_data = m3.business_columns(reit_data) if reit_data is not None else m3.load_business_data()
+        m3.save_fundamental_scores(m3.score_fundamentals(scoring_data, business_data))
+
+    def statements(m4):
+        for ticker in financials_tickers:
+            m4.ingest_financials(ticker)
+
+    def properties(m7):
+        for ticker in costar_tickers:
+            property_data = m7.ingest_properties(ticker)
+            if "8" in stages:
+                modules["8"].analyze_portfolio(ticker, property_data)
+
+    def portfolio(m8):
+        if "7" not in stages:
+            for ticker in costar_tickers:
+                m8.analyze_portfolio(ticker)
+
+    steps = {"1": prices, "2": risk, "3": fundamentals, "4": statements, "7": properties, "8": portfolio}
+    for stage in stages:
+        timed(stage, steps[stage])
+    engine.dispose()
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", default="1,2,3,4,7,8", help="Comma-separated stages to run (default: all)")
+    parser.add_argument("--full", action="store_true", help="Full price reload in stage 1")
+    parser.add_argument("--rebuild-sums", action="store_true", help="Re-read the full price history in stage 2")
+    parser.add_argument("--rebuild-history", action="store_true", help="Rebuild reit_risk_history in stage 2")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Scoring shards for stages 2 and 3, run in parallel processes (needs fork, so not on Windows)")
+    parser.add_argument("--financials-tickers", default="", help="Comma-separated tickers for stage 4")
+    parser.add_argument("--costar-tickers", default="", help="Comma-separated tickers for stages 7 and 8")
+    args = parser.parse_args(argv)
+
+    financials_tickers = [t.strip().upper() for t in args.financials_tickers.split(",") if t.strip()]
+    costar_tickers = [t.strip().upper() for t in args.costar_tickers.split(",") if t.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGE_SCRIPTS]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    if not financials_tickers:
+        stages = [s for s in stages if s != "4"]
+    if not costar_tickers:
+        stages = [s for s in stages if s not in ("7", "8")]
+    stages = sorted(set(stages), key=list(STAGE_SCRIPTS).index)
+    if args.workers:
+        # Read by the scripts' scoring_workers() when they are loaded
+        os.environ["SCORING_WORKERS"] = str(args.workers)
+
+    start = time.perf_counter()
+    timings = run_pipeline(stages, args.full, args.rebuild_sums, args.rebuild_history,
+                           costar_tickers, financials_tickers)
+    print("\n--- Pipeline timings ---")
+    for stage, seconds in timings.items():
+        print(f"Stage {stage}: {seconds:.1f}s")
+    print(f"✅ Pipeline finished in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
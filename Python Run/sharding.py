@@ -0,0 +1,70 @@
+# sharding.py
+"""
+Sharded execution of per-ticker work across a process pool.
+
+Tickers are dealt round-robin into one shard per worker (balancing long and
+short histories), each shard runs in its own process, and the results come
+back in shard order for the caller to merge before any universe-wide step
+(Z-scores, percentiles).
+
+The pool forks, so workers inherit the script's loaded data and functions;
+each child disposes the inherited connection pool and opens its own. Where
+fork is unavailable (Windows) the shards run one after another in-process
+and a warning says so: --workers has no effect there.
+
+The worker count comes from --workers N on the command line or
+SCORING_WORKERS (default 1, i.e. no pool).
+"""
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+_warned_no_fork = False
+
+
+def fork_available():
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def warn_no_fork(what):
+    """Prints (once per process) that parallel runs are off without fork."""
+    global _warned_no_fork
+    if not _warned_no_fork:
+        _warned_no_fork = True
+        print(f"⚠️ Process fork is not available on this platform; {what} run one after another.")
+
+
+def scoring_workers():
+    """--workers N, else SCORING_WORKERS, else 1."""
+    if "--workers" in sys.argv:
+        return max(int(sys.argv[sys.argv.index("--workers") + 1]), 1)
+    return max(int(os.getenv("SCORING_WORKERS", 1)), 1)
+
+
+def shard_tickers(tickers, n_shards):
+    """Round-robin split of the sorted tickers into at most n_shards lists."""
+    tickers = sorted(tickers)
+    return [shard for shard in (tickers[i::n_shards] for i in range(n_shards)) if shard]
+
+
+def run_sharded(worker, tickers, workers, engine):
+    """
+    Calls worker(shard) for every ticker shard, in parallel when workers > 1.
+    Returns the list of results in shard order.
+    """
+    shards = shard_tickers(tickers, workers)
+    if workers <= 1 or len(shards) <= 1:
+        return [worker(shard) for shard in shards]
+    if not fork_available():
+        warn_no_fork(f"--workers {workers} is ignored and the scoring shards")
+        return [worker(shard) for shard in shards]
+
+    # Connections must not be shared with the parent across fork
+    with ProcessPoolExecutor(
+        max_workers=len(shards),
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=engine.dispose,
+        initargs=(False,),
+    ) as pool:
+        return list(pool.map(worker, shards))